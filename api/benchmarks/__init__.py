@@ -0,0 +1,18 @@
+"""
+Offline benchmarks of the chat and ingestion pipelines, the LLM, the vector
+store and the entity graph are replaced by in-memory stand-ins so nothing has
+to be running.
+
+    python -m benchmarks --help
+"""
+
+import os
+
+# the settings cannot be loaded without them, nothing connects to these servers
+os.environ.setdefault(
+    "POSTGRESQL_URL", "postgresql://benchmark@localhost/benchmark"
+)
+os.environ.setdefault("NEO4J_URL", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USERNAME", "benchmark")
+os.environ.setdefault("NEO4J_PASSWORD", "benchmark")
+os.environ.setdefault("LOG_LEVEL", "warning")
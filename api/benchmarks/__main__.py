@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+from datetime import datetime, timezone
+
+from settings import app_settings
+
+from .runner import format_results, run_benchmarks
+from .scenarios import build_scenarios
+
+logger = logging.getLogger("benchmarks")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Offline benchmarks of the chat and ingestion pipelines",
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        action="append",
+        default=[],
+        help="only run the scenarios whose label contains this text "
+        "(repeatable)",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the scenarios"
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="skip the tracemalloc run measuring the peak memory",
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.05, help="seconds per LLM call"
+    )
+    parser.add_argument(
+        "--llm-latency-per-token",
+        type=float,
+        default=0.0,
+        help="seconds per generated token",
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=float,
+        default=0.01,
+        help="seconds per embedding call",
+    )
+    parser.add_argument(
+        "--embedding-latency-per-text",
+        type=float,
+        default=0.0005,
+        help="seconds per embedded text",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.2,
+        help="deterministic variation of the LLM latency, as a fraction of it",
+    )
+    parser.add_argument(
+        "-o", "--output", help="write the results to this JSON file"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    scenarios = [
+        scenario
+        for scenario in build_scenarios()
+        if not args.filter
+        or any(text in scenario.label for text in args.filter)
+    ]
+    if args.list or not scenarios:
+        for scenario in scenarios:
+            print(scenario.label)
+        return
+
+    backend_options = {
+        "llm_latency": args.llm_latency,
+        "llm_latency_per_token": args.llm_latency_per_token,
+        "embedding_latency": args.embedding_latency,
+        "embedding_latency_per_text": args.embedding_latency_per_text,
+        "jitter": args.jitter,
+    }
+    logger.info("Running %d scenarios", len(scenarios))
+    results = asyncio.run(
+        run_benchmarks(
+            scenarios,
+            backend_options,
+            iterations=args.iterations,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            memory=not args.no_memory,
+        )
+    )
+    print(format_results(results))
+
+    if args.output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "backend": backend_options,
+            "settings": {
+                key: getattr(app_settings, key)
+                for key in (
+                    "retrieval_mode",
+                    "retrieval_k",
+                    "document_grading_mode",
+                    "verification_mode",
+                    "enable_entity_dictionary",
+                    "graph_extraction_concurrency",
+                    "enable_embedding_cache",
+                )
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, default=str)
+        logger.info("Results written to %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from hrag.utils.embeddings.graph.writer import GraphDocumentWriter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import Field
+from langchain_core.vectorstores import VectorStore
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*\b")
+# words starting a sentence are not entities
+STOP_ENTITIES = {
+    "The",
+    "It",
+    "Its",
+    "This",
+    "What",
+    "Who",
+    "How",
+    "Which",
+    "In",
+}
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def stable_hash(text: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    )
+
+
+class CallCounter:
+    """
+    Calls and tokens of a fake model, shared by the threads and tasks using it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int = 0):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering every prompt of the app with a canned, well formed
+    response. Each call waits `latency` seconds plus `latency_per_token` per
+    generated token, varied by up to +/- `jitter` (a fraction) depending on the
+    prompt so runs are repeatable.
+    """
+
+    latency: float = 0.0
+    latency_per_token: float = 0.0
+    jitter: float = 0.0
+    counter: CallCounter = Field(default_factory=CallCounter)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    def get_num_tokens(self, text: str) -> int:
+        # the default tokenizer of langchain needs transformers
+        return count_tokens(text)
+
+    def respond(self, prompt: str) -> str:
+        text = prompt.lower()
+        if "head_type" in text:
+            return self.extract_relationships(prompt.rsplit("Text:", 1)[-1])
+        if "json list of entities" in text:
+            return json.dumps(
+                self.extract_entities(prompt.rsplit("question:", 1)[-1])
+            )
+        if "'relevant'" in text:
+            documents = len(re.findall(r"^\s*\[\d+\]", prompt, re.MULTILINE))
+            # about two thirds of the documents are relevant
+            return json.dumps(
+                {"relevant": [i for i in range(documents) if i % 3 != 2]}
+            )
+        if "'grounded'" in text:
+            return json.dumps({"grounded": "yes", "useful": "yes"})
+        if "json with a single key 'score'" in text:
+            return json.dumps({"score": "yes"})
+        if "standalone question" in text:
+            return (
+                prompt.rsplit("Follow Up Input:", 1)[-1]
+                .split("\n", 1)[0]
+                .strip()
+            )
+        if "progressively summariz" in text:
+            return (
+                "The user asked about the companies and products of the "
+                "documents."
+            )
+        if "concise summary" in text:
+            return (
+                "The documents describe companies, their products and their "
+                "cities."
+            )
+        return (
+            "According to the documents, the companies mentioned manufacture "
+            "and sell the products listed, mostly from their headquarters in "
+            "the cities cited."
+        )
+
+    @staticmethod
+    def extract_entities(text: str) -> List[str]:
+        entities = []
+        for entity in ENTITY_PATTERN.findall(text):
+            if entity not in STOP_ENTITIES and entity not in entities:
+                entities.append(entity)
+        return entities
+
+    def extract_relationships(self, text: str) -> str:
+        entities = self.extract_entities(text)
+        return json.dumps(
+            [
+                {
+                    "head": head,
+                    "head_type": "Organization" if i % 2 == 0 else "Product",
+                    "relation": "RELATED_TO",
+                    "tail": tail,
+                    "tail_type": "Product" if i % 2 == 0 else "Organization",
+                }
+                for i, (head, tail) in enumerate(zip(entities, entities[1:]))
+            ]
+        )
+
+    def prepare(self, messages) -> Tuple[str, float, ChatResult]:
+        prompt = "\n".join(
+            message.content
+            for message in messages
+            if isinstance(message.content, str)
+        )
+        content = self.respond(prompt)
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(
+            content
+        )
+        self.counter.add(prompt_tokens, completion_tokens)
+
+        delay = self.latency + self.latency_per_token * completion_tokens
+        if self.jitter:
+            # deterministic in [-1, 1] for a given prompt
+            spread = stable_hash(prompt) % 2001 / 1000 - 1
+            delay *= 1 + self.jitter * spread
+
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return (
+            prompt,
+            max(delay, 0),
+            ChatResult(generations=[ChatGeneration(message=message)]),
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        _, delay, result = self.prepare(messages)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ):
+        _, delay, result = self.prepare(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag of words embeddings, texts sharing words get close vectors. Each
+    call waits `latency` seconds plus `latency_per_text` per embedded text.
+    """
+
+    def __init__(
+        self,
+        size: int = 256,
+        latency: float = 0.0,
+        latency_per_text: float = 0.0,
+    ):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.counter = CallCounter()
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            vector[stable_hash(token) % self.size] += 1
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.counter.add(sum(count_tokens(text) for text in texts))
+        delay = self.latency + self.latency_per_text * len(texts)
+        if delay:
+            time.sleep(delay)
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.counter.add(sum(count_tokens(text) for text in texts))
+        delay = self.latency + self.latency_per_text * len(texts)
+        if delay:
+            await asyncio.sleep(delay)
+        return [self.embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Stand-in of HybridRagPGVector: exact cosine search over a matrix of the
+    vectors and a keyword search ranked by shared words, fused like the hybrid
+    search query.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self.ids: List[str] = []
+        self.documents: List[Document] = []
+        self.tokens: List[set] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.positions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(stable_hash(text)) for text in texts]
+        vectors = np.array(
+            self.embedding.embed_documents(texts), dtype=np.float32
+        )
+
+        with self._lock:
+            self.delete(ids)
+            if not len(self.ids):
+                self.vectors = np.zeros(
+                    (0, vectors.shape[1]), dtype=np.float32
+                )
+            for id, text, metadata in zip(ids, texts, metadatas):
+                self.positions[id] = len(self.ids)
+                self.ids.append(id)
+                self.documents.append(
+                    Document(page_content=text, metadata=metadata)
+                )
+                self.tokens.append(set(TOKEN_PATTERN.findall(text.lower())))
+            self.vectors = np.vstack([self.vectors, vectors])
+
+        return ids
+
+    def delete(self, ids: Optional[Sequence[str]] = None, **kwargs: Any):
+        with self._lock:
+            removed = {
+                self.positions[id] for id in ids or [] if id in self.positions
+            }
+            if not removed:
+                return
+
+            kept = [i for i in range(len(self.ids)) if i not in removed]
+            self.ids = [self.ids[i] for i in kept]
+            self.documents = [self.documents[i] for i in kept]
+            self.tokens = [self.tokens[i] for i in kept]
+            self.vectors = self.vectors[kept]
+            self.positions = {id: i for i, id in enumerate(self.ids)}
+
+    def vector_ranking(self, query: str, k: int) -> List[int]:
+        if not self.ids:
+            return []
+
+        vector = np.array(self.embedding.embed_query(query), dtype=np.float32)
+        scores = self.vectors @ vector
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        return sorted(best.tolist(), key=lambda i: -scores[i])
+
+    def keyword_ranking(self, query: str, k: int) -> List[int]:
+        words = set(TOKEN_PATTERN.findall(query.lower()))
+        scores = [
+            (len(words & tokens), i) for i, tokens in enumerate(self.tokens)
+        ]
+        return [i for score, i in sorted(scores, reverse=True)[:k] if score]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs
+    ) -> List[Document]:
+        return [self.documents[i] for i in self.vector_ranking(query, k)]
+
+    def hybrid_search(
+        self, query: str, k: int = 4, candidates: int = 40, rrf_k: int = 60
+    ) -> List[Document]:
+        scores = defaultdict(float)
+        for ranking in (
+            self.vector_ranking(query, candidates),
+            self.keyword_ranking(query, candidates),
+        ):
+            for rank, i in enumerate(ranking, start=1):
+                scores[i] += 1 / (rrf_k + rank)
+
+        best = sorted(scores, key=lambda i: -scores[i])[:k]
+        return [self.documents[i] for i in best]
+
+    def get_ann_index(self):
+        return None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class InMemoryDocumentChunks:
+    """
+    Stand-in of the DocumentChunk fingerprint helpers.
+    """
+
+    def __init__(self):
+        self.fingerprints: Dict[tuple, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get_fingerprints(self, tenant_id, kind, source: str) -> set:
+        with self._lock:
+            return set(self.fingerprints.get((tenant_id, kind, source), ()))
+
+    def get_stored_fingerprints(
+        self, tenant_id, kind, fingerprints=None
+    ) -> set:
+        with self._lock:
+            stored = set().union(
+                *(
+                    source_fingerprints
+                    for key, source_fingerprints in self.fingerprints.items()
+                    if key[:2] == (tenant_id, kind)
+                )
+            )
+        return stored if fingerprints is None else stored & set(fingerprints)
+
+    def add_fingerprints(self, tenant_id, kind, source: str, fingerprints):
+        with self._lock:
+            self.fingerprints[(tenant_id, kind, source)].update(fingerprints)
+
+    def remove_fingerprints(self, tenant_id, kind, source: str, fingerprints):
+        with self._lock:
+            self.fingerprints[(tenant_id, kind, source)].difference_update(
+                fingerprints
+            )
+
+    def clear_fingerprints(self, tenant_id, *kinds):
+        with self._lock:
+            for key in list(self.fingerprints):
+                if key[0] == tenant_id and key[1] in kinds:
+                    del self.fingerprints[key]
+
+
+def fake_db_session(**kwargs):
+    return nullcontext()
+
+
+class InMemoryEntityGraph:
+    """
+    Stand-in of the Neo4j entity graph, answering the entity and neighborhood
+    queries of the app from the relationships of the written graph documents.
+    """
+
+    def __init__(self):
+        # graph document id -> (head, relation, tail)
+        self.documents: Dict[str, List[Tuple[str, str, str]]] = {}
+        self.neighbors: Dict[str, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, document_id: str, relationships: List[Tuple[str, str, str]]):
+        with self._lock:
+            self.documents[document_id] = relationships
+            for relationship in relationships:
+                self.neighbors[relationship[0]].add(relationship)
+                self.neighbors[relationship[2]].add(relationship)
+
+    def delete(self, document_ids: Iterable[str]):
+        with self._lock:
+            for document_id in document_ids:
+                for relationship in self.documents.pop(document_id, []):
+                    for entity in (relationship[0], relationship[2]):
+                        self.neighbors[entity].discard(relationship)
+                        if not self.neighbors[entity]:
+                            del self.neighbors[entity]
+
+    def find_entities(
+        self, query: str, prefix: str, limit: int = 2
+    ) -> List[str]:
+        # "word~2 AND word~2" full-text queries, all the words must match
+        words = [
+            word.split("~", 1)[0].lower()
+            for word in query.split(" AND ")
+            if word.strip()
+        ]
+        found = []
+        for entity in self.neighbors:
+            if not entity.startswith(prefix):
+                continue
+            name = entity[len(prefix) :].replace("-", " ").lower()
+            if all(word in name for word in words):
+                found.append(entity)
+                if len(found) == limit:
+                    break
+        return found
+
+    def query(
+        self, query: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        params = params or {}
+        with self._lock:
+            if "since" in params:
+                # a single tenant, its label covers every entity
+                return [{"id": entity} for entity in self.neighbors]
+
+            if "queries" in params:
+                relationships = []
+                for text in params["queries"]:
+                    for entity in self.find_entities(text, params["prefix"]):
+                        relationships.extend(
+                            relationship
+                            for relationship in self.neighbors[entity]
+                            if relationship not in relationships
+                        )
+                return [
+                    {"head": head, "relation": relation, "tail": tail}
+                    for head, relation, tail in relationships[
+                        : params["limit"]
+                    ]
+                ]
+
+        return []
+
+    async def aquery(
+        self, query: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        return self.query(query, params)
+
+
+class InMemoryGraphDocumentWriter(GraphDocumentWriter):
+    """
+    Builds the same statements as the real writer but sends the graph documents
+    to an InMemoryEntityGraph instead of Neo4j.
+    """
+
+    def __init__(self, graph: InMemoryEntityGraph, **kwargs):
+        super().__init__(**kwargs)
+        self.graph = graph
+
+    def write(self, graph_documents):
+        self.build_statements(graph_documents)
+        for graph_document in graph_documents:
+            self.graph.add(
+                graph_document.source.metadata.get("id"),
+                [
+                    (
+                        relationship.source.id,
+                        relationship.type,
+                        relationship.target.id,
+                    )
+                    for relationship in graph_document.relationships
+                ],
+            )
+
+    def delete_documents(self, document_ids: List[str]):
+        self.graph.delete(document_ids)
@@ -0,0 +1,144 @@
+import asyncio
+import gc
+import math
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from .scenarios import Backend, Scenario
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    q-th percentile of the values, linearly interpolated between the
+    closest ranks.
+    """
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+async def run_iterations(
+    scenario: Scenario, start: int, iterations: int, concurrency: int
+) -> List[float]:
+    """
+    Run the iterations with at most `concurrency` of them at the same time,
+    returns the duration of every iteration in seconds.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    durations = []
+
+    async def run(iteration: int):
+        input = scenario.prepare(iteration)
+        async with semaphore:
+            started_at = time.perf_counter()
+            await scenario.run(input)
+            durations.append(time.perf_counter() - started_at)
+
+    await asyncio.gather(*(run(i) for i in range(start, start + iterations)))
+    return durations
+
+
+async def measure(
+    scenario: Scenario,
+    backend: Backend,
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 1,
+    memory: bool = True,
+) -> Dict[str, Any]:
+    """
+    Benchmark a scenario: `warmup` unmeasured iterations, `iterations` timed
+    ones and then, with `memory`, a batch of `concurrency` iterations under
+    tracemalloc (it slows everything down, so it does not share a run with
+    the timings).
+    """
+    await asyncio.to_thread(scenario.setup, backend)
+
+    await run_iterations(scenario, 0, warmup, concurrency)
+
+    backend.reset_counters()
+    started_at = time.perf_counter()
+    durations = await run_iterations(scenario, warmup, iterations, concurrency)
+    elapsed = time.perf_counter() - started_at
+    counters = backend.counters()
+
+    result = {
+        "scenario": scenario.name,
+        "params": scenario.params,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "latency_ms": {
+            "mean": sum(durations) / len(durations) * 1000,
+            "min": min(durations) * 1000,
+            "max": max(durations) * 1000,
+            **{f"p{q}": percentile(durations, q) * 1000 for q in PERCENTILES},
+        },
+        "throughput_per_second": iterations / elapsed,
+        "llm_calls": {
+            kind: {
+                **counter,
+                "calls_per_iteration": counter["calls"] / iterations,
+            }
+            for kind, counter in counters.items()
+        },
+    }
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            await run_iterations(
+                scenario, warmup + iterations, max(concurrency, 1), concurrency
+            )
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+async def run_benchmarks(
+    scenarios: List[Scenario], backend_options: Dict[str, float], **options
+) -> List[Dict[str, Any]]:
+    results = []
+    for scenario in scenarios:
+        # every scenario starts from empty stores
+        results.append(
+            await measure(scenario, Backend(**backend_options), **options)
+        )
+    return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    header = (
+        f"{'scenario':<48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'ops/s':>8} {'llm/op':>7} {'emb/op':>7} {'peak MiB':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        params = ",".join(
+            f"{key}={value}" for key, value in result["params"].items()
+        )
+        latency = result["latency_ms"]
+        llm_calls = result["llm_calls"]
+        chat_calls = sum(
+            llm_calls[kind]["calls_per_iteration"]
+            for kind in ("chat", "json_chat")
+        )
+        peak = result.get("peak_memory_bytes")
+        lines.append(
+            f"{result['scenario'] + '[' + params + ']':<48} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} "
+            f"{latency['p99']:>9.1f} "
+            f"{result['throughput_per_second']:>8.2f} {chat_calls:>7.1f} "
+            f"{llm_calls['embedding']['calls_per_iteration']:>7.1f} "
+            f"{peak / 2**20 if peak is not None else float('nan'):>9.1f}"
+        )
+    return "\n".join(lines)
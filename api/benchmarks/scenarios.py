@@ -0,0 +1,364 @@
+import asyncio
+import random
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import hrag.utils.embeddings.fingerprint as fingerprint_module
+import hrag.utils.embeddings.graph.dictionary as dictionary_module
+import hrag.utils.embeddings.graph.graph as graph_module
+import hrag.utils.embeddings.vectorstore as vectorstore_module
+from hrag.models import TenantConfig
+from hrag.utils import llm_provider
+from hrag.utils.embeddings import HybridRagEmbeddings
+from hrag.utils.embeddings.graph import HybridRagEntityGraph
+from hrag.utils.enums import LanguageModelProvider, LLMFamily
+from hrag.utils.graph import HybridRagGraph
+from langchain_core.documents import Document
+from settings import app_settings
+
+from .fakes import (
+    FakeChatModel,
+    FakeEmbeddings,
+    InMemoryDocumentChunks,
+    InMemoryEntityGraph,
+    InMemoryGraphDocumentWriter,
+    InMemoryVectorStore,
+    fake_db_session,
+)
+
+COMPANIES = [
+    "Acme",
+    "Globex",
+    "Initech",
+    "Umbrella",
+    "Hooli",
+    "Soylent",
+    "Tyrell",
+    "Cyberdyne",
+    "Wonka",
+    "Vandelay Industries",
+    "Wayne Enterprises",
+    "Stark Industries",
+]
+PRODUCTS = [
+    "Rocket Skates",
+    "Anvils",
+    "Widgets",
+    "Sprockets",
+    "Flux Capacitors",
+    "Hoverboards",
+    "Jetpacks",
+    "Lawn Mowers",
+    "Chocolate Bars",
+    "Latex Gloves",
+]
+CITIES = [
+    "Springfield",
+    "Gotham",
+    "Metropolis",
+    "Shelbyville",
+    "Hill Valley",
+    "Sunnydale",
+    "Twin Peaks",
+    "Bedrock",
+]
+VERBS = ["manufactures", "sells", "designs", "repairs", "imports", "recalls"]
+
+
+def make_documents(
+    count: int, source: str = "benchmark", sentences: int = 40, seed: int = 0
+) -> List[Document]:
+    """
+    Synthetic documents made of sentences about companies, products and cities,
+    the same arguments always give the same documents.
+    """
+    rng = random.Random(f"{source}/{seed}")
+    documents = []
+    for i in range(count):
+        text = " ".join(
+            f"{rng.choice(COMPANIES)} {rng.choice(VERBS)} "
+            f"{rng.choice(PRODUCTS)} in {rng.choice(CITIES)} since "
+            f"{rng.randint(1950, 2024)}."
+            for _ in range(sentences)
+        )
+        documents.append(
+            Document(
+                page_content=text, metadata={"source": f"{source}-{i}.txt"}
+            )
+        )
+    return documents
+
+
+def make_history(messages: int) -> List[Dict[str, str]]:
+    rng = random.Random(messages)
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "ai",
+            "content": (
+                f"Where does {rng.choice(COMPANIES)} sell "
+                f"{rng.choice(PRODUCTS)}?"
+                if i % 2 == 0
+                else f"It sells them in {rng.choice(CITIES)}."
+            ),
+        }
+        for i in range(messages)
+    ]
+
+
+def make_question(iteration: int) -> str:
+    rng = random.Random(iteration)
+    return f"Which {rng.choice(PRODUCTS)} does {rng.choice(COMPANIES)} sell?"
+
+
+class Backend:
+    """
+    The fake models and in-memory stores of a scenario, patched into the
+    modules which would otherwise talk to the LLM provider, Postgres and Neo4j.
+    """
+
+    def __init__(
+        self,
+        llm_latency: float = 0.0,
+        llm_latency_per_token: float = 0.0,
+        embedding_latency: float = 0.0,
+        embedding_latency_per_text: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.tenant = TenantConfig(
+            tenant="benchmark",
+            provider=LanguageModelProvider.ollama,
+            provider_endpoint="http://benchmark",
+            provider_api_key="",
+            llm_model="benchmark-chat",
+            embedding_model="benchmark-embedding",
+            enable_summary_embedding=False,
+            prompt_family=LLMFamily.other,
+            id=uuid.uuid5(uuid.NAMESPACE_URL, "benchmark"),
+        )
+        self.latencies = {
+            "llm": (llm_latency, llm_latency_per_token),
+            "embedding": (embedding_latency, embedding_latency_per_text),
+        }
+        self.models = {
+            "chat": FakeChatModel(
+                latency=llm_latency,
+                latency_per_token=llm_latency_per_token,
+                jitter=jitter,
+            ),
+            "json_chat": FakeChatModel(
+                latency=llm_latency,
+                latency_per_token=llm_latency_per_token,
+                jitter=jitter,
+            ),
+            "embedding": FakeEmbeddings(
+                latency=embedding_latency,
+                latency_per_text=embedding_latency_per_text,
+            ),
+        }
+        self.vector_store = InMemoryVectorStore(self.models["embedding"])
+        self.entity_graph = InMemoryEntityGraph()
+        self.document_chunks = InMemoryDocumentChunks()
+
+    def install(self):
+        llm_provider.llm_clients.clear()
+        for kind, model in self.models.items():
+            llm_provider.llm_clients.get_or_create(
+                llm_provider.get_llm_client_key(self.tenant, kind),
+                lambda model=model: model,
+            )
+
+        vectorstore_module.get_vector_store = (
+            lambda *args, **kwargs: self.vector_store
+        )
+        fingerprint_module.db_session = fake_db_session
+        fingerprint_module.DocumentChunk = self.document_chunks
+
+        graph_module.get_neo4j_graph = lambda: self.entity_graph
+        graph_module.GraphDocumentWriter = (
+            lambda tenant=None: InMemoryGraphDocumentWriter(
+                self.entity_graph, tenant=tenant
+            )
+        )
+        graph_module.ensure_tenant_graph_schema = lambda tenant: None
+        graph_module.is_tenant_graph_schema_ready = lambda tenant: True
+        graph_module.aquery_graph = self.entity_graph.aquery
+        dictionary_module.aquery_graph = self.entity_graph.aquery
+        dictionary_module.entity_dictionaries.clear()
+
+        # flashrank would have to download its model
+        app_settings.enable_reranking = False
+
+    @contextmanager
+    def without_latency(self):
+        """
+        Used while the scenarios load their data, only the measured runs wait.
+        """
+        self.set_latency((0.0, 0.0), (0.0, 0.0))
+        try:
+            yield
+        finally:
+            self.set_latency(
+                self.latencies["llm"], self.latencies["embedding"]
+            )
+
+    def set_latency(self, llm: tuple, embedding: tuple):
+        for kind in ("chat", "json_chat"):
+            (
+                self.models[kind].latency,
+                self.models[kind].latency_per_token,
+            ) = llm
+        embeddings = self.models["embedding"]
+        embeddings.latency, embeddings.latency_per_text = embedding
+
+    def reset_counters(self):
+        for model in self.models.values():
+            model.counter.reset()
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        return {
+            kind: model.counter.snapshot()
+            for kind, model in self.models.items()
+        }
+
+
+class Scenario:
+    """
+    A benchmarked operation: setup() loads the data once, prepare(iteration)
+    builds the input of an iteration and run(input) is what gets measured.
+    """
+
+    name = ""
+
+    def __init__(self, **params):
+        self.params = params
+        self.backend: Backend = None
+
+    @property
+    def label(self) -> str:
+        params = ",".join(
+            f"{key}={value}" for key, value in self.params.items()
+        )
+        return f"{self.name}[{params}]"
+
+    def setup(self, backend: Backend):
+        self.backend = backend
+        backend.install()
+
+    def prepare(self, iteration: int) -> Any:
+        return iteration
+
+    async def run(self, input: Any):
+        raise NotImplementedError
+
+
+class ChatScenario(Scenario):
+    """
+    HybridRagGraph.generate_response over a corpus of `documents` documents,
+    with a conversation of `history` previous messages.
+    """
+
+    name = "chat"
+
+    def __init__(self, documents: int, history: int):
+        super().__init__(documents=documents, history=history)
+
+    def setup(self, backend: Backend):
+        super().setup(backend)
+        documents = make_documents(self.params["documents"], source="corpus")
+        with backend.without_latency():
+            HybridRagEmbeddings(tenant=backend.tenant).add_documents(documents)
+            HybridRagEntityGraph(tenant=backend.tenant).add_documents(
+                documents
+            )
+
+        self.graph = HybridRagGraph(backend.tenant)
+        self.history = make_history(self.params["history"])
+        # the summary is saved along the history, it is only rebuilt
+        # without one
+        self.summary = (
+            "The user asked where the companies sell their products."
+            if self.history
+            else None
+        )
+
+    def prepare(self, iteration: int) -> str:
+        return make_question(iteration)
+
+    async def run(self, question: str):
+        await self.graph.generate_response(
+            question, self.history, self.summary
+        )
+
+
+class EmbeddingIngestionScenario(Scenario):
+    """
+    HybridRagEmbeddings.add_documents of `documents` new documents.
+    """
+
+    name = "embedding_ingestion"
+
+    def __init__(self, documents: int):
+        super().__init__(documents=documents)
+
+    def setup(self, backend: Backend):
+        super().setup(backend)
+        self.embeddings = HybridRagEmbeddings(tenant=backend.tenant)
+
+    def prepare(self, iteration: int) -> List[Document]:
+        return make_documents(
+            self.params["documents"],
+            source=f"upload-{iteration}",
+            seed=iteration,
+        )
+
+    async def run(self, documents: List[Document]):
+        await asyncio.to_thread(self.embeddings.add_documents, documents)
+
+
+class GraphIngestionScenario(Scenario):
+    """
+    HybridRagEntityGraph.add_documents (or aadd_documents with concurrent=True)
+    of `documents` new documents.
+    """
+
+    name = "graph_ingestion"
+
+    def __init__(self, documents: int, concurrent: bool = False):
+        super().__init__(documents=documents, concurrent=concurrent)
+
+    def setup(self, backend: Backend):
+        super().setup(backend)
+        self.entity_graph = HybridRagEntityGraph(tenant=backend.tenant)
+
+    def prepare(self, iteration: int) -> List[Document]:
+        return make_documents(
+            self.params["documents"],
+            source=f"upload-{iteration}",
+            seed=iteration,
+        )
+
+    async def run(self, documents: List[Document]):
+        if self.params["concurrent"]:
+            await self.entity_graph.aadd_documents(documents)
+        else:
+            await asyncio.to_thread(self.entity_graph.add_documents, documents)
+
+
+def build_scenarios() -> List[Scenario]:
+    return [
+        *(
+            ChatScenario(documents=documents, history=history)
+            for documents in (10, 100, 1000)
+            for history in (0, 10, 40)
+        ),
+        *(
+            EmbeddingIngestionScenario(documents=documents)
+            for documents in (1, 10, 50)
+        ),
+        *(
+            GraphIngestionScenario(documents=documents, concurrent=concurrent)
+            for documents in (1, 10)
+            for concurrent in (False, True)
+        ),
+    ]
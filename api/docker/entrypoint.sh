@@ -2,4 +2,8 @@
 
 alembic upgrade head
 
+# metrics of all the gunicorn workers are collected from this directory
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 gunicorn -w 2 -k uvicorn.workers.UvicornWorker -b "0.0.0.0:8000" "main:app" --graceful-timeout 30000  --timeout 40000
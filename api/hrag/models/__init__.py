@@ -1,4 +1,7 @@
 # flake8: noqa
 
-from .tenant import Tenant
+from .document_chunk import DocumentChunk
+from .document_job import DocumentJob
+from .embedding_cache import EmbeddingCache
+from .tenant import Tenant, TenantConfig
 from .user import User
@@ -0,0 +1,166 @@
+import logging
+import uuid
+from typing import Iterable, Set
+
+import sqlalchemy as db
+from hrag.utils.enums import DocumentChunkKind
+from sqlalchemy.dialects.postgresql import UUID, insert
+
+from .base import Base
+from .base_model import BaseModel
+
+log = logging.getLogger("gunicorn.error")
+
+
+class DocumentChunk(BaseModel, Base):
+    """
+    Fingerprint of a chunk already stored for a tenant and of the source it is
+    part of, so chunks already stored are not processed again.
+    """
+
+    __tablename__ = "document_chunk"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "tenant_id",
+            "kind",
+            "source",
+            "fingerprint",
+            name="uq_document_chunk_fingerprint",
+        ),
+        # chunks are stored once per tenant, whatever the source
+        db.Index(
+            "ix_document_chunk_fingerprint", "tenant_id", "kind", "fingerprint"
+        ),
+    )
+    _primary_key_names = ["id"]
+
+    tenant_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey("tenant.id"),
+        nullable=False,
+        index=True,
+    )
+    kind = db.Column(
+        db.Enum(DocumentChunkKind),
+        nullable=False,
+    )
+    source = db.Column(
+        db.Unicode(1024),
+        nullable=False,
+    )
+    fingerprint = db.Column(
+        db.Unicode(64),
+        nullable=False,
+    )
+
+    def __init__(
+        self,
+        tenant_id: uuid.UUID,
+        kind: DocumentChunkKind,
+        source: str,
+        fingerprint: str,
+        status: bool = True,
+    ):
+        super().__init__(status=status)
+        self.tenant_id = tenant_id
+        self.kind = kind
+        self.source = source
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def get_fingerprints(
+        cls, tenant_id: uuid.UUID, kind: DocumentChunkKind, source: str
+    ) -> Set[str]:
+        from fastapi_sqlalchemy import db as db_session
+
+        query = db_session.session.query(DocumentChunk.fingerprint).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.kind == kind,
+            DocumentChunk.source == source,
+        )
+        return {row.fingerprint for row in query.all()}
+
+    @classmethod
+    def get_stored_fingerprints(
+        cls,
+        tenant_id: uuid.UUID,
+        kind: DocumentChunkKind,
+        fingerprints: Iterable[str] = None,
+    ) -> Set[str]:
+        """
+        The fingerprints (among the given ones if any) stored for any source.
+        """
+        from fastapi_sqlalchemy import db as db_session
+
+        query = db_session.session.query(DocumentChunk.fingerprint).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.kind == kind,
+        )
+        if fingerprints is not None:
+            fingerprints = list(fingerprints)
+            if not fingerprints:
+                return set()
+            query = query.filter(DocumentChunk.fingerprint.in_(fingerprints))
+
+        return {row.fingerprint for row in query.distinct().all()}
+
+    @classmethod
+    def add_fingerprints(
+        cls,
+        tenant_id: uuid.UUID,
+        kind: DocumentChunkKind,
+        source: str,
+        fingerprints: Iterable[str],
+    ):
+        from fastapi_sqlalchemy import db as db_session
+
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "status": True,
+                "tenant_id": tenant_id,
+                "kind": kind,
+                "source": source,
+                "fingerprint": fingerprint,
+            }
+            for fingerprint in set(fingerprints)
+        ]
+        if not rows:
+            return
+
+        db_session.session.execute(
+            insert(DocumentChunk)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_document_chunk_fingerprint")
+        )
+        db_session.session.flush()
+
+    @classmethod
+    def remove_fingerprints(
+        cls,
+        tenant_id: uuid.UUID,
+        kind: DocumentChunkKind,
+        source: str,
+        fingerprints: Iterable[str],
+    ):
+        from fastapi_sqlalchemy import db as db_session
+
+        db_session.session.query(DocumentChunk).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.kind == kind,
+            DocumentChunk.source == source,
+            DocumentChunk.fingerprint.in_(list(fingerprints)),
+        ).delete(synchronize_session=False)
+        db_session.session.flush()
+
+    @classmethod
+    def clear_fingerprints(
+        cls, tenant_id: uuid.UUID, *kinds: DocumentChunkKind
+    ):
+        from fastapi_sqlalchemy import db as db_session
+
+        db_session.session.query(DocumentChunk).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.kind.in_(kinds),
+        ).delete(synchronize_session=False)
+        db_session.session.flush()
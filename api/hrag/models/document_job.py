@@ -0,0 +1,263 @@
+import logging
+import uuid
+from datetime import timedelta
+
+import sqlalchemy as db
+from fastapi.exceptions import HTTPException
+from hrag.utils.enums import DocumentJobStatus
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from .base import Base
+from .base_model import BaseModel
+
+log = logging.getLogger("gunicorn.error")
+
+
+class DocumentJob(BaseModel, Base):
+    __tablename__ = "document_job"
+    _primary_key_names = ["id"]
+
+    tenant_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey("tenant.id"),
+        nullable=False,
+        index=True,
+    )
+    file_name = db.Column(
+        db.Unicode(1024),
+        nullable=False,
+    )
+    # identity of the document given by the client, a new upload of the same
+    # document replaces its previous version (the file name by default)
+    document_id = db.Column(
+        db.Unicode(1024),
+        nullable=True,
+    )
+    file_path = db.Column(
+        db.Unicode(1024),
+        nullable=False,
+    )
+    extension = db.Column(
+        db.Unicode(32),
+        nullable=True,
+    )
+    job_status = db.Column(
+        db.Enum(DocumentJobStatus),
+        nullable=False,
+        default=DocumentJobStatus.pending,
+        index=True,
+    )
+    chunks_to_embed = db.Column(db.Integer, nullable=False, default=0)
+    chunks_embedded = db.Column(db.Integer, nullable=False, default=0)
+    chunks_to_extract = db.Column(db.Integer, nullable=False, default=0)
+    chunks_extracted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(
+        db.UnicodeText(),
+        nullable=True,
+    )
+    started_dt = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_dt = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    tenant = relationship(
+        "Tenant",
+        primaryjoin="Tenant.id == DocumentJob.tenant_id",
+        backref="jobs",
+    )
+
+    def __init__(
+        self,
+        tenant_id: uuid.UUID,
+        file_name: str,
+        file_path: str,
+        extension: str = None,
+        document_id: str = None,
+        status: bool = True,
+    ):
+        super().__init__(status=status)
+        self.tenant_id = tenant_id
+        self.file_name = file_name
+        self.file_path = file_path
+        self.extension = extension
+        self.document_id = document_id
+        self.job_status = DocumentJobStatus.pending
+        self.chunks_to_embed = 0
+        self.chunks_embedded = 0
+        self.chunks_to_extract = 0
+        self.chunks_extracted = 0
+
+    @classmethod
+    def create_job(
+        cls,
+        tenant_id: uuid.UUID,
+        file_name: str,
+        file_path: str,
+        extension: str = None,
+        document_id: str = None,
+    ):
+        from fastapi_sqlalchemy import db as db_session
+
+        job = cls(
+            tenant_id=tenant_id,
+            file_name=file_name,
+            file_path=file_path,
+            extension=extension,
+            document_id=document_id,
+        )
+        db_session.session.add(job)
+        db_session.session.flush()
+
+        return job
+
+    @classmethod
+    def get_job(cls, job_id: uuid.UUID, tenant_id: uuid.UUID = None):
+        from fastapi_sqlalchemy import db as db_session
+
+        query = db_session.session.query(DocumentJob).filter(
+            DocumentJob.id == job_id
+        )
+        if tenant_id is not None:
+            query = query.filter(DocumentJob.tenant_id == tenant_id)
+
+        job = query.first()
+        if not job:
+            log.debug("Unknown document job")
+            raise HTTPException(
+                status_code=404, detail="No document job found."
+            )
+
+        return job
+
+    @classmethod
+    def get_pending_jobs(cls):
+        from fastapi_sqlalchemy import db as db_session
+
+        return (
+            db_session.session.query(DocumentJob)
+            .filter(DocumentJob.job_status == DocumentJobStatus.pending)
+            .order_by(DocumentJob.created_dt)
+            .all()
+        )
+
+    @classmethod
+    def requeue_stale_jobs(cls, timeout: int) -> int:
+        """
+        Move back to pending the processing jobs without any progress for
+        `timeout` seconds, left behind by a worker that died. Returns the
+        number of jobs moved.
+        """
+        from fastapi_sqlalchemy import db as db_session
+
+        requeued = (
+            db_session.session.query(DocumentJob)
+            .filter(
+                DocumentJob.job_status == DocumentJobStatus.processing,
+                DocumentJob.updated_dt
+                < func.now() - timedelta(seconds=timeout),
+            )
+            .update(
+                {
+                    DocumentJob.job_status: DocumentJobStatus.pending,
+                    DocumentJob.started_dt: None,
+                },
+                synchronize_session=False,
+            )
+        )
+        db_session.session.flush()
+
+        return requeued
+
+    @classmethod
+    def claim_job(cls, job_id: uuid.UUID) -> bool:
+        """
+        Atomically move a pending job to processing, returns False if another
+        worker (or process) already claimed it.
+        """
+        from fastapi_sqlalchemy import db as db_session
+
+        claimed = (
+            db_session.session.query(DocumentJob)
+            .filter(
+                DocumentJob.id == job_id,
+                DocumentJob.job_status == DocumentJobStatus.pending,
+            )
+            .update(
+                {
+                    DocumentJob.job_status: DocumentJobStatus.processing,
+                    DocumentJob.started_dt: func.now(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db_session.session.flush()
+
+        return claimed == 1
+
+    def update_progress(
+        self,
+        chunks_to_embed: int = None,
+        chunks_embedded: int = None,
+        chunks_to_extract: int = None,
+        chunks_extracted: int = None,
+    ):
+        from fastapi_sqlalchemy import db as db_session
+
+        if chunks_to_embed is not None:
+            self.chunks_to_embed = chunks_to_embed
+        if chunks_embedded is not None:
+            self.chunks_embedded = chunks_embedded
+        if chunks_to_extract is not None:
+            self.chunks_to_extract = chunks_to_extract
+        if chunks_extracted is not None:
+            self.chunks_extracted = chunks_extracted
+
+        db_session.session.add(self)
+        db_session.session.flush()
+
+    def complete(self):
+        from fastapi_sqlalchemy import db as db_session
+
+        self.job_status = DocumentJobStatus.completed
+        self.finished_dt = func.now()
+        db_session.session.add(self)
+        db_session.session.flush()
+
+    def reset(self):
+        """
+        Put an interrupted job back in the queue.
+        """
+        from fastapi_sqlalchemy import db as db_session
+
+        self.job_status = DocumentJobStatus.pending
+        self.started_dt = None
+        db_session.session.add(self)
+        db_session.session.flush()
+
+    def fail(self, error: str):
+        from fastapi_sqlalchemy import db as db_session
+
+        self.job_status = DocumentJobStatus.failed
+        self.error = error
+        self.finished_dt = func.now()
+        db_session.session.add(self)
+        db_session.session.flush()
+
+    @property
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": self.tenant_id,
+            "file_name": self.file_name,
+            "document_id": self.document_id,
+            "job_status": self.job_status,
+            "chunks_to_embed": self.chunks_to_embed,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_to_extract": self.chunks_to_extract,
+            "chunks_extracted": self.chunks_extracted,
+            "error": self.error,
+            "started_dt": self.started_dt,
+            "finished_dt": self.finished_dt,
+            "created_dt": self.created_dt,
+            "updated_dt": self.updated_dt,
+        }
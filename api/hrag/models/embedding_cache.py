@@ -0,0 +1,90 @@
+import logging
+import uuid
+from typing import Dict, Iterable, List
+
+import sqlalchemy as db
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from .base import Base
+from .base_model import BaseModel
+
+log = logging.getLogger("gunicorn.error")
+
+
+class EmbeddingCache(BaseModel, Base):
+    """
+    Embeddings already computed by a model, keyed by the hash of the
+    embedded text.
+    """
+
+    __tablename__ = "embedding_cache"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "model", "text_hash", name="uq_embedding_cache_text"
+        ),
+    )
+    _primary_key_names = ["id"]
+
+    model = db.Column(
+        db.Unicode(1024),
+        nullable=False,
+    )
+    text_hash = db.Column(
+        db.Unicode(64),
+        nullable=False,
+    )
+    embedding = db.Column(
+        ARRAY(db.Float),
+        nullable=False,
+    )
+
+    def __init__(
+        self,
+        model: str,
+        text_hash: str,
+        embedding: List[float],
+        status: bool = True,
+    ):
+        super().__init__(status=status)
+        self.model = model
+        self.text_hash = text_hash
+        self.embedding = embedding
+
+    @classmethod
+    def get_embeddings(
+        cls, model: str, text_hashes: Iterable[str]
+    ) -> Dict[str, List[float]]:
+        from fastapi_sqlalchemy import db as db_session
+
+        query = db_session.session.query(
+            EmbeddingCache.text_hash, EmbeddingCache.embedding
+        ).filter(
+            EmbeddingCache.model == model,
+            EmbeddingCache.text_hash.in_(list(text_hashes)),
+        )
+        return {row.text_hash: row.embedding for row in query.all()}
+
+    @classmethod
+    def add_embeddings(cls, model: str, embeddings: Dict[str, List[float]]):
+        from fastapi_sqlalchemy import db as db_session
+
+        if not embeddings:
+            return
+
+        db_session.session.execute(
+            insert(EmbeddingCache)
+            .values(
+                [
+                    {
+                        "id": uuid.uuid4(),
+                        "status": True,
+                        "model": model,
+                        "text_hash": text_hash,
+                        "embedding": embedding,
+                    }
+                    for text_hash, embedding in embeddings.items()
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_embedding_cache_text")
+        )
+        db_session.session.flush()
@@ -1,9 +1,16 @@
 import logging
+import uuid
+from typing import NamedTuple, Optional
 
 import sqlalchemy as db
 from fastapi.exceptions import HTTPException
-from hrag.utils.enums import LanguageModelProvider, LLMFamily
-from hrag.utils.llm_provider import get_llm_provider_enum, get_necessary_llms
+from hrag.utils.cache import hash_secret
+from hrag.utils.enums import LanguageModelProvider, LLMFamily, VerificationMode
+from hrag.utils.llm_provider import (
+    get_llm_provider_enum,
+    get_necessary_llms,
+    invalidate_llms,
+)
 from settings import app_settings
 
 from .base import Base
@@ -14,6 +21,55 @@ log = logging.getLogger("gunicorn.error")
 default_llm_provider = get_llm_provider_enum(app_settings.default_llm_provider)
 
 
+class TenantConfig(NamedTuple):
+    """
+    Immutable copy of the tenant settings. Unlike the Tenant row it stays
+    usable after the request session is closed, so it is what process wide
+    caches hold on to.
+    """
+
+    tenant: str
+    provider: LanguageModelProvider
+    provider_endpoint: Optional[str]
+    provider_api_key: Optional[str]
+    llm_model: Optional[str]
+    embedding_model: Optional[str]
+    enable_summary_embedding: bool
+    prompt_family: Optional[LLMFamily]
+    enable_answer_cache: bool = False
+    answer_cache_ttl: int = 0
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+    reranker_model: Optional[str] = None
+    reranker_top_n: Optional[int] = None
+    verification_mode: Optional[VerificationMode] = None
+    id: Optional[uuid.UUID] = None
+
+    @property
+    def llms(self):
+        return get_necessary_llms(self)
+
+    @property
+    def cache_key(self) -> tuple:
+        return (
+            self.tenant,
+            self.provider,
+            self.provider_endpoint,
+            hash_secret(self.provider_api_key),
+            self.llm_model,
+            self.embedding_model,
+            self.enable_summary_embedding,
+            self.prompt_family,
+            self.enable_answer_cache,
+            self.answer_cache_ttl,
+            self.hnsw_ef_search,
+            self.ivfflat_probes,
+            self.reranker_model,
+            self.reranker_top_n,
+            self.verification_mode,
+        )
+
+
 class Tenant(BaseModel, Base):
     __tablename__ = "tenant"
     _primary_key_names = ["id"]
@@ -51,6 +107,41 @@ class Tenant(BaseModel, Base):
         nullable=False,
         index=True,
     )
+    enable_answer_cache = db.Column(
+        db.Boolean,
+        default=False,
+        nullable=False,
+    )
+    # seconds a verified answer can be served from the answer cache
+    answer_cache_ttl = db.Column(
+        db.Integer,
+        default=app_settings.default_answer_cache_ttl,
+        nullable=False,
+    )
+    # ANN search settings, the postgres defaults are used when not set
+    hnsw_ef_search = db.Column(
+        db.Integer,
+        nullable=True,
+    )
+    ivfflat_probes = db.Column(
+        db.Integer,
+        nullable=True,
+    )
+    # FlashRank model and number of documents kept by the reranker, the app
+    # defaults are used when not set
+    reranker_model = db.Column(
+        db.Unicode(128),
+        nullable=True,
+    )
+    reranker_top_n = db.Column(
+        db.Integer,
+        nullable=True,
+    )
+    # how generated answers are checked, the app default is used when not set
+    verification_mode = db.Column(
+        db.Enum(VerificationMode),
+        nullable=True,
+    )
 
     unique_columns = ["tenant"]
     prompt_family = None  # a non db field
@@ -64,6 +155,13 @@ class Tenant(BaseModel, Base):
         llm_model=None,
         embedding_model=None,
         enable_summary_embedding=True,
+        enable_answer_cache=False,
+        answer_cache_ttl=app_settings.default_answer_cache_ttl,
+        hnsw_ef_search=None,
+        ivfflat_probes=None,
+        reranker_model=None,
+        reranker_top_n=None,
+        verification_mode=None,
         status=True,
     ):
         super().__init__(status=status)
@@ -74,6 +172,13 @@ class Tenant(BaseModel, Base):
         self.llm_model = llm_model
         self.embedding_model = embedding_model
         self.enable_summary_embedding = enable_summary_embedding
+        self.enable_answer_cache = enable_answer_cache
+        self.answer_cache_ttl = answer_cache_ttl
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivfflat_probes = ivfflat_probes
+        self.reranker_model = reranker_model
+        self.reranker_top_n = reranker_top_n
+        self.verification_mode = verification_mode
 
     @classmethod
     def get_tenant(
@@ -84,7 +189,9 @@ class Tenant(BaseModel, Base):
     ):
         from fastapi_sqlalchemy import db as db_session
 
-        query = db_session.session.query(Tenant).filter(Tenant.tenant == tenant)
+        query = db_session.session.query(Tenant).filter(
+            Tenant.tenant == tenant
+        )
         if not include_inactive:
             query.filter(Tenant.status == True)
 
@@ -96,7 +203,9 @@ class Tenant(BaseModel, Base):
 
         if not tenant_obj:
             log.debug("Unknown or inactive tenant")
-            raise HTTPException(status_code=404, detail="No active tenant found.")
+            raise HTTPException(
+                status_code=404, detail="No active tenant found."
+            )
 
         if "llama" in tenant_obj.llm_model.lower():
             tenant_obj.prompt_family = LLMFamily.llama
@@ -116,6 +225,13 @@ class Tenant(BaseModel, Base):
         llm_model: str = app_settings.default_llm_model,
         embedding_model: str = app_settings.default_embedding_model,
         enable_summary_embedding: bool = True,
+        enable_answer_cache: bool = False,
+        answer_cache_ttl: int = app_settings.default_answer_cache_ttl,
+        hnsw_ef_search: int = None,
+        ivfflat_probes: int = None,
+        reranker_model: str = None,
+        reranker_top_n: int = None,
+        verification_mode: VerificationMode = None,
     ):
         from fastapi_sqlalchemy import db as db_session
 
@@ -127,6 +243,13 @@ class Tenant(BaseModel, Base):
             llm_model=llm_model,
             embedding_model=embedding_model,
             enable_summary_embedding=enable_summary_embedding,
+            enable_answer_cache=enable_answer_cache,
+            answer_cache_ttl=answer_cache_ttl,
+            hnsw_ef_search=hnsw_ef_search,
+            ivfflat_probes=ivfflat_probes,
+            reranker_model=reranker_model,
+            reranker_top_n=reranker_top_n,
+            verification_mode=verification_mode,
         )
 
         db_session.session.add(tenant_obj)
@@ -138,6 +261,27 @@ class Tenant(BaseModel, Base):
     def llms(self):
         return get_necessary_llms(self)
 
+    @property
+    def config(self) -> TenantConfig:
+        return TenantConfig(
+            tenant=self.tenant,
+            provider=self.provider,
+            provider_endpoint=self.provider_endpoint,
+            provider_api_key=self.provider_api_key,
+            llm_model=self.llm_model,
+            embedding_model=self.embedding_model,
+            enable_summary_embedding=self.enable_summary_embedding,
+            prompt_family=self.prompt_family,
+            enable_answer_cache=self.enable_answer_cache,
+            answer_cache_ttl=self.answer_cache_ttl,
+            hnsw_ef_search=self.hnsw_ef_search,
+            ivfflat_probes=self.ivfflat_probes,
+            reranker_model=self.reranker_model,
+            reranker_top_n=self.reranker_top_n,
+            verification_mode=self.verification_mode,
+            id=self.id,
+        )
+
     @property
     def to_dict(self):
         return {
@@ -149,6 +293,13 @@ class Tenant(BaseModel, Base):
             "llm_model": self.llm_model,
             "embedding_model": self.embedding_model,
             "enable_summary_embedding": self.enable_summary_embedding,
+            "enable_answer_cache": self.enable_answer_cache,
+            "answer_cache_ttl": self.answer_cache_ttl,
+            "hnsw_ef_search": self.hnsw_ef_search,
+            "ivfflat_probes": self.ivfflat_probes,
+            "reranker_model": self.reranker_model,
+            "reranker_top_n": self.reranker_top_n,
+            "verification_mode": self.verification_mode,
             "status": self.status,
             "created_dt": self.created_dt,
             "updated_dt": self.updated_dt,
@@ -176,9 +327,39 @@ class Tenant(BaseModel, Base):
         llm_model: str = None,
         embedding_model: str = None,
         enable_summary_embedding: bool = None,
+        enable_answer_cache: bool = None,
+        answer_cache_ttl: int = None,
+        hnsw_ef_search: int = None,
+        ivfflat_probes: int = None,
+        reranker_model: str = None,
+        reranker_top_n: int = None,
+        verification_mode: VerificationMode = None,
     ):
         from fastapi_sqlalchemy import db as db_session
 
+        new_settings = {
+            "provider": provider,
+            "provider_endpoint": provider_endpoint,
+            "provider_api_key": provider_api_key,
+            "llm_model": llm_model,
+            "embedding_model": embedding_model,
+            "enable_summary_embedding": enable_summary_embedding,
+            "enable_answer_cache": enable_answer_cache,
+            "answer_cache_ttl": answer_cache_ttl,
+            "hnsw_ef_search": hnsw_ef_search,
+            "ivfflat_probes": ivfflat_probes,
+            "reranker_model": reranker_model,
+            "reranker_top_n": reranker_top_n,
+            "verification_mode": verification_mode,
+        }
+        if any(
+            value is not None and value != getattr(self, name)
+            for name, value in new_settings.items()
+        ):
+            # clients built from the old settings must not be handed
+            # out anymore
+            self.invalidate_caches()
+
         if provider is not None:
             self.provider = provider
         if provider_endpoint is not None:
@@ -191,6 +372,28 @@ class Tenant(BaseModel, Base):
             self.embedding_model = embedding_model
         if enable_summary_embedding is not None:
             self.enable_summary_embedding = enable_summary_embedding
+        if enable_answer_cache is not None:
+            self.enable_answer_cache = enable_answer_cache
+        if answer_cache_ttl is not None:
+            self.answer_cache_ttl = answer_cache_ttl
+        if hnsw_ef_search is not None:
+            self.hnsw_ef_search = hnsw_ef_search
+        if ivfflat_probes is not None:
+            self.ivfflat_probes = ivfflat_probes
+        if reranker_model is not None:
+            self.reranker_model = reranker_model
+        if reranker_top_n is not None:
+            self.reranker_top_n = reranker_top_n
+        if verification_mode is not None:
+            self.verification_mode = verification_mode
 
         db_session.session.add(self)
         db_session.session.flush()
+
+    def invalidate_caches(self):
+        from hrag.utils.embeddings.pgvector import invalidate_vector_stores
+        from hrag.utils.graph import invalidate_hybrid_rag_graphs
+
+        invalidate_llms(self)
+        invalidate_vector_stores(self)
+        invalidate_hybrid_rag_graphs(self)
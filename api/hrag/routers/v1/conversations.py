@@ -1,12 +1,14 @@
 import logging
 from http import HTTPStatus
 
+from fastapi.responses import StreamingResponse
 from fastapi_versioning.versioning import version
 from hrag.routers.router import conversations
 from hrag.schema import ChatSchemaRequest, ChatSchemaResponse
 from hrag.utils.conversation import (
     generate_chat_response,
     remove_user_chat_history,
+    stream_chat_response,
 )
 from settings import app_settings
 
@@ -29,6 +31,22 @@ async def generate_response(tenant: str, chat: ChatSchemaRequest):
     return {"message": message}
 
 
+@conversations.post(
+    "/stream/",
+    response_class=StreamingResponse,
+    description="Generate response with Reception AI, streamed as "
+    "Server-Sent Events (stage, token, reset, message and error events)",
+)
+@version(1)
+async def generate_streaming_response(tenant: str, chat: ChatSchemaRequest):
+    events = await stream_chat_response(
+        user_id=chat.user_id,
+        message=chat.message,
+        tenant=tenant,
+    )
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
 @conversations.delete(
     "/{user_id}/",
     status_code=HTTPStatus.ACCEPTED,
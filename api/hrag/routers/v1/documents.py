@@ -1,27 +1,96 @@
+import uuid
 from http import HTTPStatus
+from typing import Optional
 
-from fastapi import HTTPException, UploadFile
+from fastapi import Form, HTTPException, UploadFile
 from fastapi_versioning import version
 from hrag.routers.router import documents
+from hrag.schema import (
+    DocumentIndexRequest,
+    DocumentIndexResponse,
+    DocumentJobResponse,
+)
 from hrag.utils.document import (
     add_document_to_tenant,
+    build_document_index,
     cleanup_documents_from_tenant,
+    get_document_index,
+    get_document_job,
 )
 from hrag.utils.exceptions import HybridRagException
 
 
 @documents.post(
     "/",
-    description="Add a document to tenant. Accepting txt, docx, pdf files.",
+    description="Add a document to tenant. Accepting txt, docx, pdf files. "
+    "The document is processed in the background, poll the returned job for "
+    "progress. Uploading a document again (same document_id, or same file "
+    "name without one) replaces its previous version.",
     status_code=HTTPStatus.ACCEPTED,
+    response_model=DocumentJobResponse,
 )
 @version(1)
 async def add_document(
     tenant: str,
     document: UploadFile,
+    document_id: Optional[str] = Form(None, max_length=1024),
 ):
     try:
-        await add_document_to_tenant(tenant, document)
+        job = await add_document_to_tenant(tenant, document, document_id)
+
+        return job.to_dict
+    except HybridRagException as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_GATEWAY, detail=str(e))
+
+
+@documents.get(
+    "/jobs/{job_id}/",
+    description="Get the processing status of an uploaded document.",
+    status_code=HTTPStatus.OK,
+    response_model=DocumentJobResponse,
+)
+@version(1)
+async def get_document_job_status(tenant: str, job_id: uuid.UUID):
+    try:
+        job = await get_document_job(tenant, job_id)
+
+        return job.to_dict
+    except HybridRagException as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+
+
+@documents.get(
+    "/index/",
+    description="Get the ANN index of the document embeddings of tenant.",
+    status_code=HTTPStatus.OK,
+    response_model=DocumentIndexResponse,
+)
+@version(1)
+async def get_index(tenant: str):
+    try:
+        return await get_document_index(tenant) or {}
+    except HybridRagException as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+
+
+@documents.post(
+    "/index/",
+    description="Build (or rebuild) the ANN index of the document embeddings "
+    "of tenant. The index is also built automatically once the collection is "
+    "large enough.",
+    status_code=HTTPStatus.OK,
+    response_model=DocumentIndexResponse,
+)
+@version(1)
+async def build_index(tenant: str, request: DocumentIndexRequest):
+    try:
+        return await build_document_index(
+            tenant, index_type=request.index_type, rebuild=request.rebuild
+        )
     except HybridRagException as e:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -34,6 +34,13 @@ async def create_tenant(
             llm_model=create_request.llm_model,
             embedding_model=create_request.embedding_model,
             enable_summary_embedding=create_request.enable_summary_embedding,
+            enable_answer_cache=create_request.enable_answer_cache,
+            answer_cache_ttl=create_request.answer_cache_ttl,
+            hnsw_ef_search=create_request.hnsw_ef_search,
+            ivfflat_probes=create_request.ivfflat_probes,
+            reranker_model=create_request.reranker_model,
+            reranker_top_n=create_request.reranker_top_n,
+            verification_mode=create_request.verification_mode,
         )
 
         return tenant_obj
@@ -83,6 +90,13 @@ async def update_tenant(tenant: str, update_request: TenantUpdateRequest):
         llm_model=update_request.llm_model,
         embedding_model=update_request.embedding_model,
         enable_summary_embedding=update_request.enable_summary_embedding,
+        enable_answer_cache=update_request.enable_answer_cache,
+        answer_cache_ttl=update_request.answer_cache_ttl,
+        hnsw_ef_search=update_request.hnsw_ef_search,
+        ivfflat_probes=update_request.ivfflat_probes,
+        reranker_model=update_request.reranker_model,
+        reranker_top_n=update_request.reranker_top_n,
+        verification_mode=update_request.verification_mode,
     )
 
     return tenant_obj
@@ -110,7 +124,9 @@ async def deactivate_tenant(tenant: str):
 )
 @version(1)
 async def activate_tenant(tenant: str):
-    tenant = Tenant.get_tenant(tenant, create_if_not_exist=False, include_inactive=True)
+    tenant = Tenant.get_tenant(
+        tenant, create_if_not_exist=False, include_inactive=True
+    )
     tenant.activate()
 
     return tenant
@@ -1,4 +1,9 @@
 # flake8: noqa
 
 from .conversation import ChatSchemaRequest, ChatSchemaResponse
+from .document import (
+    DocumentIndexRequest,
+    DocumentIndexResponse,
+    DocumentJobResponse,
+)
 from .tenant import TenantCreateRequest, TenantResponse, TenantUpdateRequest
@@ -0,0 +1,35 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from hrag.utils.enums import AnnIndexType, DocumentJobStatus
+from pydantic import BaseModel
+
+
+class DocumentJobResponse(BaseModel):
+    id: uuid.UUID
+    tenant_id: uuid.UUID
+    file_name: str
+    document_id: Optional[str] = None
+    job_status: DocumentJobStatus
+    chunks_to_embed: int
+    chunks_embedded: int
+    chunks_to_extract: int
+    chunks_extracted: int
+    error: Optional[str] = None
+    started_dt: Optional[datetime] = None
+    finished_dt: Optional[datetime] = None
+    created_dt: datetime
+    updated_dt: datetime
+
+
+class DocumentIndexRequest(BaseModel):
+    index_type: Optional[AnnIndexType] = None
+    rebuild: bool = False
+
+
+class DocumentIndexResponse(BaseModel):
+    index_name: Optional[str] = None
+    index_type: Optional[AnnIndexType] = None
+    dimension: Optional[int] = None
+    rows: int = 0
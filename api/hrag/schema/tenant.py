@@ -2,8 +2,9 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from hrag.utils.enums import LanguageModelProvider
+from hrag.utils.enums import LanguageModelProvider, VerificationMode
 from pydantic import BaseModel
+from settings import app_settings
 
 
 class TenantUpdateRequest(BaseModel):
@@ -13,12 +14,21 @@ class TenantUpdateRequest(BaseModel):
     llm_model: Optional[str] = None
     embedding_model: Optional[str] = None
     enable_summary_embedding: Optional[bool] = None
+    enable_answer_cache: Optional[bool] = None
+    answer_cache_ttl: Optional[int] = None
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+    reranker_model: Optional[str] = None
+    reranker_top_n: Optional[int] = None
+    verification_mode: Optional[VerificationMode] = None
 
 
 class TenantCreateRequest(TenantUpdateRequest):
     tenant: str
     provider: LanguageModelProvider = LanguageModelProvider.ollama
     enable_summary_embedding: Optional[bool] = True
+    enable_answer_cache: Optional[bool] = False
+    answer_cache_ttl: Optional[int] = app_settings.default_answer_cache_ttl
 
 
 class TenantResponse(TenantCreateRequest):
@@ -0,0 +1,78 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Hashable, List, Optional
+
+log = logging.getLogger("gunicorn.error")
+
+
+def hash_secret(secret: str) -> str:
+    """
+    Hash a secret (e.g. an api key) so it can be used inside a cache key
+    without keeping the raw value around.
+    """
+    if not secret:
+        return ""
+
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+class ProcessCache:
+    """
+    A thread safe, process wide registry of expensive objects (LLM clients,
+    vector stores, compiled graphs, ...) keyed by the configuration they were
+    built from.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._items = {}
+        self._lock = threading.RLock()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        item = self._items.get(key)
+        if item is not None:
+            return item
+
+        with self._lock:
+            # another thread might have built it while we were waiting for
+            # the lock
+            item = self._items.get(key)
+            if item is None:
+                log.debug("[%s] building new item for %s", self.name, key)
+                item = factory()
+                self._items[key] = item
+
+        return item
+
+    def invalidate(
+        self,
+        predicate: Callable[[Hashable], bool],
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ) -> List[Any]:
+        """
+        Remove the items whose key matches the predicate, returns the
+        removed items.
+        """
+        evicted = []
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                log.debug("[%s] invalidating %s", self.name, key)
+                item = self._items.pop(key)
+                if on_evict is not None:
+                    on_evict(item)
+                evicted.append(item)
+
+        return evicted
+
+    def clear(
+        self, on_evict: Optional[Callable[[Any], None]] = None
+    ) -> List[Any]:
+        return self.invalidate(lambda key: True, on_evict=on_evict)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
@@ -1,40 +1,117 @@
+import json
 import logging
 
 from hrag.models import Tenant, User
 from hrag.utils.graph import HybridRagGraph
+from hrag.utils.tracing import start_span, traced
 from settings import app_settings
 
 logger = logging.getLogger("gunicorn.error")
 logger.setLevel(app_settings.log_level.upper())
 
 
+@traced()
 async def generate_chat_response(user_id: str, message: str, tenant: str):
     logger.debug(f"message: {message}")
     logger.debug(f"tenant: {tenant}")
     logger.debug(f"user_id {user_id}")
-    tenant_obj = Tenant.get_tenant(tenant)
+    with start_span("conversation.get_tenant"):
+        tenant_obj = Tenant.get_tenant(tenant)
 
-    user_obj = User.get_or_create_user(
-        username=user_id,
-        tenant_id=tenant_obj.id,
-        create_if_not_exist=True,
-        include_inactive=False,
-    )
+    with start_span("conversation.get_user"):
+        user_obj = User.get_or_create_user(
+            username=user_id,
+            tenant_id=tenant_obj.id,
+            create_if_not_exist=True,
+            include_inactive=False,
+        )
+
+    graph = HybridRagGraph.for_tenant(tenant_obj)
 
-    graph = HybridRagGraph(
-        tenant_obj,
+    response, new_summary = await graph.generate_response(
+        message,
         user_obj.chat_history,
         user_obj.chat_summary,
     )
 
-    response = graph.generate_response(message)
+    with start_span("conversation.save_history"):
+        user_obj.update_chat_history(
+            user_message=message,
+            ai_message=response,
+            new_summary=new_summary,
+        )
+    return response
+
+
+@traced()
+async def stream_chat_response(user_id: str, message: str, tenant: str):
+    """
+    Look the tenant and user up, then return an async iterator of the
+    chat events (see HybridRagGraph.stream_response) formatted as
+    Server-Sent Events.
+    """
+    logger.debug(f"message: {message}")
+    logger.debug(f"tenant: {tenant}")
+    logger.debug(f"user_id {user_id}")
+    with start_span("conversation.get_tenant"):
+        tenant_obj = Tenant.get_tenant(tenant)
+
+    with start_span("conversation.get_user"):
+        user_obj = User.get_or_create_user(
+            username=user_id,
+            tenant_id=tenant_obj.id,
+            create_if_not_exist=True,
+            include_inactive=False,
+        )
 
-    user_obj.update_chat_history(
-        user_message=message,
-        ai_message=response,
-        new_summary=graph.memory.buffer,
+    graph = HybridRagGraph.for_tenant(tenant_obj)
+    memory = await graph.load_memory(
+        user_obj.chat_history, user_obj.chat_summary
     )
-    return response
+
+    return _stream_chat_events(graph, memory, message, user_id, tenant_obj.id)
+
+
+async def _stream_chat_events(graph, memory, message, user_id, tenant_id):
+    from fastapi_sqlalchemy import db as db_session
+
+    response = None
+    try:
+        async for event in graph.stream_response(message, memory):
+            if event["event"] == "message":
+                response = event["data"]["message"]
+            yield to_server_sent_event(event)
+    except Exception as e:
+        logger.exception("Failed to stream chat response")
+        yield to_server_sent_event(
+            {"event": "error", "data": {"detail": str(e)}}
+        )
+        return
+
+    if response is None:
+        return
+
+    await graph.save_memory(memory, message, response)
+
+    # the request session is already closed once the response starts streaming
+    with start_span("conversation.save_history"), db_session(
+        commit_on_exit=True
+    ):
+        user_obj = User.get_or_create_user(
+            username=user_id,
+            tenant_id=tenant_id,
+            create_if_not_exist=True,
+            include_inactive=False,
+        )
+        user_obj.update_chat_history(
+            user_message=message,
+            ai_message=response,
+            new_summary=memory.buffer,
+        )
+
+
+def to_server_sent_event(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
 
 
 async def remove_user_chat_history(tenant: str, user_id: str):
@@ -0,0 +1,12 @@
+from settings import app_settings
+from sqlalchemy import create_engine
+
+# a single engine (and connection pool) shared by the request sessions of
+# fastapi_sqlalchemy and by the vector stores
+engine = create_engine(
+    app_settings.postgresql_url,
+    pool_size=app_settings.postgresql_pool_size,
+    max_overflow=app_settings.postgresql_max_overflow,
+    pool_recycle=app_settings.postgresql_pool_recycle,
+    pool_pre_ping=True,
+)
@@ -1,13 +1,24 @@
+import asyncio
 import logging
 import mimetypes
-from tempfile import NamedTemporaryFile
-
-from hrag.models import Tenant
-from hrag.utils.embeddings import HybridRagEmbeddings, HybridRagEntityGraph
+import os
+import shutil
+import uuid
+
+from fastapi_sqlalchemy import db as db_session
+from hrag.models import DocumentJob, Tenant
+from hrag.utils.embeddings import (
+    HybridRagAnswerCache,
+    HybridRagEmbeddings,
+    HybridRagEntityGraph,
+)
 from hrag.utils.exceptions import HybridRagException
+from hrag.utils.ingestion import ingestion_queue
+from hrag.utils.metrics import ingestion_jobs, track_ingestion_stage
 from langchain_community.document_loaders.pdf import PyPDFLoader
 from langchain_community.document_loaders.text import TextLoader
 from langchain_community.document_loaders.word_document import Docx2txtLoader
+from settings import app_settings
 
 logger = logging.getLogger("gunicorn.error")
 
@@ -24,17 +35,20 @@ async def cleanup_documents_from_tenant(tenant):
     if not tenant_obj:
         raise HybridRagException("Inactive tenant")
 
-    embedding = HybridRagEmbeddings(tenant=tenant_obj)
+    embedding = HybridRagEmbeddings(tenant=tenant_obj.config)
     embedding.truncate()
+    HybridRagEntityGraph(tenant=tenant_obj.config).truncate()
+    # cached answers might come from the removed documents
+    HybridRagAnswerCache(tenant=tenant_obj.config).clear()
 
 
-async def add_document_to_tenant(tenant, document_file):
+async def add_document_to_tenant(tenant, document_file, document_id=None):
     tenant_obj = Tenant.get_tenant(tenant)
     if not tenant_obj:
         raise HybridRagException("Inactive tenant")
 
     file_name = document_file.filename
-    logger.debug(f"processing document: {file_name}")
+    logger.debug(f"queueing document: {file_name}")
     mimetype = mimetypes.guess_type(file_name)[0]
     if mimetype:
         logger.debug(f"mime_type: {mimetype}")
@@ -45,23 +59,176 @@ async def add_document_to_tenant(tenant, document_file):
 
     logger.debug(f"file extension: {extension}")
 
-    with NamedTemporaryFile(suffix=extension) as tmp:
-        tmp.write(document_file.file.read())
-        tmp.seek(0)
+    file_path = os.path.join(
+        app_settings.upload_dir, f"{uuid.uuid4()}{extension}"
+    )
+    with track_ingestion_stage(tenant_obj.tenant, "upload"):
+        await asyncio.to_thread(save_upload, document_file.file, file_path)
+
+    job = DocumentJob.create_job(
+        tenant_id=tenant_obj.id,
+        file_name=file_name,
+        file_path=file_path,
+        extension=extension,
+        document_id=document_id,
+    )
+    # the job must be visible to the workers before it is queued
+    db_session.session.commit()
+    ingestion_queue.enqueue(
+        job.id, tenant_obj.tenant, tenant_obj.provider_endpoint
+    )
+
+    return job
+
+
+async def get_document_index(tenant):
+    tenant_obj = Tenant.get_tenant(tenant)
+    if not tenant_obj:
+        raise HybridRagException("Inactive tenant")
+
+    embedding = HybridRagEmbeddings(tenant=tenant_obj.config)
+    return await asyncio.to_thread(embedding.get_ann_index)
+
+
+async def build_document_index(tenant, index_type=None, rebuild=False):
+    tenant_obj = Tenant.get_tenant(tenant)
+    if not tenant_obj:
+        raise HybridRagException("Inactive tenant")
+
+    embedding = HybridRagEmbeddings(tenant=tenant_obj.config)
+    return await asyncio.to_thread(
+        embedding.create_ann_index, index_type, rebuild
+    )
 
-        docs = await to_embedding_documents(tmp.name, extension)
+
+async def get_document_job(tenant, job_id):
+    tenant_obj = Tenant.get_tenant(tenant)
+    if not tenant_obj:
+        raise HybridRagException("Inactive tenant")
+
+    return DocumentJob.get_job(job_id, tenant_id=tenant_obj.id)
+
+
+def enqueue_pending_document_jobs():
+    """
+    Queue the jobs left pending by a previous run of the application, along
+    with the ones a dead worker left processing.
+    """
+    with db_session(commit_on_exit=True):
+        requeued = DocumentJob.requeue_stale_jobs(
+            app_settings.document_job_timeout
+        )
+        if requeued:
+            logger.warning(f"{requeued} abandoned document jobs queued again")
+
+    with db_session():
+        for job in DocumentJob.get_pending_jobs():
+            ingestion_queue.enqueue(
+                job.id, job.tenant.tenant, job.tenant.provider_endpoint
+            )
+
+
+async def process_document_job(job_id):
+    with db_session(commit_on_exit=True):
+        claimed = DocumentJob.claim_job(job_id)
+    if not claimed:
+        logger.debug(f"document job {job_id} already claimed")
+        return
+
+    try:
+        with db_session():
+            job = DocumentJob.get_job(job_id)
+            tenant = Tenant.get_tenant(
+                job.tenant.tenant, create_if_not_exist=False
+            ).config
+            file_name, file_path = job.file_name, job.file_path
+            document_id = job.document_id or file_name
+            extension = job.extension
+    except Exception as e:
+        # the job is claimed, it must not stay processing
+        logger.exception(f"document job {job_id} failed")
+        with db_session(commit_on_exit=True):
+            DocumentJob.get_job(job_id).fail(str(e))
+        return
+
+    logger.debug(f"processing document job {job_id}: {file_path}")
+
+    def update_progress(**progress):
+        with db_session(commit_on_exit=True):
+            DocumentJob.get_job(job_id).update_progress(**progress)
+
+    try:
+        with track_ingestion_stage(tenant.tenant, "load"):
+            docs = await to_embedding_documents(file_path, extension)
+        # the upload is stored under a random name, keep the original one as
+        # the source. The chunks belong to the document, not to the upload,
+        # so the ones of its previous version are removed
+        for doc in docs:
+            doc.metadata["source"] = file_name
+            doc.metadata["document_id"] = document_id
 
         if docs:
             # vector store
-            embedding = HybridRagEmbeddings(tenant=tenant_obj)
-            embedding.add_documents(docs)
+            embedding = HybridRagEmbeddings(tenant=tenant)
+            with track_ingestion_stage(tenant.tenant, "embed"):
+                embedded = await asyncio.to_thread(
+                    embedding.add_documents,
+                    docs,
+                    lambda done, total: update_progress(
+                        chunks_embedded=done, chunks_to_embed=total
+                    ),
+                )
+            with track_ingestion_stage(tenant.tenant, "index"):
+                await asyncio.to_thread(embedding.maintain_ann_index, embedded)
+                await asyncio.to_thread(embedding.maintain_full_text_index)
 
             # graph relationship
-            graph = HybridRagEntityGraph(tenant=tenant_obj)
-            graph.add_documents(docs)
+            graph = HybridRagEntityGraph(tenant=tenant)
+            with track_ingestion_stage(tenant.tenant, "extract"):
+                await graph.aadd_documents(
+                    docs,
+                    lambda done, total: update_progress(
+                        chunks_extracted=done, chunks_to_extract=total
+                    ),
+                )
+
+            # cached answers were verified against the previous documents
+            await asyncio.to_thread(HybridRagAnswerCache(tenant=tenant).clear)
+    except asyncio.CancelledError:
+        # shutting down, keep the file so the job is picked up again on
+        # next start
+        with db_session(commit_on_exit=True):
+            DocumentJob.get_job(job_id).reset()
+        raise
+    except Exception as e:
+        logger.exception(f"document job {job_id} failed")
+        ingestion_jobs.labels(tenant.tenant, "failed").inc()
+        with db_session(commit_on_exit=True):
+            DocumentJob.get_job(job_id).fail(str(e))
+    else:
+        ingestion_jobs.labels(tenant.tenant, "completed").inc()
+        with db_session(commit_on_exit=True):
+            DocumentJob.get_job(job_id).complete()
+
+    remove_upload(file_path)
+
+
+def save_upload(file, file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as upload:
+        shutil.copyfileobj(file, upload)
+
+
+def remove_upload(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
 
 
 async def to_embedding_documents(file_name, extension):
-    loader = EXTENSION_TO_LOADER_MAP.get(extension, EXTENSION_TO_LOADER_MAP["default"])
+    loader = EXTENSION_TO_LOADER_MAP.get(
+        extension, EXTENSION_TO_LOADER_MAP["default"]
+    )
 
-    return loader(file_name).load()
+    return await asyncio.to_thread(loader(file_name).load)
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from settings import app_settings
+
+log = logging.getLogger("gunicorn.error")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an embedding client with a two tier cache: an in memory LRU in front
+    of the embedding_cache table, both keyed by (model, text hash). Only the
+    texts missing from both tiers are sent to the model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        memory_size: int = app_settings.embedding_cache_size,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.memory = LRUCache(memory_size)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached, missing = self.lookup("document", texts)
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self.store("document", dict(zip(missing, embedded)), cached)
+
+        return [cached[hash_text(text)] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        cached, missing = self.lookup("query", [text])
+        if missing:
+            embedded = self.embeddings.embed_query(text)
+            self.store("query", {hash_text(text): embedded}, cached)
+
+        return cached[hash_text(text)]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached, missing = await asyncio.to_thread(
+            self.lookup, "document", texts
+        )
+        if missing:
+            embedded = await self.embeddings.aembed_documents(
+                list(missing.values())
+            )
+            await asyncio.to_thread(
+                self.store, "document", dict(zip(missing, embedded)), cached
+            )
+
+        return [cached[hash_text(text)] for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        cached, missing = await asyncio.to_thread(self.lookup, "query", [text])
+        if missing:
+            embedded = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(
+                self.store, "query", {hash_text(text): embedded}, cached
+            )
+
+        return cached[hash_text(text)]
+
+    def lookup(self, kind: str, texts: List[str]):
+        """
+        Returns the cached embeddings by text hash and the texts (by hash)
+        which still have to be embedded.
+        """
+        cached = {}
+        missing = {}
+        for text in texts:
+            text_hash = hash_text(text)
+            embedding = self.memory.get((kind, text_hash))
+            if embedding is not None:
+                cached[text_hash] = embedding
+            else:
+                missing[text_hash] = text
+
+        if missing:
+            stored = self.load(kind, list(missing))
+            for text_hash, embedding in stored.items():
+                self.memory.set((kind, text_hash), embedding)
+                cached[text_hash] = embedding
+                missing.pop(text_hash)
+
+        log.debug(
+            "[embedding cache] %s: %d hits, %d misses",
+            kind,
+            len(cached),
+            len(missing),
+        )
+        return cached, missing
+
+    def store(
+        self,
+        kind: str,
+        embeddings: Dict[str, List[float]],
+        cached: Optional[Dict[str, List[float]]] = None,
+    ):
+        for text_hash, embedding in embeddings.items():
+            self.memory.set((kind, text_hash), embedding)
+            if cached is not None:
+                cached[text_hash] = embedding
+
+        self.save(kind, embeddings)
+
+    def load(
+        self, kind: str, text_hashes: List[str]
+    ) -> Dict[str, List[float]]:
+        from fastapi_sqlalchemy import db as db_session
+        from hrag.models import EmbeddingCache
+
+        # the cache is an optimisation, never fail an embedding because of it
+        try:
+            with db_session():
+                return EmbeddingCache.get_embeddings(
+                    f"{self.model}:{kind}", text_hashes
+                )
+        except Exception:
+            log.warning("Unable to read the embedding cache", exc_info=True)
+            return {}
+
+    def save(self, kind: str, embeddings: Dict[str, List[float]]):
+        from fastapi_sqlalchemy import db as db_session
+        from hrag.models import EmbeddingCache
+
+        try:
+            with db_session(commit_on_exit=True):
+                EmbeddingCache.add_embeddings(
+                    f"{self.model}:{kind}", embeddings
+                )
+        except Exception:
+            log.warning("Unable to write the embedding cache", exc_info=True)
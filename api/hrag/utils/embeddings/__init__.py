@@ -1,4 +1,5 @@
 # flake8: noqa
 
+from .answer_cache import HybridRagAnswerCache
 from .graph import HybridRagEntityGraph
 from .vectorstore import HybridRagEmbeddings
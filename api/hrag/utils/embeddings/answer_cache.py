@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from hrag.models import TenantConfig
+from langchain_core.documents import Document
+from settings import app_settings
+
+from .pgvector import get_vector_store
+
+logger = logging.getLogger("gunicorn.error")
+
+
+class HybridRagAnswerCache:
+    """
+    Verified answers of a tenant, stored in their own collection and looked up
+    by the similarity of the (reformed) question.
+    """
+
+    COLLECTION_SUFFIX = "__answer_cache"
+
+    def __init__(self, tenant: TenantConfig):
+        self.tenant = tenant
+        self.embeddings = self.tenant.llms["embedding"]
+        self.db = get_vector_store(
+            self.tenant,
+            self.embeddings,
+            collection_name=f"{self.tenant.tenant}{self.COLLECTION_SUFFIX}",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.tenant.enable_answer_cache
+
+    async def alookup(self, question: str) -> Optional[str]:
+        cutoff = time.time() - self.tenant.answer_cache_ttl
+        results = await self.db.asimilarity_search_with_score(
+            question, k=1, filter={"cached_at": {"$gte": cutoff}}
+        )
+        if not results:
+            return None
+
+        document, distance = results[0]
+        # cosine distance, the lower the closer
+        similarity = 1 - distance
+        logger.debug(
+            "---Closest cached question (%.3f): %s",
+            similarity,
+            document.page_content,
+        )
+        if similarity < app_settings.answer_cache_threshold:
+            return None
+
+        return document.metadata["answer"]
+
+    async def astore(self, question: str, answer: str):
+        await self.db.aadd_documents(
+            [
+                Document(
+                    page_content=question,
+                    metadata={"answer": answer, "cached_at": time.time()},
+                )
+            ]
+        )
+        # expired answers are never returned, drop them while writing
+        await asyncio.to_thread(self.remove_expired)
+
+    def remove_expired(self):
+        cutoff = time.time() - self.tenant.answer_cache_ttl
+        self.db.clear(filter={"cached_at": {"$lt": cutoff}})
+
+    def clear(self):
+        self.db.clear()
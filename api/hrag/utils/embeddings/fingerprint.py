@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import unicodedata
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from fastapi_sqlalchemy import db as db_session
+from hrag.models import DocumentChunk
+from hrag.utils.enums import DocumentChunkKind
+from langchain_core.documents import Document
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def get_source(document: Document) -> str:
+    """
+    Document a chunk belongs to, the id given at ingestion or else its
+    source. Stable across uploads, so a new version of a document replaces
+    the chunks of the previous one.
+    """
+    metadata = document.metadata
+    return str(metadata.get("document_id") or metadata.get("source", ""))
+
+
+class ChunkFingerprints:
+    """
+    Per tenant index of the chunks already processed with a given model. A
+    chunk is stored once, whatever the number of sources it appears in, and
+    removed along with the last source it belongs to.
+    """
+
+    def __init__(self, tenant, kind: DocumentChunkKind, model: str):
+        self.tenant = tenant
+        self.kind = kind
+        self.model = model or ""
+
+    def fingerprint(self, document: Document) -> str:
+        text = f"{self.model}\n{normalize_text(document.page_content)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def chunk_id(self, fingerprint: str) -> str:
+        """
+        Stable id of a chunk, used as the id of the stored vector /
+        graph document.
+        """
+        return str(
+            uuid.uuid5(
+                uuid.NAMESPACE_URL,
+                f"{self.tenant.tenant}/{self.kind.value}/{fingerprint}",
+            )
+        )
+
+    def document_id(self, document: Document) -> str:
+        return self.chunk_id(self.fingerprint(document))
+
+    def diff(
+        self, documents: List[Document]
+    ) -> Tuple[List[Document], List[Document], Dict[str, Set[str]]]:
+        """
+        Split the documents into the chunks that still have to be processed,
+        the chunks already stored (for another source or earlier in the
+        documents) that only have to be added to their source, and the
+        fingerprints (per source) which are no longer part of the documents.
+        """
+        current = defaultdict(dict)
+        for document in documents:
+            current[get_source(document)].setdefault(
+                self.fingerprint(document), document
+            )
+
+        with db_session():
+            existing = {
+                source: DocumentChunk.get_fingerprints(
+                    self.tenant.id, self.kind, source
+                )
+                for source in current
+            }
+            stored = DocumentChunk.get_stored_fingerprints(
+                self.tenant.id,
+                self.kind,
+                {
+                    fingerprint
+                    for chunks in current.values()
+                    for fingerprint in chunks
+                },
+            )
+
+        new_documents, linked_documents = [], []
+        for source, chunks in current.items():
+            for fingerprint, document in chunks.items():
+                if fingerprint in existing[source]:
+                    continue
+                if fingerprint in stored:
+                    linked_documents.append(document)
+                else:
+                    new_documents.append(document)
+                    stored.add(fingerprint)
+
+        stale = {
+            source: existing[source] - chunks.keys()
+            for source, chunks in current.items()
+            if existing[source] - chunks.keys()
+        }
+        logger.debug(
+            "[%s] %d new chunks, %d already stored, %d stale",
+            self.kind.value,
+            len(new_documents),
+            len(documents) - len(new_documents),
+            sum(len(fingerprints) for fingerprints in stale.values()),
+        )
+
+        return new_documents, linked_documents, stale
+
+    def add(self, documents: List[Document]):
+        fingerprints = defaultdict(set)
+        for document in documents:
+            fingerprints[get_source(document)].add(self.fingerprint(document))
+
+        with db_session(commit_on_exit=True):
+            for source, source_fingerprints in fingerprints.items():
+                DocumentChunk.add_fingerprints(
+                    self.tenant.id, self.kind, source, source_fingerprints
+                )
+
+    def remove(self, stale: Dict[str, Set[str]]) -> List[str]:
+        """
+        Remove the fingerprints from their sources, returns the ids of the
+        chunks no longer part of any source, to be deleted from the store.
+        """
+        with db_session(commit_on_exit=True):
+            for source, fingerprints in stale.items():
+                DocumentChunk.remove_fingerprints(
+                    self.tenant.id, self.kind, source, fingerprints
+                )
+            removed = set().union(*stale.values())
+            removed -= DocumentChunk.get_stored_fingerprints(
+                self.tenant.id, self.kind, removed
+            )
+
+        return [self.chunk_id(fingerprint) for fingerprint in removed]
+
+    def stored_chunk_ids(self) -> List[str]:
+        with db_session():
+            fingerprints = DocumentChunk.get_stored_fingerprints(
+                self.tenant.id, self.kind
+            )
+        return [self.chunk_id(fingerprint) for fingerprint in fingerprints]
+
+    def clear(self):
+        with db_session(commit_on_exit=True):
+            DocumentChunk.clear_fingerprints(self.tenant.id, self.kind)
@@ -1,3 +1,16 @@
 # flake8: noqa
 
+from .connection import (
+    aquery_graph,
+    bootstrap_graph_schema,
+    close_neo4j_graphs,
+    get_async_neo4j_driver,
+    get_neo4j_graph,
+)
+from .dictionary import (
+    EntityDictionary,
+    get_entity_dictionary,
+    invalidate_entity_dictionary,
+)
 from .graph import HybridRagEntityGraph
+from .writer import GraphDocumentWriter
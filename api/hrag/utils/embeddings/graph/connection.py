@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List
+
+import neo4j
+from hrag.utils.cache import ProcessCache
+from hrag.utils.tracing import neo4j_span
+from langchain_community.graphs import Neo4jGraph
+from settings import app_settings
+
+logger = logging.getLogger("gunicorn.error")
+logger.setLevel(app_settings.log_level.upper())
+
+# one driver (and therefore one connection pool) per process, sessions are
+# borrowed from the pool for every query
+neo4j_graphs = ProcessCache("neo4j_graphs")
+async_neo4j_drivers = ProcessCache("async_neo4j_drivers")
+# tenants whose label and full-text index are known to exist
+tenant_graph_schemas = ProcessCache("tenant_graph_schemas")
+# tenant -> lock held while bootstrapping its schema, which can take
+# minutes, so the other tenants do not wait on the lock of
+# tenant_graph_schemas meanwhile
+tenant_graph_schema_locks = ProcessCache("tenant_graph_schema_locks")
+
+SCHEMA_QUERIES = [
+    "CREATE CONSTRAINT IF NOT EXISTS FOR (e:__Entity__) "
+    "REQUIRE e.id IS UNIQUE",
+    "CREATE INDEX document_id IF NOT EXISTS FOR (d:Document) ON (d.id)",
+]
+
+# every tenant gets its own label and full-text index over it, so entity
+# lookups only search the entities of one tenant
+TENANT_INDEX_QUERY = (
+    "CREATE FULLTEXT INDEX %(index)s IF NOT EXISTS "
+    "FOR (e:%(label)s) ON EACH [e.id]"
+)
+# label the entities written before tenant labels existed
+TENANT_BACKFILL_QUERY = """
+CALL {
+  MATCH (e:__Entity__)
+  WHERE e.id STARTS WITH $prefix AND NOT e:%(label)s
+  SET e:%(label)s
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+TENANT_INDEX_TIMEOUT = 300
+
+
+def get_driver_config() -> Dict[str, Any]:
+    return {
+        "max_connection_pool_size": (
+            app_settings.neo4j_max_connection_pool_size
+        ),
+        "connection_acquisition_timeout": (
+            app_settings.neo4j_connection_acquisition_timeout
+        ),
+    }
+
+
+def get_neo4j_graph() -> Neo4jGraph:
+    return neo4j_graphs.get_or_create(
+        (app_settings.neo4j_url, app_settings.neo4j_username),
+        lambda: Neo4jGraph(
+            url=app_settings.neo4j_url,
+            username=app_settings.neo4j_username,
+            password=app_settings.neo4j_password,
+            database=app_settings.neo4j_database,
+            refresh_schema=False,
+            driver_config=get_driver_config(),
+        ),
+    )
+
+
+def get_async_neo4j_driver() -> neo4j.AsyncDriver:
+    return async_neo4j_drivers.get_or_create(
+        (app_settings.neo4j_url, app_settings.neo4j_username),
+        lambda: neo4j.AsyncGraphDatabase.driver(
+            app_settings.neo4j_url,
+            auth=(app_settings.neo4j_username, app_settings.neo4j_password),
+            **get_driver_config(),
+        ),
+    )
+
+
+async def aquery_graph(
+    query: str, params: Dict[str, Any] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run a read query on the async driver without blocking the event loop.
+    """
+    with neo4j_span("neo4j query", query):
+        records, _, _ = await get_async_neo4j_driver().execute_query(
+            query,
+            params or {},
+            database_=app_settings.neo4j_database,
+            routing_=neo4j.RoutingControl.READ,
+        )
+    return [record.data() for record in records]
+
+
+def bootstrap_graph_schema():
+    """
+    Create the indexes and constraints used by the entity graph. Meant to be
+    run once during application startup instead of on every request.
+    """
+    graph = get_neo4j_graph()
+    for query in SCHEMA_QUERIES:
+        logger.debug("Bootstrapping graph schema: %s", query)
+        graph.query(query)
+
+    # load the constraint information once so add_graph_documents does not try
+    # to create it (and refresh the whole schema) again
+    graph.refresh_schema()
+
+
+def get_tenant_hash(tenant: str) -> str:
+    # tenant names are free text, only use them in labels / index names
+    # once hashed
+    return hashlib.sha256(tenant.encode("utf-8")).hexdigest()[:16]
+
+
+def get_tenant_label(tenant: str) -> str:
+    return f"__Tenant_{get_tenant_hash(tenant)}__"
+
+
+def get_tenant_index(tenant: str) -> str:
+    return f"entity_{get_tenant_hash(tenant)}"
+
+
+def is_tenant_graph_schema_ready(tenant: str) -> bool:
+    return tenant in tenant_graph_schemas
+
+
+def ensure_tenant_graph_schema(tenant: str):
+    """
+    Create the label and full-text index of the tenant (and label its existing
+    entities) the first time the tenant graph is used by this process.
+    Blocking, run it in a thread from async code.
+    """
+    if is_tenant_graph_schema_ready(tenant):
+        return
+
+    with tenant_graph_schema_locks.get_or_create(tenant, threading.Lock):
+        if is_tenant_graph_schema_ready(tenant):
+            return
+
+        names = {
+            "label": get_tenant_label(tenant),
+            "index": get_tenant_index(tenant),
+        }
+        logger.debug("Bootstrapping graph schema of %s: %s", tenant, names)
+
+        graph = get_neo4j_graph()
+        graph.query(TENANT_INDEX_QUERY % names)
+        graph.query(TENANT_BACKFILL_QUERY % names, {"prefix": f"{tenant}::"})
+        graph.query(
+            "CALL db.awaitIndex($index, $timeout)",
+            {"index": names["index"], "timeout": TENANT_INDEX_TIMEOUT},
+        )
+        tenant_graph_schemas.get_or_create(tenant, lambda: True)
+
+
+async def close_neo4j_graphs():
+    neo4j_graphs.clear(on_evict=lambda graph: graph._driver.close())
+    for driver in async_neo4j_drivers.clear():
+        await driver.close()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List
+
+from hrag.utils.cache import ProcessCache
+from settings import app_settings
+
+from .connection import aquery_graph, get_tenant_label
+
+logger = logging.getLogger("gunicorn.error")
+logger.setLevel(app_settings.log_level.upper())
+
+# tenant -> EntityDictionary
+entity_dictionaries = ProcessCache("entity_dictionaries")
+
+# only the entities with the label of the tenant
+ENTITY_IDS_QUERY = """
+MATCH (e:%(label)s)
+WHERE coalesce(e.created_at, 0) >= $since
+RETURN e.id AS id
+"""
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+# single token names shorter than this ("a", "is", ...) are too noisy to
+# match on
+MIN_SINGLE_TOKEN_LENGTH = 3
+# marks the end of an entity name in the trie
+END = ""
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class EntityDictionary:
+    """
+    Token trie of the entity names of a tenant, used to find the entities
+    mentioned in a question without asking the LLM. Loaded from the __Entity__
+    nodes of the tenant and then refreshed with the entities created since the
+    last refresh.
+    """
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.prefix = f"{tenant}::"
+        self.trie: Dict[str, dict] = {}
+        self.size = 0
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = None
+
+    def add(self, entity_ids: Iterable[str]):
+        with self._lock:
+            for entity_id in entity_ids:
+                if not entity_id.startswith(self.prefix):
+                    continue
+
+                name = entity_id[len(self.prefix) :].replace("-", " ")
+                tokens = tokenize(name)
+                if not tokens:
+                    continue
+
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                if END not in node:
+                    node[END] = name
+                    self.size += 1
+
+    def match(self, text: str) -> List[str]:
+        """
+        Returns the names of the entities found in the text, longest match
+        first at every position.
+        """
+        tokens = tokenize(text)
+        matches = []
+        start = 0
+        while start < len(tokens):
+            node = self.trie
+            longest = None
+            end = start
+            for position in range(start, len(tokens)):
+                node = node.get(tokens[position])
+                if node is None:
+                    break
+                if END in node:
+                    longest, end = node[END], position + 1
+
+            if longest is not None and (
+                end - start > 1
+                or len(tokens[start]) >= MIN_SINGLE_TOKEN_LENGTH
+            ):
+                if longest not in matches:
+                    matches.append(longest)
+                start = end
+            else:
+                start += 1
+
+        return matches
+
+    def is_stale(self) -> bool:
+        return (
+            self.refreshed_at is None
+            or time.time() - self.refreshed_at
+            > app_settings.entity_dictionary_refresh_interval
+        )
+
+    async def arefresh(self):
+        """
+        Load the entities created since the last refresh (all of them the first
+        time), entities written before created_at was tracked only come with
+        the first load.
+        """
+        started_at = time.time()
+        since = 0
+        if self.refreshed_at is not None:
+            # created_at is set by Neo4j, leave some slack for clock skew
+            since = int((self.refreshed_at - 60) * 1000)
+        records = await aquery_graph(
+            ENTITY_IDS_QUERY % {"label": get_tenant_label(self.tenant)},
+            {"since": since},
+        )
+        self.add(record["id"] for record in records)
+        self.refreshed_at = started_at
+        logger.debug(
+            "[%s] entity dictionary refreshed, %d entities",
+            self.tenant,
+            self.size,
+        )
+
+    async def amatch(self, text: str) -> List[str]:
+        if self.is_stale():
+            if self._refresh_lock is None:
+                self._refresh_lock = asyncio.Lock()
+            async with self._refresh_lock:
+                # another request might have refreshed it while we were waiting
+                if self.is_stale():
+                    await self.arefresh()
+
+        return self.match(text)
+
+
+def get_entity_dictionary(tenant: str) -> EntityDictionary:
+    return entity_dictionaries.get_or_create(
+        tenant, lambda: EntityDictionary(tenant)
+    )
+
+
+def invalidate_entity_dictionary(tenant: str):
+    """
+    Drop the dictionary of the tenant once entities are deleted, refreshes
+    only add entities. It is loaded again on its next use.
+    """
+    entity_dictionaries.invalidate(lambda key: key == tenant)
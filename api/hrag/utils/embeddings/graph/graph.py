@@ -1,38 +1,76 @@
+import asyncio
 import logging
-import re
+from typing import Callable, List
 
 from hrag.models import Tenant
-from hrag.utils.enums import PromptType
+from hrag.utils.enums import DocumentChunkKind, PromptType
+from hrag.utils.llm_provider import with_llm_callbacks
 from hrag.utils.prompts import HybridRagPrompt
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.graphs import Neo4jGraph
 from langchain_community.vectorstores.neo4j_vector import remove_lucene_chars
 from langchain_core.output_parsers import JsonOutputParser
 from settings import app_settings
 
+from ..fingerprint import ChunkFingerprints
+from .connection import (
+    aquery_graph,
+    ensure_tenant_graph_schema,
+    get_neo4j_graph,
+    get_tenant_index,
+    is_tenant_graph_schema_ready,
+)
+from .dictionary import get_entity_dictionary, invalidate_entity_dictionary
 from .transformer import HybridRagGraphTransformer
+from .writer import GraphDocumentWriter
 
 logger = logging.getLogger("gunicorn.error")
 logger.setLevel(app_settings.log_level.upper())
 
 
+# neighborhood of all the entities of a question in one round trip: the matched
+# nodes and the triples are deduplicated before they are sent back
+NEIGHBORHOOD_QUERY = """
+UNWIND $queries AS query
+CALL db.index.fulltext.queryNodes($index, query, {limit: 2})
+YIELD node
+WHERE node.id STARTS WITH $prefix
+WITH DISTINCT node
+CALL {
+  WITH node
+  MATCH (node)-[r:!MENTIONS]->(neighbor)
+  RETURN node.id AS head, type(r) AS relation, neighbor.id AS tail
+  UNION ALL
+  WITH node
+  MATCH (node)<-[r:!MENTIONS]-(neighbor)
+  RETURN neighbor.id AS head, type(r) AS relation, node.id AS tail
+}
+WITH DISTINCT head, relation, tail
+RETURN head, relation, tail
+LIMIT $limit
+"""
+
+
 class HybridRagEntityGraph:
+    EXTRACTION_BATCH_SIZE = 32
+    # relationships returned per entity of the question
+    NEIGHBORHOOD_LIMIT = 50
+
     def __init__(self, tenant: Tenant):
         super().__init__()
 
         self.tenant = tenant
+        self.entity_prefix = f"{self.tenant.tenant}::"
         llms = self.tenant.llms
 
         self.llm = llms["chat"]
         self.embeddings = llms["embedding"]
 
-        self.graph = Neo4jGraph(
-            url=app_settings.neo4j_url,
-            username=app_settings.neo4j_username,
-            password=app_settings.neo4j_password,
-        )
-        self.graph.query(
-            "CREATE FULLTEXT INDEX entity IF NOT EXISTS FOR (e:__Entity__) ON EACH [e.id]"
+        # the full-text index and constraints are created
+        # by bootstrap_graph_schema
+        self.graph = get_neo4j_graph()
+        self.writer = GraphDocumentWriter(tenant=self.tenant.tenant)
+        self.chunks = ChunkFingerprints(
+            self.tenant, DocumentChunkKind.graph, self.tenant.llm_model
         )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, chunk_overlap=250
@@ -42,19 +80,146 @@ class HybridRagEntityGraph:
             PromptType.EXTRACT_ENTITIES,
             tenant.prompt_family,
         )
-        self.entity_chain = prompt | self.llm | JsonOutputParser()
+        self.entity_chain = (
+            prompt
+            | with_llm_callbacks(
+                self.llm, self.tenant, PromptType.EXTRACT_ENTITIES.value
+            )
+            | JsonOutputParser()
+        )
 
-    def add_documents(self, raw_documents):
+    def split_documents(self, raw_documents):
         documents = self.text_splitter.split_documents(raw_documents)
-        documents = [
+        return [
             document for document in documents if document.page_content.strip()
         ]
 
-        llm_transformer = HybridRagGraphTransformer(llm=self.llm, tenant=self.tenant)
-        graph_documents = llm_transformer.convert_to_graph_documents(documents)
-        self.graph.add_graph_documents(
-            graph_documents, baseEntityLabel=True, include_source=True
+    def prepare_documents(self, raw_documents):
+        """
+        Split the documents and keep the chunks which are not in the graph yet,
+        along with the chunks already in the graph to add to their source and
+        the ones no longer part of their source (see finish_documents).
+        """
+        ensure_tenant_graph_schema(self.tenant.tenant)
+        documents, linked, stale = self.chunks.diff(
+            self.split_documents(raw_documents)
         )
+        for document in documents:
+            document.metadata["id"] = self.chunks.document_id(document)
+
+        return documents, linked, stale
+
+    def finish_documents(self, linked, stale):
+        """
+        Once the new chunks are written, add the linked ones to their source
+        and remove the stale ones from the graph if no other source has them.
+        """
+        self.chunks.add(linked)
+        if stale:
+            self.writer.delete_documents(self.chunks.remove(stale))
+            # the entities only the stale chunks mentioned are gone
+            invalidate_entity_dictionary(self.tenant.tenant)
+
+    def truncate(self):
+        """
+        Remove every document of the tenant from the graph, with the entities
+        only they mention.
+        """
+        self.writer.delete_documents(self.chunks.stored_chunk_ids())
+        self.chunks.clear()
+        invalidate_entity_dictionary(self.tenant.tenant)
+
+    def add_documents(
+        self, raw_documents, on_progress: Callable[[int, int], None] = None
+    ):
+        """
+        Extract the entities of the documents and store them in the graph,
+        on_progress(chunks_extracted, chunks_to_extract) is called after
+        every batch.
+        """
+        documents, linked, stale = self.prepare_documents(raw_documents)
+
+        llm_transformer = HybridRagGraphTransformer(
+            llm=self.llm, tenant=self.tenant
+        )
+        for start in range(0, len(documents), self.EXTRACTION_BATCH_SIZE):
+            graph_documents = llm_transformer.convert_to_graph_documents(
+                documents[start : start + self.EXTRACTION_BATCH_SIZE]
+            )
+            self.write_graph_documents(
+                graph_documents,
+                min(start + self.EXTRACTION_BATCH_SIZE, len(documents)),
+                len(documents),
+                on_progress,
+            )
+        self.finish_documents(linked, stale)
+
+    async def aadd_documents(
+        self, raw_documents, on_progress: Callable[[int, int], None] = None
+    ):
+        """
+        Async version of add_documents, the chunks are extracted
+        concurrently and the graph documents are written in batches as soon
+        as they are ready.
+        """
+        documents, linked, stale = await asyncio.to_thread(
+            self.prepare_documents, raw_documents
+        )
+
+        llm_transformer = HybridRagGraphTransformer(
+            llm=self.llm, tenant=self.tenant
+        )
+        graph_documents = (
+            llm_transformer.aconvert_to_graph_documents_as_completed(documents)
+        )
+        extracted = 0
+        batch = []
+        async for graph_document in graph_documents:
+            batch.append(graph_document)
+            if len(batch) < self.EXTRACTION_BATCH_SIZE:
+                continue
+
+            extracted += len(batch)
+            await asyncio.to_thread(
+                self.write_graph_documents,
+                batch,
+                extracted,
+                len(documents),
+                on_progress,
+            )
+            batch = []
+
+        if batch:
+            extracted += len(batch)
+            await asyncio.to_thread(
+                self.write_graph_documents,
+                batch,
+                extracted,
+                len(documents),
+                on_progress,
+            )
+        await asyncio.to_thread(self.finish_documents, linked, stale)
+
+    def write_graph_documents(
+        self,
+        graph_documents,
+        extracted: int,
+        total: int,
+        on_progress: Callable[[int, int], None] = None,
+    ):
+        self.writer.write(graph_documents)
+        self.chunks.add(
+            [graph_document.source for graph_document in graph_documents]
+        )
+        # make the new entities of this process visible right away, the other
+        # processes pick them up on their next refresh
+        get_entity_dictionary(self.tenant.tenant).add(
+            node.id
+            for graph_document in graph_documents
+            for node in graph_document.nodes
+        )
+        if on_progress is not None:
+            on_progress(extracted, total)
 
     def generate_full_text_query(self, input: str) -> str:
         """
@@ -73,43 +238,72 @@ class HybridRagEntityGraph:
         full_text_query += f" {words[-1]}~2"
         return full_text_query.strip()
 
+    async def aextract_entities(self, question: str) -> List[str]:
+        """
+        Find the entities of the question in the tenant entity dictionary, the
+        LLM is only asked when none of the known entities is mentioned.
+        """
+        if app_settings.enable_entity_dictionary:
+            try:
+                entities = await get_entity_dictionary(
+                    self.tenant.tenant
+                ).amatch(question)
+            except Exception:
+                logger.warning(
+                    "Entity dictionary lookup failed", exc_info=True
+                )
+                entities = []
+
+            if entities:
+                logger.debug("entities from dictionary: %s", entities)
+                return entities
+
+        return await self.entity_chain.ainvoke({"question": question})
+
     # Fulltext index query
-    def retrieve_info(self, question: str) -> str:
+    async def aretrieve_info(self, question: str) -> str:
         """
         Collects the neighborhood of entities mentioned
         in the question
         """
-        result = ""
-        entities = self.entity_chain.invoke({"question": question})
-        for entity in entities:
-            entity = f"{self.tenant.tenant}::{'-'.join(entity.split())}"
-            response = self.graph.query(
-                """CALL db.index.fulltext.queryNodes('entity', $query, {limit:2})
-                YIELD node,score
-                CALL {
-                  WITH node
-                  MATCH (node)-[r:!MENTIONS]->(neighbor)
-                  RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
-                  UNION ALL
-                  WITH node
-                  MATCH (node)<-[r:!MENTIONS]-(neighbor)
-                  RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
-                }
-                RETURN output LIMIT 50
-                """,
-                {"query": self.generate_full_text_query(entity)},
+        # the entity dictionary and the full-text index both rely on the
+        # tenant label
+        if not is_tenant_graph_schema_ready(self.tenant.tenant):
+            await asyncio.to_thread(
+                ensure_tenant_graph_schema, self.tenant.tenant
             )
-            logger.debug("query response: %s", response)
-            for el in response:
-                # convert the entities and relationships back to normal
-                output = re.sub(
-                    rf"{re.escape(self.tenant.tenant)}::(.+) - (.+) -> {re.escape(self.tenant.tenant)}::(.+)",
-                    r"\1 ::start:: \2 ::end:: \3",
-                    el["output"],
-                )
-                output = output.replace("-", " ")
-                output = output.replace("::start::", "-")
-                output = output.replace("::end::", "->")
-                result += "\n" + output
 
-        return result
+        entities = await self.aextract_entities(question)
+        # the index only covers the entities of the tenant, no need for
+        # the prefix
+        queries = [
+            self.generate_full_text_query(entity)
+            for entity in entities
+            if remove_lucene_chars(entity).split()
+        ]
+        if not queries:
+            return ""
+
+        response = await aquery_graph(
+            NEIGHBORHOOD_QUERY,
+            {
+                "queries": queries,
+                "index": get_tenant_index(self.tenant.tenant),
+                "prefix": self.entity_prefix,
+                "limit": self.NEIGHBORHOOD_LIMIT * len(queries),
+            },
+        )
+        logger.debug("query response: %s", response)
+
+        # convert the entities and relationships back to normal
+        return "".join(
+            f"\n{self.format_entity(row['head'])} - "
+            f"{row['relation'].replace('-', ' ')} -> "
+            f"{self.format_entity(row['tail'])}"
+            for row in response
+        )
+
+    def format_entity(self, entity_id: str) -> str:
+        if entity_id.startswith(self.entity_prefix):
+            entity_id = entity_id[len(self.entity_prefix) :]
+        return entity_id.replace("-", " ")
@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from typing import Any, Dict, Optional, cast
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, cast
 
 from hrag.models import Tenant
 from langchain_core.runnables import RunnableConfig
@@ -34,8 +35,51 @@ class HybridRagGraphTransformer(LLMGraphTransformer):
         Processes a single document, transforming it into a graph document using
         an LLM based on the model's schema and constraints.
         """
-        text = document.page_content
-        raw_schema = self.chain.invoke({"input": text}, config=config)
+        raw_schema = self.chain.invoke(
+            {"input": document.page_content}, config=config
+        )
+        return self.to_graph_document(document, raw_schema)
+
+    async def aprocess_response(
+        self, document: Document, config: Optional[RunnableConfig] = None
+    ) -> GraphDocument:
+        """
+        Async version of process_response.
+        """
+        raw_schema = await self.chain.ainvoke(
+            {"input": document.page_content}, config=config
+        )
+        return self.to_graph_document(document, raw_schema)
+
+    async def aconvert_to_graph_documents_as_completed(
+        self,
+        documents: Sequence[Document],
+        concurrency: int = app_settings.graph_extraction_concurrency,
+        config: Optional[RunnableConfig] = None,
+    ) -> AsyncIterator[GraphDocument]:
+        """
+        Extract the documents with at most `concurrency` LLM calls in flight,
+        yielding the graph documents in completion order.
+        """
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def process(document):
+            async with semaphore:
+                return await self.aprocess_response(document, config=config)
+
+        tasks = [
+            asyncio.create_task(process(document)) for document in documents
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def to_graph_document(
+        self, document: Document, raw_schema: Any
+    ) -> GraphDocument:
         if self._function_call:
             raw_schema = cast(Dict[Any, Any], raw_schema)
             nodes, relationships = _convert_to_graph_document(raw_schema)
@@ -61,23 +105,35 @@ class HybridRagGraphTransformer(LLMGraphTransformer):
                 # Nodes need to be deduplicated using a set
                 if isinstance(rel["head"], list):
                     for head in rel["head"]:
-                        head_id = f"{self.tenant.tenant}::{'-'.join(head.split())}"
+                        head_id = (
+                            f"{self.tenant.tenant}::{'-'.join(head.split())}"
+                        )
                         nodes_set.add((head_id, rel["head_type"]))
-                        source_nodes.append(Node(id=head_id, type=rel["head_type"]))
+                        source_nodes.append(
+                            Node(id=head_id, type=rel["head_type"])
+                        )
                 else:
                     head_id = f"{self.tenant.tenant}::{'-'.join(rel['head'].split())}"
                     nodes_set.add((head_id, rel["head_type"]))
-                    source_nodes.append(Node(id=head_id, type=rel["head_type"]))
+                    source_nodes.append(
+                        Node(id=head_id, type=rel["head_type"])
+                    )
 
                 if isinstance(rel["tail"], list):
                     for tail in rel["tail"]:
-                        tail_id = f"{self.tenant.tenant}::{'-'.join(tail.split())}"
+                        tail_id = (
+                            f"{self.tenant.tenant}::{'-'.join(tail.split())}"
+                        )
                         nodes_set.add((tail_id, rel["tail_type"]))
-                        target_nodes.append(Node(id=tail_id, type=rel["tail_type"]))
+                        target_nodes.append(
+                            Node(id=tail_id, type=rel["tail_type"])
+                        )
                 else:
                     tail_id = f"{self.tenant.tenant}::{'-'.join(rel['tail'].split())}"
                     nodes_set.add((tail_id, rel["tail_type"]))
-                    target_nodes.append(Node(id=tail_id, type=rel["tail_type"]))
+                    target_nodes.append(
+                        Node(id=tail_id, type=rel["tail_type"])
+                    )
 
                 for source_node in source_nodes:
                     for target_node in target_nodes:
@@ -92,11 +148,15 @@ class HybridRagGraphTransformer(LLMGraphTransformer):
             nodes = [Node(id=el[0], type=el[1]) for el in list(nodes_set)]
 
         # Strict mode filtering
-        if self.strict_mode and (self.allowed_nodes or self.allowed_relationships):
+        if self.strict_mode and (
+            self.allowed_nodes or self.allowed_relationships
+        ):
             if self.allowed_nodes:
                 lower_allowed_nodes = [el.lower() for el in self.allowed_nodes]
                 nodes = [
-                    node for node in nodes if node.type.lower() in lower_allowed_nodes
+                    node
+                    for node in nodes
+                    if node.type.lower() in lower_allowed_nodes
                 ]
                 relationships = [
                     rel
@@ -112,4 +172,6 @@ class HybridRagGraphTransformer(LLMGraphTransformer):
                     in [el.lower() for el in self.allowed_relationships]
                 ]
 
-        return GraphDocument(nodes=nodes, relationships=relationships, source=document)
+        return GraphDocument(
+            nodes=nodes, relationships=relationships, source=document
+        )
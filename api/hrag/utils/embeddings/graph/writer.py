@@ -0,0 +1,243 @@
+import logging
+from collections import defaultdict
+from hashlib import md5
+from typing import Any, Dict, Iterable, List, Sequence
+
+from hrag.utils.enums import GraphSourceTextMode
+from hrag.utils.tracing import neo4j_span
+from langchain_community.graphs.graph_document import GraphDocument
+from settings import app_settings
+
+from .connection import get_neo4j_graph, get_tenant_label
+
+logger = logging.getLogger("gunicorn.error")
+logger.setLevel(app_settings.log_level.upper())
+
+DOCUMENT_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Document {id: row.id})
+SET d += row.properties
+"""
+
+ENTITY_QUERY = """
+UNWIND $rows AS row
+MERGE (e:__Entity__ {id: row.id})
+ON CREATE SET e.created_at = timestamp()
+SET e += row.properties
+SET e:%(labels)s
+"""
+
+MENTION_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {id: row.document})
+MATCH (e:__Entity__ {id: row.entity})
+MERGE (d)-[:MENTIONS]->(e)
+"""
+
+RELATIONSHIP_QUERY = """
+UNWIND $rows AS row
+MERGE (source:__Entity__ {id: row.source})
+ON CREATE SET source.created_at = timestamp()%(source_label)s
+MERGE (target:__Entity__ {id: row.target})
+ON CREATE SET target.created_at = timestamp()%(target_label)s
+MERGE (source)-[r:%(type)s]->(target)
+SET r += row.properties
+"""
+
+# entities left without any mention once their documents are gone are
+# removed too
+DELETE_DOCUMENT_QUERY = """
+UNWIND $ids AS id
+MATCH (d:Document {id: id})
+OPTIONAL MATCH (d)-[:MENTIONS]->(e:__Entity__)
+WITH d, collect(e) AS entities
+DETACH DELETE d
+WITH entities
+UNWIND entities AS e
+WITH DISTINCT e
+WHERE NOT (e)<-[:MENTIONS]-(:Document)
+DETACH DELETE e
+"""
+
+
+def escape_name(name: str) -> str:
+    """
+    Quote a label or relationship type so it can be used inside a query.
+    """
+    return f"`{name.replace('`', '``')}`"
+
+
+def is_property_value(value: Any) -> bool:
+    """
+    Neo4j only stores primitives (and lists of them) as properties.
+    """
+    if isinstance(value, (str, int, float, bool)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(isinstance(el, (str, int, float, bool)) for el in value)
+    return False
+
+
+class GraphDocumentWriter:
+    """
+    Bulk writer for graph documents. Nodes, relationships and mentions of all
+    the documents are deduplicated first, grouped by label / relationship type
+    and then written with one UNWIND statement per group (and per `batch_size`
+    rows) inside a single write transaction.
+    """
+
+    def __init__(
+        self,
+        tenant: str = None,
+        source_text_mode: GraphSourceTextMode = None,
+        source_text_max_chars: int = app_settings.graph_source_text_max_chars,
+        batch_size: int = app_settings.neo4j_write_batch_size,
+    ):
+        self.source_text_mode = source_text_mode or GraphSourceTextMode(
+            app_settings.graph_source_text_mode
+        )
+        self.source_text_max_chars = source_text_max_chars
+        self.batch_size = batch_size
+        # entities also get the label of their tenant, covered by its
+        # full-text index
+        self.tenant_label = get_tenant_label(tenant) if tenant else None
+
+    def write(self, graph_documents: Sequence[GraphDocument]):
+        statements = self.build_statements(graph_documents)
+        if not statements:
+            return
+
+        logger.debug(
+            "Writing %d graph documents in %d statements",
+            len(graph_documents),
+            len(statements),
+        )
+        driver = get_neo4j_graph()._driver
+        with neo4j_span(
+            "neo4j write", statements=len(statements)
+        ), driver.session(database=app_settings.neo4j_database) as session:
+            session.execute_write(self.run_statements, statements)
+
+    def delete_documents(self, document_ids: List[str]):
+        if not document_ids:
+            return
+
+        logger.debug("Deleting %d graph documents", len(document_ids))
+        statements = self.batched(DELETE_DOCUMENT_QUERY, list(document_ids))
+        driver = get_neo4j_graph()._driver
+        with neo4j_span(
+            "neo4j delete", statements=len(statements)
+        ), driver.session(database=app_settings.neo4j_database) as session:
+            session.execute_write(self.run_statements, statements, "ids")
+
+    @staticmethod
+    def run_statements(tx, statements, parameter: str = "rows"):
+        for query, rows in statements:
+            tx.run(query, {parameter: rows}).consume()
+
+    def build_statements(
+        self, graph_documents: Sequence[GraphDocument]
+    ) -> List[tuple]:
+        documents = {}
+        entities: Dict[str, Dict[str, Any]] = {}
+        entity_labels = defaultdict(set)
+        relationships: Dict[tuple, Dict[str, Any]] = {}
+        mentions = set()
+
+        for graph_document in graph_documents:
+            document_id = (
+                graph_document.source.metadata.get("id")
+                or md5(
+                    graph_document.source.page_content.encode("utf-8")
+                ).hexdigest()
+            )
+            documents[document_id] = self.document_properties(
+                graph_document.source
+            )
+
+            for node in graph_document.nodes:
+                entities.setdefault(node.id, {}).update(
+                    self.clean_properties(node.properties)
+                )
+                entity_labels[node.type.replace("`", "")].add(node.id)
+                mentions.add((document_id, node.id))
+
+            for rel in graph_document.relationships:
+                key = (
+                    rel.source.id,
+                    rel.type.replace("`", "").replace(" ", "_").upper(),
+                    rel.target.id,
+                )
+                relationships.setdefault(key, {}).update(
+                    self.clean_properties(rel.properties)
+                )
+
+        # rows are sorted by id so concurrent writers lock the nodes in the
+        # same order
+        statements = []
+        statements += self.batched(
+            DOCUMENT_QUERY,
+            [{"id": k, "properties": v} for k, v in sorted(documents.items())],
+        )
+        # entities are merged once on __Entity__ (backed by the unique
+        # constraint) and labelled per type
+        for label, ids in sorted(entity_labels.items()):
+            if not label:
+                continue
+            labels = escape_name(label)
+            if self.tenant_label:
+                labels += f":{self.tenant_label}"
+            statements += self.batched(
+                ENTITY_QUERY % {"labels": labels},
+                [{"id": id, "properties": entities[id]} for id in sorted(ids)],
+            )
+        statements += self.batched(
+            MENTION_QUERY,
+            [{"document": d, "entity": e} for d, e in sorted(mentions)],
+        )
+        relationships_by_type = defaultdict(list)
+        for (source, rel_type, target), properties in sorted(
+            relationships.items()
+        ):
+            relationships_by_type[rel_type].append(
+                {"source": source, "target": target, "properties": properties}
+            )
+        for rel_type, rows in relationships_by_type.items():
+            if not rel_type:
+                continue
+            query = RELATIONSHIP_QUERY % {
+                "type": escape_name(rel_type),
+                "source_label": self.on_create_label("source"),
+                "target_label": self.on_create_label("target"),
+            }
+            statements += self.batched(query, rows)
+
+        return statements
+
+    def on_create_label(self, variable: str) -> str:
+        if not self.tenant_label:
+            return ""
+        return f", {variable}:{self.tenant_label}"
+
+    def document_properties(self, document) -> Dict[str, Any]:
+        properties = self.clean_properties(document.metadata)
+        if self.source_text_mode == GraphSourceTextMode.full:
+            properties["text"] = document.page_content
+        elif self.source_text_mode == GraphSourceTextMode.trim:
+            properties["text"] = document.page_content[
+                : self.source_text_max_chars
+            ]
+
+        return properties
+
+    @staticmethod
+    def clean_properties(properties: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            k: v for k, v in (properties or {}).items() if is_property_value(v)
+        }
+
+    def batched(self, query: str, rows: List[Any]) -> Iterable[tuple]:
+        return [
+            (query, rows[start : start + self.batch_size])
+            for start in range(0, len(rows), self.batch_size)
+        ]
@@ -0,0 +1,519 @@
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+import sqlalchemy
+from hrag.utils.cache import ProcessCache
+from hrag.utils.database import engine
+from hrag.utils.enums import AnnIndexType
+from hrag.utils.llm_provider import get_llm_client_key
+from langchain_community.vectorstores import PGVector
+from langchain_community.vectorstores.pgvector import DistanceStrategy
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pgvector.sqlalchemy import Vector
+from settings import app_settings
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+logger = logging.getLogger("gunicorn.error")
+
+# (tenant, collection name, embedding client key) -> HybridRagPGVector
+vector_stores = ProcessCache("vector_stores")
+
+
+# operator class of the ANN indexes for every distance strategy
+DISTANCE_OPERATOR_CLASSES = {
+    DistanceStrategy.COSINE: "vector_cosine_ops",
+    DistanceStrategy.EUCLIDEAN: "vector_l2_ops",
+    DistanceStrategy.MAX_INNER_PRODUCT: "vector_ip_ops",
+}
+DISTANCE_OPERATORS = {
+    DistanceStrategy.COSINE: "<=>",
+    DistanceStrategy.EUCLIDEAN: "<->",
+    DistanceStrategy.MAX_INNER_PRODUCT: "<#>",
+}
+
+# the full text search runs on this expression for the planner to pick its GIN
+# index up, the text search configuration is part of the index name
+FULL_TEXT_EXPRESSION = (
+    "to_tsvector('%(config)s'::regconfig, coalesce(document, ''))"
+)
+FULL_TEXT_INDEX = "ix_langchain_pg_embedding_fts_%(config)s"
+# held by the process building the full text index, the other ones skip it
+FULL_TEXT_LOCK_ID = 1573678846307946497
+
+# Top candidates of the nearest neighbour and of the full text search of the
+# collection, fused with reciprocal rank fusion: sum(1 / (rrf_k + rank)). The
+# full text query matches any of the terms of the question, compound terms
+# (product codes, ...) stay phrases.
+HYBRID_SEARCH_QUERY = """
+WITH vector_search AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rank
+    FROM (
+        SELECT
+            id,
+            embedding::vector(%(dimension)d) %(operator)s :embedding
+                AS distance
+        FROM langchain_pg_embedding
+        WHERE collection_id = :collection_id
+        ORDER BY distance
+        LIMIT :candidates
+    ) nearest
+),
+lexical_search AS (
+    SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM (
+        SELECT id, ts_rank_cd(%(document)s, query) AS score
+        FROM
+            langchain_pg_embedding,
+            CAST(
+                replace(
+                    CAST(
+                        plainto_tsquery(CAST(:config AS regconfig), :query)
+                        AS text
+                    ),
+                    ' & ',
+                    ' | '
+                ) AS tsquery
+            ) AS query
+        WHERE collection_id = :collection_id AND %(document)s @@ query
+        ORDER BY score DESC
+        LIMIT :candidates
+    ) matched
+)
+SELECT
+    e.document,
+    e.cmetadata,
+    coalesce(1.0 / (:rrf_k + v.rank), 0) + coalesce(1.0 / (:rrf_k + l.rank), 0)
+        AS score
+FROM vector_search v
+FULL OUTER JOIN lexical_search l ON l.id = v.id
+JOIN langchain_pg_embedding e ON e.id = coalesce(v.id, l.id)
+ORDER BY score DESC
+LIMIT :k
+"""
+
+
+class HybridRagPGVector(PGVector):
+    """
+    PGVector bound to the shared engine that only looks its collection row
+    up once
+
+    langchain_pg_embedding.embedding has no fixed dimension, which ANN indexes
+    require. Every collection can get its own partial HNSW / IVFFlat index over
+    `embedding::vector(<dimension>)`, so the distance is computed on that same
+    expression for the planner to pick the index up.
+    """
+
+    _collection = None
+    # per tenant search settings, applied with SET LOCAL to every search
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+
+    def get_collection(self, session: Session):
+        if self._collection is None:
+            collection = super().get_collection(session)
+            if collection is None:
+                return None
+
+            # keep a detached copy around, merging it back with load=False
+            # attaches it to the session without another round trip
+            snapshot = self.CollectionStore(
+                uuid=collection.uuid,
+                name=collection.name,
+                cmetadata=collection.cmetadata,
+            )
+            make_transient_to_detached(snapshot)
+            self._collection = snapshot
+
+        return session.merge(self._collection, load=False)
+
+    def delete_collection(self):
+        super().delete_collection()
+        self._collection = None
+
+    def clear(self, filter: Optional[Dict[str, Any]] = None):
+        """
+        Remove the embeddings of the collection, only the ones matching the
+        metadata filter (same syntax as the searches) if given. The collection
+        itself is kept, its uuid is cached by every process using the store.
+        """
+        with Session(self._bind) as session, session.begin():
+            collection = self.get_collection(session)
+            if not collection:
+                return
+
+            filter_by = [self.EmbeddingStore.collection_id == collection.uuid]
+            if filter:
+                filter_by.append(self._create_filter_clause(filter))
+            session.execute(
+                sqlalchemy.delete(self.EmbeddingStore).where(*filter_by)
+            )
+
+    def apply_search_settings(self, session: Session):
+        # SET LOCAL only lasts until the end of the transaction of the search
+        if self.hnsw_ef_search:
+            session.execute(
+                sqlalchemy.text(
+                    f"SET LOCAL hnsw.ef_search = {int(self.hnsw_ef_search)}"
+                )
+            )
+        if self.ivfflat_probes:
+            session.execute(
+                sqlalchemy.text(
+                    f"SET LOCAL ivfflat.probes = {int(self.ivfflat_probes)}"
+                )
+            )
+
+    @property
+    def distance_strategy(self) -> Any:
+        operator = DISTANCE_OPERATORS[self._distance_strategy]
+
+        def distance(embedding: List[float]):
+            column = sqlalchemy.cast(
+                self.EmbeddingStore.embedding, Vector(len(embedding))
+            )
+            return column.op(operator, return_type=sqlalchemy.Float)(embedding)
+
+        return distance
+
+    def _query_collection(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, str]] = None,
+    ) -> List[Any]:
+        """Query the collection."""
+        with Session(self._bind) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+
+            self.apply_search_settings(session)
+
+            filter_by = [self.EmbeddingStore.collection_id == collection.uuid]
+            if filter:
+                filter_clauses = self._create_filter_clause(filter)
+                if filter_clauses is not None:
+                    filter_by.append(filter_clauses)
+
+            return (
+                session.query(
+                    self.EmbeddingStore,
+                    self.distance_strategy(embedding).label("distance"),
+                )
+                .filter(*filter_by)
+                .order_by(sqlalchemy.asc("distance"))
+                .limit(k)
+                .all()
+            )
+
+    def hybrid_search(
+        self, query: str, k: int = 4, candidates: int = 40, rrf_k: int = 60
+    ) -> List[Document]:
+        """
+        Nearest neighbour and full text search of the collection in a single
+        round trip, the results of both are fused with reciprocal rank fusion.
+        """
+        embedding = self.embedding_function.embed_query(query)
+        statement = sqlalchemy.text(
+            HYBRID_SEARCH_QUERY
+            % {
+                "dimension": len(embedding),
+                "operator": DISTANCE_OPERATORS[self._distance_strategy],
+                "document": get_full_text_expression(),
+            }
+        ).bindparams(
+            sqlalchemy.bindparam("embedding", type_=Vector(len(embedding)))
+        )
+
+        with Session(self._bind) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+
+            self.apply_search_settings(session)
+            rows = session.execute(
+                statement,
+                {
+                    "embedding": embedding,
+                    "query": query,
+                    "config": app_settings.full_text_search_config,
+                    "collection_id": collection.uuid,
+                    "candidates": max(candidates, k),
+                    "rrf_k": rrf_k,
+                    "k": k,
+                },
+            ).all()
+
+        return [
+            Document(page_content=row.document, metadata=row.cmetadata or {})
+            for row in rows
+        ]
+
+    # ANN INDEX MANAGEMENT
+    def get_ann_index_name(self, collection) -> str:
+        return f"ix_langchain_pg_embedding_ann_{collection.uuid.hex}"
+
+    def get_ann_index(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the ANN index of the collection (name, type, dimension, rows),
+        the name and type are None while the collection has no index. None if
+        the collection does not exist.
+        """
+        with Session(self._bind) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                return None
+
+            index_name = self.get_ann_index_name(collection)
+            definition = session.execute(
+                sqlalchemy.text(
+                    "SELECT indexdef FROM pg_indexes "
+                    "WHERE indexname = :index_name"
+                ),
+                {"index_name": index_name},
+            ).scalar()
+            dimension, rows = self.get_collection_stats(session, collection)
+
+        index_type = None
+        if definition:
+            index_type = next(
+                (t for t in AnnIndexType if f"USING {t.value}" in definition),
+                None,
+            )
+
+        return {
+            "index_name": index_name if definition else None,
+            "index_type": index_type,
+            "dimension": dimension,
+            "rows": rows,
+        }
+
+    def get_collection_stats(self, session: Session, collection):
+        row = session.execute(
+            sqlalchemy.text(
+                "SELECT count(*) AS rows, "
+                "max(vector_dims(embedding)) AS dimension "
+                "FROM langchain_pg_embedding "
+                "WHERE collection_id = :collection_id"
+            ),
+            {"collection_id": collection.uuid},
+        ).one()
+        return row.dimension, row.rows
+
+    def create_ann_index(
+        self, index_type: AnnIndexType, rebuild: bool = False
+    ):
+        """
+        Build the ANN index of the collection (without locking writes), an
+        existing index is kept unless rebuild is set or its type is different.
+        """
+        with Session(self._bind) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            dimension, rows = self.get_collection_stats(session, collection)
+
+        if not dimension:
+            logger.debug(
+                "[%s] empty collection, no ANN index", self.collection_name
+            )
+            return self.get_ann_index()
+
+        current = self.get_ann_index()
+        if current["index_type"] is not None:
+            if current["index_type"] == index_type and not rebuild:
+                return current
+            self.drop_ann_index()
+
+        index_name = self.get_ann_index_name(collection)
+        operator_class = DISTANCE_OPERATOR_CLASSES[self._distance_strategy]
+        options = ""
+        if index_type == AnnIndexType.ivfflat:
+            # pgvector recommendation: rows / 1000 lists up to 1M rows,
+            # sqrt(rows) above
+            lists = rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows))
+            options = f" WITH (lists = {max(lists, 10)})"
+
+        logger.info(
+            "[%s] building %s index over %d rows",
+            self.collection_name,
+            index_type.value,
+            rows,
+        )
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with self._bind.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                    f"ON langchain_pg_embedding USING {index_type.value} "
+                    f"((embedding::vector({int(dimension)})) {operator_class})"
+                    f"{options} "
+                    f"WHERE collection_id = '{collection.uuid}'"
+                )
+            )
+
+        return self.get_ann_index()
+
+    def reindex_ann_index(self):
+        """
+        Rebuild the ANN index after a bulk load, IVFFlat lists are computed
+        from the rows present when the index is built.
+        """
+        current = self.get_ann_index()
+        if current is None or current["index_type"] is None:
+            return current
+
+        logger.info(
+            "[%s] rebuilding %s", self.collection_name, current["index_name"]
+        )
+        with self._bind.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    f"REINDEX INDEX CONCURRENTLY {current['index_name']}"
+                )
+            )
+
+        return self.get_ann_index()
+
+    def drop_ann_index(self):
+        with Session(self._bind) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                return
+
+        with self._bind.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    "DROP INDEX CONCURRENTLY IF EXISTS "
+                    f"{self.get_ann_index_name(collection)}"
+                )
+            )
+
+
+def get_full_text_expression() -> str:
+    config = app_settings.full_text_search_config.replace("'", "''")
+    return FULL_TEXT_EXPRESSION % {"config": config}
+
+
+def create_full_text_index(bind=engine):
+    """
+    Build the GIN index of the hybrid search over the chunks of every
+    collection, without locking writes. Skipped while langchain has not created
+    its tables yet and while another process is building it.
+    """
+    index_name = FULL_TEXT_INDEX % {
+        "config": re.sub(
+            r"\W", "_", app_settings.full_text_search_config
+        ).lower()
+    }
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with bind.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        if not connection.execute(
+            sqlalchemy.text("SELECT to_regclass('langchain_pg_embedding')")
+        ).scalar():
+            return
+
+        if not connection.execute(
+            sqlalchemy.text("SELECT pg_try_advisory_lock(:lock_id)"),
+            {"lock_id": FULL_TEXT_LOCK_ID},
+        ).scalar():
+            return
+
+        try:
+            valid = connection.execute(
+                sqlalchemy.text(
+                    "SELECT i.indisvalid FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :index_name"
+                ),
+                {"index_name": index_name},
+            ).scalar()
+            if valid:
+                return
+
+            if valid is not None:
+                # left invalid by an interrupted build
+                connection.execute(
+                    sqlalchemy.text(
+                        f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"
+                    )
+                )
+
+            logger.info("Building the full text index of the vector store ...")
+            connection.execute(
+                sqlalchemy.text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                    "ON langchain_pg_embedding "
+                    f"USING gin ({get_full_text_expression()})"
+                )
+            )
+        finally:
+            connection.execute(
+                sqlalchemy.text("SELECT pg_advisory_unlock(:lock_id)"),
+                {"lock_id": FULL_TEXT_LOCK_ID},
+            )
+
+
+class HybridSearchRetriever(BaseRetriever):
+    """
+    Retriever running the hybrid (nearest neighbour and full text) search of
+    a store.
+    """
+
+    store: HybridRagPGVector
+    k: int = 4
+    candidates: int = 40
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.store.hybrid_search(
+            query, k=self.k, candidates=self.candidates, rrf_k=self.rrf_k
+        )
+
+
+def get_vector_store(
+    tenant, embeddings, collection_name: str = None
+) -> HybridRagPGVector:
+    collection_name = collection_name or tenant.tenant
+
+    def build():
+        store = HybridRagPGVector(
+            connection_string=app_settings.postgresql_url,
+            connection=engine,
+            embedding_function=embeddings,
+            collection_name=collection_name,
+            use_jsonb=True,
+        )
+        store.hnsw_ef_search = tenant.hnsw_ef_search
+        store.ivfflat_probes = tenant.ivfflat_probes
+        return store
+
+    return vector_stores.get_or_create(
+        (
+            tenant.tenant,
+            collection_name,
+            get_llm_client_key(tenant, "embedding"),
+        ),
+        build,
+    )
+
+
+def invalidate_vector_stores(tenant):
+    vector_stores.invalidate(lambda key: key[0] == tenant.tenant)
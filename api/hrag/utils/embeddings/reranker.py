@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+from hrag.utils.cache import ProcessCache
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from settings import app_settings
+
+logger = logging.getLogger("gunicorn.error")
+
+# model name -> BatchedRanker
+rankers = ProcessCache("rankers")
+
+# scoring never runs on the event loop, every model shares these threads
+ranker_executor = ThreadPoolExecutor(
+    max_workers=app_settings.reranker_workers, thread_name_prefix="reranker"
+)
+
+
+class BatchedRanker:
+    """
+    A FlashRank cross encoder loaded once and shared by every request. The
+    (query, passage) pairs submitted within reranker_batch_wait_ms of each
+    other are scored together in one inference call.
+    """
+
+    def __init__(self, model: str):
+        from flashrank import Ranker
+
+        self.model = model
+        self.ranker = Ranker(model_name=model)
+        if self.ranker.llm_model is not None:
+            raise ValueError(f"Listwise reranker {model} is not supported")
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def submit(self, query: str, texts: List[str]) -> Future:
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+
+        with self._lock:
+            self._pending.append((query, texts, future))
+            if not self._scheduled:
+                self._scheduled = True
+                ranker_executor.submit(self._run)
+
+        return future
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        return self.submit(query, texts).result()
+
+    async def ascore(self, query: str, texts: List[str]) -> List[float]:
+        return await asyncio.wrap_future(self.submit(query, texts))
+
+    def _run(self):
+        if app_settings.reranker_batch_wait_ms > 0:
+            time.sleep(app_settings.reranker_batch_wait_ms / 1000)
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._scheduled = False
+
+        batch, batch_size = [], 0
+        for item in pending:
+            if (
+                batch
+                and batch_size + len(item[1])
+                > app_settings.reranker_batch_size
+            ):
+                self._score_batch(batch)
+                batch, batch_size = [], 0
+            batch.append(item)
+            batch_size += len(item[1])
+        if batch:
+            self._score_batch(batch)
+
+    def _score_batch(self, batch):
+        logger.debug(
+            "[%s] scoring %d requests, %d passages",
+            self.model,
+            len(batch),
+            sum(len(texts) for _, texts, _ in batch),
+        )
+        try:
+            scores = self.infer(
+                [[query, text] for query, texts, _ in batch for text in texts]
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for _, texts, future in batch:
+            future.set_result(scores[start : start + len(texts)].tolist())
+            start += len(texts)
+
+    def infer(self, pairs: List[List[str]]) -> np.ndarray:
+        """
+        Relevance scores of (query, passage) pairs of any queries, computed
+        like the pairwise branch of flashrank's Ranker.rerank (0.2.9): the
+        sigmoid of the logit for single-logit models, the softmax probability
+        of the relevant class (1) for two-class ones. Only the batching
+        differs, the extra padding is masked out.
+        """
+        encoded = self.ranker.tokenizer.encode_batch(pairs)
+        onnx_input = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array(
+                [e.attention_mask for e in encoded], dtype=np.int64
+            ),
+        }
+        token_type_ids = np.array(
+            [e.type_ids for e in encoded], dtype=np.int64
+        )
+        if np.any(token_type_ids):
+            onnx_input["token_type_ids"] = token_type_ids
+
+        logits = self.ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            return 1 / (1 + np.exp(-logits.flatten()))
+
+        exp_logits = np.exp(logits)
+        return exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+
+
+def get_ranker(model: str) -> BatchedRanker:
+    return rankers.get_or_create(model, lambda: BatchedRanker(model))
+
+
+def preload_rankers():
+    """
+    Load the default reranker and the ones configured by tenants, so no request
+    has to wait for a model to be downloaded and loaded.
+    """
+    from fastapi_sqlalchemy import db as db_session
+    from hrag.models import Tenant
+
+    models = {app_settings.reranker_model}
+    with db_session():
+        models.update(
+            model
+            for (model,) in db_session.session.query(Tenant.reranker_model)
+            .filter(Tenant.reranker_model.isnot(None))
+            .distinct()
+        )
+
+    for model in models:
+        try:
+            get_ranker(model)
+        except Exception:
+            logger.warning("Unable to load reranker %s", model, exc_info=True)
+
+
+class SharedFlashrankRerank(BaseDocumentCompressor):
+    """
+    Drop-in replacement of langchain's FlashrankRerank scoring with the shared,
+    batched ranker of the model.
+    """
+
+    model: str
+    top_n: int = 3
+    score_threshold: float = 0.0
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        ranker = get_ranker(self.model)
+        scores = ranker.score(query, [doc.page_content for doc in documents])
+        return self.select(documents, scores)
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if self.model in rankers:
+            ranker = get_ranker(self.model)
+        else:
+            # loading the model (and downloading it the first time) takes
+            # a while
+            ranker = await asyncio.to_thread(get_ranker, self.model)
+        scores = await ranker.ascore(
+            query, [doc.page_content for doc in documents]
+        )
+        return self.select(documents, scores)
+
+    def select(
+        self, documents: Sequence[Document], scores: List[float]
+    ) -> List[Document]:
+        ranked = sorted(
+            zip(scores, range(len(documents)), documents),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={"id": i, "relevance_score": score, **doc.metadata},
+            )
+            for score, i, doc in ranked[: self.top_n]
+            if score >= self.score_threshold
+        ]
@@ -1,23 +1,32 @@
 import logging
+from typing import Callable
 
 from hrag.models import Tenant
+from hrag.utils.enums import AnnIndexType, DocumentChunkKind, RetrievalMode
 from langchain.chains.summarize import load_summarize_chain
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.tools.retriever import create_retriever_tool
-from langchain_community.document_compressors import FlashrankRerank
-from langchain_community.vectorstores import PGVector
 from langchain_core.documents import Document
 
 # from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from settings import app_settings
 
+from .fingerprint import ChunkFingerprints
+from .pgvector import (
+    HybridSearchRetriever,
+    create_full_text_index,
+    get_vector_store,
+)
+from .reranker import SharedFlashrankRerank
+
 logger = logging.getLogger("gunicorn.error")
 
 
 class HybridRagEmbeddings:
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    EMBEDDING_BATCH_SIZE = 64
 
     def __init__(self, tenant: Tenant):
         super().__init__()
@@ -31,11 +40,12 @@ class HybridRagEmbeddings:
         self.embeddings = llms["embedding"]
         self.summary_llm = llms["chat"]
 
-        self.db = PGVector(
-            connection_string=app_settings.postgresql_url,
-            embedding_function=self.embeddings,
-            collection_name=self.collection_name,
-            use_jsonb=True,
+        self.db = get_vector_store(self.tenant, self.embeddings)
+        self.chunks = ChunkFingerprints(
+            self.tenant, DocumentChunkKind.vector, self.tenant.embedding_model
+        )
+        self.summaries = ChunkFingerprints(
+            self.tenant, DocumentChunkKind.summary, self.tenant.embedding_model
         )
 
         # self.text_splitter = SemanticChunker(self.embeddings)
@@ -44,29 +54,129 @@ class HybridRagEmbeddings:
             chunk_overlap=256,
         )
 
-    def add_documents(self, docs):
+    def split_documents(self, docs):
         splits = self.text_splitter.split_documents(docs)
-        splits = [split for split in splits if split.page_content.strip()]
-        self.db.add_documents(splits)
-
-        if self.tenant.enable_summary_embedding:
-            summary_chain = load_summarize_chain(
-                llm=self.summary_llm, chain_type="map_reduce"
+        return [split for split in splits if split.page_content.strip()]
+
+    def add_documents(
+        self, docs, on_progress: Callable[[int, int], None] = None
+    ):
+        """
+        Embed and store the chunks of the documents which are not stored yet,
+        on_progress(chunks_embedded, chunks_to_embed) is called after every
+        batch. Chunks no longer part of their source are removed. Returns the
+        number of chunks embedded.
+        """
+        splits = self.split_documents(docs)
+        if not splits:
+            return 0
+
+        new_splits, linked, stale = self.chunks.diff(splits)
+        for start in range(0, len(new_splits), self.EMBEDDING_BATCH_SIZE):
+            batch = new_splits[start : start + self.EMBEDDING_BATCH_SIZE]
+            self.db.add_documents(
+                batch, ids=[self.chunks.document_id(split) for split in batch]
             )
-            summary = summary_chain.invoke(splits)
-            summary_doc = Document(
-                page_content=summary["output_text"],
-                metadata=splits[0].metadata,
+            self.chunks.add(batch)
+            if on_progress is not None:
+                on_progress(
+                    min(start + self.EMBEDDING_BATCH_SIZE, len(new_splits)),
+                    len(new_splits),
+                )
+        self.chunks.add(linked)
+        if stale:
+            self.db.delete(self.chunks.remove(stale))
+
+        # not for chunks only linked to the source: they are stored already
+        # and summarizing costs as much as embedding them again
+        if self.tenant.enable_summary_embedding and (new_splits or stale):
+            self.add_summary(splits)
+
+        return len(new_splits)
+
+    def add_summary(self, splits):
+        """
+        Replace the summary of the source the splits come from.
+        """
+        summary_chain = load_summarize_chain(
+            llm=self.summary_llm, chain_type="map_reduce"
+        )
+        summary = summary_chain.invoke(splits)
+        summary_doc = Document(
+            page_content=summary["output_text"],
+            metadata=splits[0].metadata,
+        )
+        new_summaries, linked, stale = self.summaries.diff([summary_doc])
+        if new_summaries:
+            self.db.add_documents(
+                new_summaries, ids=[self.summaries.document_id(summary_doc)]
             )
-            self.db.add_documents([summary_doc])
+            self.summaries.add(new_summaries)
+        self.summaries.add(linked)
+        if stale:
+            self.db.delete(self.summaries.remove(stale))
+
+    def get_ann_index(self):
+        return self.db.get_ann_index()
+
+    def create_ann_index(
+        self, index_type: AnnIndexType = None, rebuild: bool = False
+    ):
+        return self.db.create_ann_index(
+            index_type or AnnIndexType(app_settings.ann_index_type),
+            rebuild=rebuild,
+        )
+
+    def maintain_ann_index(self, loaded_chunks: int):
+        """
+        Build the ANN index once the collection is large enough for it to pay
+        off, and rebuild IVFFlat indexes after bulk loads since their lists are
+        computed from the rows present when the index is built. HNSW indexes
+        are kept up to date by postgres itself.
+        """
+        index = self.db.get_ann_index()
+        if index is None or not index["rows"]:
+            return
+
+        if index["index_type"] is None:
+            if index["rows"] >= app_settings.ann_index_min_rows:
+                self.create_ann_index()
+        elif (
+            index["index_type"] == AnnIndexType.ivfflat
+            and loaded_chunks >= app_settings.ann_reindex_min_chunks
+        ):
+            self.db.reindex_ann_index()
+
+    def maintain_full_text_index(self):
+        """
+        Build the full text index of the hybrid search if it is missing,
+        the vector store tables might not have existed when the
+        application started.
+        """
+        if RetrievalMode(app_settings.retrieval_mode) == RetrievalMode.hybrid:
+            create_full_text_index()
 
     def get_retriever(self):
-        base_retriever = self.db.as_retriever(
-            search_type="similarity",
-        )
+        if RetrievalMode(app_settings.retrieval_mode) == RetrievalMode.hybrid:
+            base_retriever = HybridSearchRetriever(
+                store=self.db,
+                k=app_settings.retrieval_k,
+                candidates=app_settings.hybrid_search_candidates,
+                rrf_k=app_settings.hybrid_search_rrf_k,
+            )
+        else:
+            base_retriever = self.db.as_retriever(
+                search_type="similarity",
+                search_kwargs={"k": app_settings.retrieval_k},
+            )
         # reranking
         if app_settings.enable_reranking:
-            compressor = FlashrankRerank()
+            compressor = SharedFlashrankRerank(
+                model=self.tenant.reranker_model
+                or app_settings.reranker_model,
+                top_n=self.tenant.reranker_top_n
+                or app_settings.reranker_top_n,
+            )
             compression_retriever = ContextualCompressionRetriever(
                 base_compressor=compressor, base_retriever=base_retriever
             )
@@ -84,4 +194,6 @@ class HybridRagEmbeddings:
         )
 
     def truncate(self):
-        self.db.delete_collection()
+        self.db.clear()
+        self.chunks.clear()
+        self.summaries.clear()
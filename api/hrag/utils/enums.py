@@ -4,19 +4,69 @@ from enum import Enum
 class LanguageModelProvider(Enum):
     ollama = "Ollama"
     open_ai = "OpenAI"
+    cassette = "Cassette"
 
 
 class PromptType(Enum):
     REFORM_QUESTION = "reform_question"
     SUMMARY_CONVERSATION = "summary_conversation"
     RETRIEVER_GRADER = "retriever_grader"
+    RETRIEVER_BATCH_GRADER = "retriever_batch_grader"
     GENERATE_RAG_ANSWER = "generate_rag_answer"
     GENERATE_REGULAR_ANSWER = "generate_regular_answer"
     HALLUCINATION_GRADER = "hallucination_grader"
     ANSWER_GRADER = "answer_grader"
+    ANSWER_VERIFIER = "answer_verifier"
     EXTRACT_ENTITIES = "extract_entities"
 
 
 class LLMFamily(Enum):
     llama = "llama"
     other = "other"
+
+
+class DocumentGradingMode(Enum):
+    sequential = "sequential"
+    concurrent = "concurrent"
+    batch = "batch"
+
+
+class DocumentJobStatus(Enum):
+    pending = "pending"
+    processing = "processing"
+    completed = "completed"
+    failed = "failed"
+
+
+class GraphSourceTextMode(Enum):
+    full = "full"
+    trim = "trim"
+    none = "none"
+
+
+class DocumentChunkKind(Enum):
+    vector = "vector"
+    summary = "summary"
+    graph = "graph"
+
+
+class AnnIndexType(Enum):
+    hnsw = "hnsw"
+    ivfflat = "ivfflat"
+
+
+class RetrievalMode(Enum):
+    vector = "vector"
+    hybrid = "hybrid"
+
+
+class VerificationMode(Enum):
+    separate = "separate"
+    combined = "combined"
+    skip = "skip"
+
+
+class CassetteMode(Enum):
+    replay = "replay"
+    record_missing = "record_missing"
+    record = "record"
@@ -1,13 +1,23 @@
+import asyncio
 import logging
-from typing import List
-
-from hrag.models import Tenant
-from hrag.utils.embeddings import HybridRagEmbeddings, HybridRagEntityGraph
-from hrag.utils.enums import PromptType
+from typing import List, Optional, Set
+
+from hrag.models import Tenant, TenantConfig
+from hrag.utils.cache import ProcessCache
+from hrag.utils.embeddings import (
+    HybridRagAnswerCache,
+    HybridRagEmbeddings,
+    HybridRagEntityGraph,
+)
+from hrag.utils.enums import DocumentGradingMode, PromptType, VerificationMode
+from hrag.utils.llm_provider import with_llm_callbacks
+from hrag.utils.metrics import graph_documents, track_node
 from hrag.utils.prompts import HybridRagPrompt
+from hrag.utils.tracing import traced
 from langchain.memory import ConversationSummaryMemory
 from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.messages import get_buffer_string
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage, get_buffer_string
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langgraph.graph import END, StateGraph
 from settings import app_settings
@@ -23,101 +33,143 @@ class GraphState(TypedDict):
     generation: str
     documents: List[str]
     relationships: str
+    # per conversation state, the compiled graph itself is shared by
+    # all conversations
+    chat_history: List[BaseMessage]
+    summary: str
+    # answer cache hit and verdict of the answer checks
+    cache_hit: bool
+    verdict: str
+    # number of RAG answers generated so far, bounds the self-correction loop
+    generation_attempts: int
 
 
-class HybridRagGraph:
-    def __init__(
-        self,
-        tenant: Tenant,
-        chat_history: list = None,
-        old_summary: str = None,
-    ):
-        self.chat_history = chat_history or []
-        self.old_summary = old_summary or ""
+# (tenant config, prompt family) -> HybridRagGraph
+hybrid_rag_graphs = ProcessCache("hybrid_rag_graphs")
 
-        self.tenant = tenant
-        self.llm = self.tenant.llms["chat"]
-        self.json_llm = self.tenant.llms["json_chat"]
 
-        # load old history
-        self.message_history = ChatMessageHistory()
-        for history in self.chat_history:
-            if history["role"] == "ai":
-                self.message_history.add_ai_message(history["content"])
-            else:
-                self.message_history.add_user_message(history["content"])
+def invalidate_hybrid_rag_graphs(tenant):
+    hybrid_rag_graphs.invalidate(lambda key: key[0] == tenant.tenant)
 
-        if not old_summary:  # init memory buffer if needed
-            self.memory = ConversationSummaryMemory.from_messages(
-                llm=self.llm,
-                chat_memory=self.message_history,
-                memory_key="chat_history",
-            )
-        else:  # do not init memory buffer
-            self.memory = ConversationSummaryMemory(
-                llm=self.llm,
-                chat_memory=self.message_history,
-                buffer=old_summary,
-                memory_key="chat_history",
-            )
-
-        self.graph = self.build_graph_workflow()
-
-    # DEFINING LLM FUNCTIONS
-    def tenant_retriever(self):
-        return HybridRagEmbeddings(tenant=self.tenant).get_retriever()
 
-    def graph_retriever(self):
-        return HybridRagEntityGraph(tenant=self.tenant)
+class HybridRagGraph:
+    HISTORY_WINDOW = 10
+    # tag of the chains whose tokens are sent to the user while streaming
+    ANSWER_TAG = "answer_generation"
+    # stage reported to the user when a node (or conditional edge) starts
+    NODE_STAGES = {
+        "reform_question": "reforming",
+        "lookup_answer_cache": "retrieving",
+        "retrieve_graph_documents": "retrieving",
+        "retrieve_tenant_documents": "retrieving",
+        "grade_documents": "grading",
+        "generate_rag_answer": "generating",
+        "generate_regular_answer": "generating",
+        "verify_answer": "verifying",
+    }
+
+    def __init__(self, tenant: TenantConfig):
+        self.tenant = tenant
+        self.llm = self.tenant.llms["chat"]
+        self.json_llm = self.tenant.llms["json_chat"]
 
-    def retriever_grader_chain(self):
-        prompt = HybridRagPrompt.get_prompt(
-            PromptType.RETRIEVER_GRADER, self.tenant.prompt_family
+        self.tenant_retriever = HybridRagEmbeddings(
+            tenant=self.tenant
+        ).get_retriever()
+        self.graph_retriever = HybridRagEntityGraph(tenant=self.tenant)
+        self.answer_cache = (
+            HybridRagAnswerCache(tenant=self.tenant)
+            if self.tenant.enable_answer_cache
+            else None
         )
-        return prompt | self.json_llm | JsonOutputParser()
-
-    def generate_rag_answer_chain(self):
-        prompt = HybridRagPrompt.get_prompt(
-            PromptType.GENERATE_RAG_ANSWER, self.tenant.prompt_family
+        self.verification_mode = (
+            self.tenant.verification_mode
+            or VerificationMode(app_settings.verification_mode)
         )
-        return prompt | self.llm | StrOutputParser()
 
-    def generate_regular_answer_chain(self):
-        prompt = HybridRagPrompt.get_prompt(
-            PromptType.GENERATE_REGULAR_ANSWER, self.tenant.prompt_family
+        self.retriever_grader_chain = self.build_chain(
+            PromptType.RETRIEVER_GRADER, self.json_llm, JsonOutputParser()
         )
-        return prompt | self.llm | StrOutputParser()
-
-    def hallucination_grader_chain(self):
-        prompt = HybridRagPrompt.get_prompt(
-            PromptType.HALLUCINATION_GRADER, self.tenant.prompt_family
+        self.retriever_batch_grader_chain = self.build_chain(
+            PromptType.RETRIEVER_BATCH_GRADER,
+            self.json_llm,
+            JsonOutputParser(),
+        )
+        self.generate_rag_answer_chain = self.build_chain(
+            PromptType.GENERATE_RAG_ANSWER, self.llm, StrOutputParser()
+        ).with_config(tags=[self.ANSWER_TAG])
+        self.generate_regular_answer_chain = self.build_chain(
+            PromptType.GENERATE_REGULAR_ANSWER, self.llm, StrOutputParser()
+        ).with_config(tags=[self.ANSWER_TAG])
+        self.hallucination_grader_chain = self.build_chain(
+            PromptType.HALLUCINATION_GRADER, self.json_llm, JsonOutputParser()
+        )
+        self.answer_grader_chain = self.build_chain(
+            PromptType.ANSWER_GRADER, self.json_llm, JsonOutputParser()
+        )
+        self.answer_verifier_chain = self.build_chain(
+            PromptType.ANSWER_VERIFIER, self.json_llm, JsonOutputParser()
+        )
+        self.reform_question_chain = self.build_chain(
+            PromptType.REFORM_QUESTION, self.llm, StrOutputParser()
         )
-        return prompt | self.json_llm | JsonOutputParser()
 
-    def answer_grader_chain(self):
-        prompt = HybridRagPrompt.get_prompt(
-            PromptType.ANSWER_GRADER, self.tenant.prompt_family
+        self.graph = self.build_graph_workflow()
+
+    @classmethod
+    def for_tenant(cls, tenant: Tenant):
+        """
+        Get the compiled graph of the tenant, it is only built once per tenant
+        config and prompt family.
+        """
+        config = tenant.config
+        return hybrid_rag_graphs.get_or_create(
+            config.cache_key,
+            lambda: cls(config),
         )
-        return prompt | self.json_llm | JsonOutputParser()
 
-    def reform_question_chain(self):
+    # DEFINING LLM FUNCTIONS
+    def build_chain(self, prompt_type: PromptType, llm, parser):
         prompt = HybridRagPrompt.get_prompt(
-            PromptType.REFORM_QUESTION, self.tenant.prompt_family
+            prompt_type, self.tenant.prompt_family
+        )
+        return (
+            prompt
+            | with_llm_callbacks(llm, self.tenant, prompt_type.value)
+            | parser
         )
-        return prompt | self.llm | StrOutputParser()
+
+    @staticmethod
+    async def with_timeout(coroutine, timeout: float, default):
+        """
+        Await a retrieval branch, falling back to the default value when it
+        takes longer than timeout seconds (0 disables the timeout).
+        """
+        if not timeout or timeout <= 0:
+            return await coroutine
+
+        try:
+            return await asyncio.wait_for(coroutine, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "---Retrieval timed out after %ss, skipping it", timeout
+            )
+            return default
 
     # DEFINING LANG GRAPH NODES AND CONDITIONAL EDGES
-    def reform_question(self, state):
-        chain = self.reform_question_chain()
+    @track_node
+    @traced()
+    async def reform_question(self, state):
         question = state["question"]
-        if len(self.message_history.messages) > 0:
-            logger.debug("Reform question based on old chat history: %s", question)
-            reformed_question = chain.invoke(
+        chat_history = state["chat_history"]
+        if len(chat_history) > 0:
+            logger.debug(
+                "Reform question based on old chat history: %s", question
+            )
+            reformed_question = await self.reform_question_chain.ainvoke(
                 {
                     "question": question,
-                    "chat_history": get_buffer_string(
-                        self.message_history.messages[-10:]
-                    ),
+                    "chat_history": get_buffer_string(chat_history),
                 }
             )
             logger.debug("---Reformed question: %s", reformed_question)
@@ -132,39 +184,88 @@ class HybridRagGraph:
             "relationships": "",  # TODO move this to graph document
         }
 
-    def retrieve_graph_documents(self, state):
+    @track_node
+    @traced()
+    async def lookup_answer_cache(self, state):
+        reformed_question = state["reformed_question"]
+
+        logger.debug("Lookup answer cache: %s", reformed_question)
+        try:
+            answer = await self.answer_cache.alookup(reformed_question)
+        except Exception:
+            logger.warning("---Answer cache lookup failed", exc_info=True)
+            answer = None
+
+        if answer is None:
+            logger.debug("---cache miss")
+            return {"cache_hit": False}
+
+        logger.debug("---cache hit: %s", answer)
+        return {"cache_hit": True, "generation": answer}
+
+    def route_cached_answer(self, state):
+        if state["cache_hit"]:
+            return END
+
+        return ["retrieve_graph_documents", "retrieve_tenant_documents"]
+
+    @track_node
+    @traced()
+    async def cache_answer(self, state):
+        logger.debug("Cache verified answer: %s", state["reformed_question"])
+        try:
+            await self.answer_cache.astore(
+                state["reformed_question"], state["generation"]
+            )
+        except Exception:
+            logger.warning("---Unable to cache the answer", exc_info=True)
+
+        return {}
+
+    @track_node
+    @traced()
+    async def retrieve_graph_documents(self, state):
         question = state["question"]
         reformed_question = state["reformed_question"]
 
         logger.debug("Retrieve graph documents: %s", question)
         logger.debug("---Reformed question: %s", reformed_question)
-        relationships = self.graph_retriever().retrieve_info(reformed_question)
+        relationships = await self.with_timeout(
+            self.graph_retriever.aretrieve_info(reformed_question),
+            timeout=app_settings.graph_retrieval_timeout,
+            default="",
+        )
         logger.debug("---Retrieved graph documents: %s", relationships)
 
-        return {
-            "relationships": relationships,
-            "question": question,
-            "reformed_question": reformed_question,
-        }
+        # runs in parallel with retrieve_tenant_documents, only update our
+        # own key
+        return {"relationships": relationships}
 
-    def retrieve_tenant_documents(self, state):
+    @track_node
+    @traced()
+    async def retrieve_tenant_documents(self, state):
         question = state["question"]
-        relationships = state["relationships"]
         reformed_question = state["reformed_question"]
 
         logger.debug("Retrieve tenant documents: %s", question)
         logger.debug("---Reformed question: %s", reformed_question)
-        documents = self.tenant_retriever().invoke(reformed_question)
+        documents = await self.with_timeout(
+            self.tenant_retriever.ainvoke(reformed_question),
+            timeout=app_settings.vector_retrieval_timeout,
+            default=[],
+        )
         logger.debug("---Retrieved tenant documents: %s", documents)
+        graph_documents.labels(self.tenant.tenant, "retrieved").observe(
+            len(documents)
+        )
 
-        return {
-            "documents": documents,
-            "question": question,
-            "reformed_question": reformed_question,
-            "relationships": relationships,
-        }
+        # runs in parallel with retrieve_graph_documents, only update our
+        # own key
+        return {"documents": documents}
 
-    def grade_documents(self, state):
+    @track_node
+    @traced()
+    async def grade_documents(self, state):
         question = state["question"]
         documents = state["documents"]
         relationships = state["relationships"]
@@ -173,22 +274,26 @@ class HybridRagGraph:
         logger.debug("Grade documents: %s", question)
         logger.debug("---Reformed question: %s", reformed_question)
 
-        grader = self.retriever_grader_chain()
-
-        # Score each doc
-        filtered_docs = []
-        for d in documents:
-            score = grader.invoke(
-                {"question": reformed_question, "document": d.page_content}
+        grading_mode = DocumentGradingMode(app_settings.document_grading_mode)
+        logger.debug("---Grading mode: %s", grading_mode.value)
+        if not documents:
+            filtered_docs = []
+        elif grading_mode == DocumentGradingMode.batch:
+            filtered_docs = await self.grade_documents_in_batch(
+                reformed_question, documents
+            )
+        elif grading_mode == DocumentGradingMode.concurrent:
+            filtered_docs = await self.grade_documents_concurrently(
+                reformed_question, documents
+            )
+        else:
+            filtered_docs = await self.grade_documents_sequentially(
+                reformed_question, documents
             )
-            grade = score["score"]
-            # Document relevant
-            if grade.lower() == "yes":
-                logger.debug("------grade: document relevant")
-                filtered_docs.append(d)
-            # Document not relevant
-            else:
-                logger.debug("------grade: document irrelevant")
+
+        graph_documents.labels(self.tenant.tenant, "kept").observe(
+            len(filtered_docs)
+        )
 
         return {
             "documents": filtered_docs,
@@ -197,6 +302,133 @@ class HybridRagGraph:
             "relationships": relationships,
         }
 
+    @staticmethod
+    def has_enough_relevant_documents(relevant_count: int) -> bool:
+        min_relevant = app_settings.document_grading_min_relevant
+        return 0 < min_relevant <= relevant_count
+
+    async def grade_document(self, question: str, document) -> bool:
+        score = await self.retriever_grader_chain.ainvoke(
+            {"question": question, "document": document.page_content}
+        )
+        grade = score["score"]
+        # Document relevant
+        if grade.lower() == "yes":
+            logger.debug("------grade: document relevant")
+            return True
+
+        # Document not relevant
+        logger.debug("------grade: document irrelevant")
+        return False
+
+    async def grade_documents_sequentially(
+        self, question: str, documents: list
+    ):
+        filtered_docs = []
+        for d in documents:
+            if await self.grade_document(question, d):
+                filtered_docs.append(d)
+                if self.has_enough_relevant_documents(len(filtered_docs)):
+                    logger.debug(
+                        "------enough relevant documents, stop grading"
+                    )
+                    break
+
+        return filtered_docs
+
+    async def grade_documents_concurrently(
+        self, question: str, documents: list
+    ):
+        semaphore = asyncio.Semaphore(
+            app_settings.document_grading_concurrency
+        )
+
+        async def grade(index, document):
+            async with semaphore:
+                return index, await self.grade_document(question, document)
+
+        tasks = [
+            asyncio.ensure_future(grade(index, document))
+            for index, document in enumerate(documents)
+        ]
+        relevant_indexes = set()
+        try:
+            for future in asyncio.as_completed(tasks):
+                index, is_relevant = await future
+                if is_relevant:
+                    relevant_indexes.add(index)
+                    if self.has_enough_relevant_documents(
+                        len(relevant_indexes)
+                    ):
+                        logger.debug(
+                            "------enough relevant documents, stop grading"
+                        )
+                        break
+        finally:
+            # cancel the pending gradings on early exit (or on error)
+            for task in tasks:
+                task.cancel()
+
+        # keep the retrieval order
+        return [
+            d for index, d in enumerate(documents) if index in relevant_indexes
+        ]
+
+    @staticmethod
+    def parse_batch_grade(score, documents: int) -> Optional[Set[int]]:
+        """
+        Indexes of the relevant documents graded by the batch grader, None when
+        its output is not an object with a list of valid document numbers.
+        """
+        if not isinstance(score, dict) or not isinstance(
+            score.get("relevant"), list
+        ):
+            return None
+
+        relevant_indexes = set()
+        for index in score["relevant"]:
+            if isinstance(index, str) and index.strip().isdigit():
+                index = int(index)
+            # bool is an int too
+            if isinstance(index, bool) or not isinstance(index, int):
+                return None
+            if not 0 <= index < documents:
+                return None
+            relevant_indexes.add(index)
+
+        return relevant_indexes
+
+    async def grade_documents_in_batch(self, question: str, documents: list):
+        try:
+            score = await self.retriever_batch_grader_chain.ainvoke(
+                {
+                    "question": question,
+                    "documents": "\n\n".join(
+                        f"[{index}] {d.page_content}"
+                        for index, d in enumerate(documents)
+                    ),
+                }
+            )
+        except OutputParserException:
+            score = None
+        logger.debug("------batch grade: %s", score)
+
+        relevant_indexes = self.parse_batch_grade(score, len(documents))
+        if relevant_indexes is None:
+            logger.warning(
+                "Malformed batch grade, grading the documents one by one"
+            )
+            return await self.grade_documents_concurrently(question, documents)
+
+        filtered_docs = [
+            d for index, d in enumerate(documents) if index in relevant_indexes
+        ]
+        min_relevant = app_settings.document_grading_min_relevant
+        if min_relevant > 0:
+            filtered_docs = filtered_docs[:min_relevant]
+
+        return filtered_docs
+
     def has_relevant_documents(self, state):
         question = state["question"]
         documents = state["documents"]
@@ -209,7 +441,9 @@ class HybridRagGraph:
         logger.debug("---has no relevant documents")
         return "no"
 
-    def generate_rag_answer(self, state):
+    @track_node
+    @traced()
+    async def generate_rag_answer(self, state):
         question = state["question"]
         documents = state["documents"]
         relationships = state["relationships"]
@@ -222,7 +456,7 @@ class HybridRagGraph:
         logger.debug("---reformed_questions: %s", reformed_question)
 
         # RAG generation
-        generation = self.generate_rag_answer_chain().invoke(
+        generation = await self.generate_rag_answer_chain.ainvoke(
             {
                 "context": documents,
                 "question": reformed_question,
@@ -235,9 +469,12 @@ class HybridRagGraph:
             "question": question,
             "reformed_question": reformed_question,
             "generation": generation,
+            "generation_attempts": state["generation_attempts"] + 1,
         }
 
-    def generate_regular_answer(self, state):
+    @track_node
+    @traced()
+    async def generate_regular_answer(self, state):
         question = state["question"]
         reformed_question = state["reformed_question"]
         relationships = state["relationships"]
@@ -246,11 +483,11 @@ class HybridRagGraph:
         logger.debug("---relationships: %s", relationships)
         logger.debug("---question: %s", question)
         logger.debug("---reformed_question: %s", reformed_question)
-        logger.debug("---context: %s", self.memory.buffer)
-        generation = self.generate_regular_answer_chain().invoke(
+        logger.debug("---context: %s", state["summary"])
+        generation = await self.generate_regular_answer_chain.ainvoke(
             {
-                "summary": self.memory.buffer,
-                "history": self.message_history.messages[-10:],
+                "summary": state["summary"],
+                "history": state["chat_history"],
                 "question": question,
             }
         )
@@ -261,7 +498,57 @@ class HybridRagGraph:
             "relationships": relationships,
         }
 
-    def check_answer(self, state):
+    @track_node
+    @traced()
+    async def verify_answer(self, state):
+        if self.verification_mode == VerificationMode.combined:
+            return await self.verify_answer_combined(state)
+
+        return await self.verify_answer_separately(state)
+
+    async def verify_answer_combined(self, state):
+        question = state["question"]
+        documents = state["documents"]
+        generation = state["generation"]
+
+        logger.debug("Check generated answer (combined): %s", question)
+        logger.debug("---generated answer: %s", generation)
+        try:
+            score = await self.answer_verifier_chain.ainvoke(
+                {
+                    "documents": documents,
+                    "relationships": state["relationships"],
+                    "generation": generation,
+                    "question": question,
+                }
+            )
+        except OutputParserException:
+            score = None
+        logger.debug("---------verification score: %s", score)
+
+        if not (
+            isinstance(score, dict) and {"grounded", "useful"} <= score.keys()
+        ):
+            logger.warning(
+                "Malformed answer verification, verifying the answer in two "
+                "steps"
+            )
+            return await self.verify_answer_separately(state)
+
+        if str(score["grounded"]).lower().strip() != "yes":
+            logger.debug(
+                "---------grade: generation is not grounded in documents"
+            )
+            return {"verdict": "not supported"}
+
+        if str(score["useful"]).lower().strip() == "yes":
+            logger.debug("---------grade: generation addresses question")
+            return {"verdict": "useful"}
+
+        logger.debug("---------grade: generation does not address question")
+        return {"verdict": "not useful"}
+
+    async def verify_answer_separately(self, state):
         question = state["question"]
         reformed_question = state["reformed_question"]
         documents = state["documents"]
@@ -273,12 +560,12 @@ class HybridRagGraph:
         logger.debug("---generated answer: %s", generation)
         logger.debug("------Check hallucination for answer")
         logger.debug("---------Provided document: %s", documents)
-        hallucination_score = self.hallucination_grader_chain().invoke(
+        hallucination_score = await self.hallucination_grader_chain.ainvoke(
             {
                 "documents": documents,
                 "relationships": relationships,
                 "generation": generation,
-                "chat_history": self.memory.buffer,
+                "chat_history": state["summary"],
             }
         )
         logger.debug("---------hallucination score: %s", hallucination_score)
@@ -288,39 +575,87 @@ class HybridRagGraph:
             logger.debug("---------grade: generation is grounded in documents")
             # Check question-answering
             logger.debug("------Check question-answering")
-            answer_score = self.answer_grader_chain().invoke(
+            answer_score = await self.answer_grader_chain.ainvoke(
                 {"question": question, "generation": generation}
             )
             logger.debug("---------question-answering score: %s", answer_score)
             if answer_score.get("score").lower().strip() == "yes":
                 logger.debug("---------grade: generation addresses question")
-                return "useful"
+                return {"verdict": "useful"}
             else:
-                logger.debug("---------grade: generation does not address question")
-                return "not useful"
+                logger.debug(
+                    "---------grade: generation does not address question"
+                )
+                return {"verdict": "not useful"}
         else:
             logger.debug(
                 "---------grade: generation is not grounded in documents, switching to regular answer"
             )
-            return "not supported"
+            return {"verdict": "not supported"}
+
+    def route_verdict(self, state):
+        verdict = state["verdict"]
+        if (
+            verdict == "not supported"
+            and state["generation_attempts"]
+            > app_settings.max_generation_retries
+        ):
+            logger.debug(
+                "---retry budget exhausted, switching to regular answer"
+            )
+            return "not useful"
+
+        return verdict
+
+    @property
+    def caches_answers(self) -> bool:
+        # only verified answers are cached
+        return (
+            self.answer_cache is not None
+            and self.verification_mode != VerificationMode.skip
+        )
 
     def build_graph_workflow(self):
         workflow = StateGraph(GraphState)
 
         # Define the nodes
         workflow.add_node("reform_question", self.reform_question)
-        workflow.add_node("retrieve_graph_documents", self.retrieve_graph_documents)
-        workflow.add_node("retrieve_tenant_documents", self.retrieve_tenant_documents)
+        workflow.add_node(
+            "retrieve_graph_documents", self.retrieve_graph_documents
+        )
+        workflow.add_node(
+            "retrieve_tenant_documents", self.retrieve_tenant_documents
+        )
         workflow.add_node("grade_documents", self.grade_documents)
         workflow.add_node("generate_rag_answer", self.generate_rag_answer)
-        workflow.add_node("generate_regular_answer", self.generate_regular_answer)
+        workflow.add_node(
+            "generate_regular_answer", self.generate_regular_answer
+        )
+        if self.verification_mode != VerificationMode.skip:
+            workflow.add_node("verify_answer", self.verify_answer)
+        if self.answer_cache is not None:
+            workflow.add_node("lookup_answer_cache", self.lookup_answer_cache)
+        if self.caches_answers:
+            workflow.add_node("cache_answer", self.cache_answer)
 
         # Define the edges
         workflow.set_entry_point("reform_question")
-        workflow.add_edge("reform_question", "retrieve_graph_documents")
-        workflow.add_edge("retrieve_graph_documents", "retrieve_tenant_documents")
-        # workflow.add_edge("reform_question", "retrieve_tenant_documents")
-        workflow.add_edge("retrieve_tenant_documents", "grade_documents")
+        # both retrievals are independent: fan out after reform_question (or
+        # after a cache miss) and join before grading
+        if self.answer_cache is not None:
+            workflow.add_edge("reform_question", "lookup_answer_cache")
+            workflow.add_conditional_edges(
+                "lookup_answer_cache",
+                self.route_cached_answer,
+                [END, "retrieve_graph_documents", "retrieve_tenant_documents"],
+            )
+        else:
+            workflow.add_edge("reform_question", "retrieve_graph_documents")
+            workflow.add_edge("reform_question", "retrieve_tenant_documents")
+        workflow.add_edge(
+            ["retrieve_graph_documents", "retrieve_tenant_documents"],
+            "grade_documents",
+        )
         workflow.add_conditional_edges(
             "grade_documents",
             self.has_relevant_documents,
@@ -329,23 +664,132 @@ class HybridRagGraph:
                 "no": "generate_regular_answer",
             },
         )
-        workflow.add_conditional_edges(
-            "generate_rag_answer",
-            self.check_answer,
-            {
-                "not supported": "generate_rag_answer",
-                "useful": END,
-                "not useful": "generate_regular_answer",
-            },
-        )
+        if self.verification_mode == VerificationMode.skip:
+            workflow.add_edge("generate_rag_answer", END)
+        else:
+            workflow.add_edge("generate_rag_answer", "verify_answer")
+            workflow.add_conditional_edges(
+                "verify_answer",
+                self.route_verdict,
+                {
+                    "not supported": "generate_rag_answer",
+                    "useful": "cache_answer" if self.caches_answers else END,
+                    "not useful": "generate_regular_answer",
+                },
+            )
+        if self.caches_answers:
+            workflow.add_edge("cache_answer", END)
         workflow.add_edge("generate_regular_answer", END)
         return workflow.compile()
 
-    def generate_response(self, message):
-        inputs = {"question": message}
-        response = self.graph.invoke(inputs)
+    @traced()
+    async def load_memory(
+        self, chat_history: list = None, old_summary: str = None
+    ):
+        # load old history
+        message_history = ChatMessageHistory()
+        for history in chat_history or []:
+            if history["role"] == "ai":
+                message_history.add_ai_message(history["content"])
+            else:
+                message_history.add_user_message(history["content"])
+
+        memory = ConversationSummaryMemory(
+            llm=self.llm,
+            chat_memory=message_history,
+            buffer=old_summary or "",
+            memory_key="chat_history",
+        )
+        if not old_summary:  # init memory buffer if needed
+            messages = message_history.messages
+            for i in range(0, len(messages), 2):
+                memory.buffer = await memory.apredict_new_summary(
+                    messages[i : i + 2], memory.buffer
+                )
+
+        return memory
+
+    @traced()
+    async def save_memory(self, memory, message: str, generation: str):
+        memory.chat_memory.add_user_message(message)
+        memory.chat_memory.add_ai_message(generation)
+        memory.buffer = await memory.apredict_new_summary(
+            memory.chat_memory.messages[-2:], memory.buffer
+        )
+        logger.debug("New memory: %s", memory.buffer)
+
+    def build_inputs(self, message: str, memory: ConversationSummaryMemory):
+        return {
+            "question": message,
+            "chat_history": memory.chat_memory.messages[
+                -self.HISTORY_WINDOW :
+            ],
+            "summary": memory.buffer,
+            "generation_attempts": 0,
+        }
 
-        self.memory.save_context({"human": message}, {"ai": response["generation"]})
-        logger.debug("New memory: %s", self.memory.buffer)
+    @traced()
+    async def generate_response(
+        self,
+        message: str,
+        chat_history: list = None,
+        old_summary: str = None,
+    ):
+        """
+        Generate the answer of a message, returns the answer and the new
+        summary of the conversation.
+        """
+        memory = await self.load_memory(chat_history, old_summary)
 
-        return response["generation"]
+        response = await self.graph.ainvoke(self.build_inputs(message, memory))
+
+        await self.save_memory(memory, message, response["generation"])
+
+        return response["generation"], memory.buffer
+
+    async def stream_response(
+        self, message: str, memory: ConversationSummaryMemory
+    ):
+        """
+        Run the graph and yield its progress as events:
+
+        - stage: a new stage (retrieving, grading, generating, ...) started
+        - token: a token of the answer being generated
+        - reset: the answer streamed so far was rejected and is generated again
+        - message: the final, verified answer
+
+        The memory is not updated, call save_memory once the answer
+        is delivered.
+        """
+        stage = None
+        has_streamed_tokens = False
+        async for event in self.graph.astream_events(
+            self.build_inputs(message, memory), version="v2"
+        ):
+            kind = event["event"]
+            if kind == "on_chain_start" and event["name"] in self.NODE_STAGES:
+                if (
+                    event["name"].startswith("generate_")
+                    and has_streamed_tokens
+                ):
+                    has_streamed_tokens = False
+                    yield {"event": "reset", "data": {}}
+
+                new_stage = self.NODE_STAGES[event["name"]]
+                if new_stage != stage:
+                    stage = new_stage
+                    yield {"event": "stage", "data": {"stage": stage}}
+
+            elif (
+                kind == "on_chat_model_stream"
+                and self.ANSWER_TAG in event["tags"]
+            ):
+                token = event["data"]["chunk"].content
+                if token:
+                    has_streamed_tokens = True
+                    yield {"event": "token", "data": {"token": token}}
+
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                # end of the graph itself
+                generation = event["data"]["output"]["generation"]
+                yield {"event": "message", "data": {"message": generation}}
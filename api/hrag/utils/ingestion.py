@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, NamedTuple
+
+from settings import app_settings
+
+logger = logging.getLogger("gunicorn.error")
+logger.setLevel(app_settings.log_level.upper())
+
+
+class IngestionItem(NamedTuple):
+    job_id: uuid.UUID
+    tenant: str
+    provider_endpoint: str
+
+
+class IngestionQueue:
+    """
+    In-process queue of document jobs. Jobs are processed by at most
+    `ingestion_workers` tasks at a time, with a separate limit per tenant and
+    per LLM provider endpoint so a single tenant (or model server) cannot take
+    the whole pool.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.handler = None
+        self.dispatcher = None
+        self.tasks = set()
+        self.workers = None
+        self.tenant_semaphores = None
+        self.endpoint_semaphores = None
+
+    async def start(self, handler: Callable[[uuid.UUID], Awaitable[None]]):
+        self.handler = handler
+        self.queue = asyncio.Queue()
+        self.workers = asyncio.Semaphore(app_settings.ingestion_workers)
+        self.tenant_semaphores = defaultdict(
+            lambda: asyncio.Semaphore(
+                app_settings.ingestion_tenant_concurrency
+            )
+        )
+        self.endpoint_semaphores = defaultdict(
+            lambda: asyncio.Semaphore(
+                app_settings.ingestion_endpoint_concurrency
+            )
+        )
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def stop(self):
+        if self.dispatcher is None:
+            return
+
+        self.dispatcher.cancel()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(
+            self.dispatcher, *self.tasks, return_exceptions=True
+        )
+        self.dispatcher = None
+
+    def enqueue(self, job_id: uuid.UUID, tenant: str, provider_endpoint: str):
+        logger.debug("Queueing document job %s of %s", job_id, tenant)
+        self.queue.put_nowait(
+            IngestionItem(job_id, tenant, provider_endpoint or "")
+        )
+
+    async def dispatch(self):
+        while True:
+            item = await self.queue.get()
+            task = asyncio.create_task(self.process(item))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def process(self, item: IngestionItem):
+        # wait for the tenant and endpoint slots before taking a worker slot,
+        # so waiting jobs do not hold workers other tenants could use
+        async with self.tenant_semaphores[item.tenant]:
+            async with self.endpoint_semaphores[item.provider_endpoint]:
+                async with self.workers:
+                    try:
+                        await self.handler(item.job_id)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        logger.exception(
+                            "Document job %s crashed", item.job_id
+                        )
+                    finally:
+                        self.queue.task_done()
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,399 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+    LLMResult,
+)
+
+from .cache import ProcessCache
+from .enums import CassetteMode
+from .exceptions import HybridRagException
+from .metrics import get_token_usage
+
+log = logging.getLogger("gunicorn.error")
+
+# path -> LLMCassette
+cassettes = ProcessCache("llm_cassettes")
+
+# replayed answers are streamed word by word
+STREAM_CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+class CassetteMissError(HybridRagException):
+    pass
+
+
+def hash_request(*parts) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(
+        np.asarray(vector, dtype=np.float32).tobytes()
+    ).decode()
+
+
+def decode_vector(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+
+class LLMCassette:
+    """
+    LLM responses recorded to a JSON lines file, one response per line keyed by
+    the hash of its request, embeddings stored as base64 float32. The responses
+    recorded by this process are visible right away, the ones of other
+    processes only after a restart, so record with a single worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        # a request recorded again replaces the
+                        # previous response
+                        self.records[record["key"]] = record
+        log.info("Loaded %d LLM responses from %s", len(self.records), path)
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.records.get(key)
+
+    def put(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+            self.records[record["key"]] = record
+
+    def __len__(self):
+        return len(self.records)
+
+
+def get_llm_cassette(path: str) -> LLMCassette:
+    return cassettes.get_or_create(path, lambda: LLMCassette(path))
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model answering with the responses recorded in a cassette, after
+    waiting their recorded latency (times latency_scale). Requests missing from
+    the cassette are sent to the upstream model and recorded, unless the mode
+    is replay.
+    """
+
+    cassette: LLMCassette
+    kind: str
+    model: str
+    mode: CassetteMode = CassetteMode.replay
+    upstream: Optional[BaseChatModel] = None
+    latency_scale: float = 1.0
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def request_key(self, messages, stop: Optional[List[str]]) -> str:
+        return hash_request(
+            self.kind,
+            self.model,
+            [[message.type, message.content] for message in messages],
+            stop,
+        )
+
+    def lookup(self, key: str) -> Optional[dict]:
+        record = (
+            None
+            if self.mode == CassetteMode.record
+            else self.cassette.get(key)
+        )
+        if record is None and self.mode == CassetteMode.replay:
+            raise CassetteMissError(
+                f"No recorded {self.kind} response of {self.model} "
+                f"for request {key}"
+            )
+        return record
+
+    def record(self, key: str, result: ChatResult, latency: float):
+        prompt_tokens, completion_tokens = get_token_usage(
+            LLMResult(
+                generations=[result.generations], llm_output=result.llm_output
+            )
+        )
+        self.cassette.put(
+            {
+                "key": key,
+                "kind": self.kind,
+                "model": self.model,
+                "content": result.generations[0].message.content,
+                "usage": [prompt_tokens, completion_tokens],
+                "latency": round(latency, 4),
+            }
+        )
+
+    @staticmethod
+    def usage_metadata(record: dict) -> Dict[str, int]:
+        prompt_tokens, completion_tokens = record["usage"]
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def replay(self, record: dict) -> Tuple[float, ChatResult]:
+        message = AIMessage(
+            content=record["content"],
+            usage_metadata=self.usage_metadata(record),
+        )
+        return record["latency"] * self.latency_scale, ChatResult(
+            generations=[ChatGeneration(message=message)]
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self.request_key(messages, stop)
+        record = self.lookup(key)
+        if record is None:
+            started_at = time.perf_counter()
+            result = self.upstream._generate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            self.record(key, result, time.perf_counter() - started_at)
+            return result
+
+        delay, result = self.replay(record)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ):
+        key = self.request_key(messages, stop)
+        record = self.lookup(key)
+        if record is None:
+            started_at = time.perf_counter()
+            result = await self.upstream._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            await asyncio.to_thread(
+                self.record, key, result, time.perf_counter() - started_at
+            )
+            return result
+
+        delay, result = self.replay(record)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self.request_key(messages, stop)
+        record = self.lookup(key)
+        if record is None:
+            # recorded from a complete response, sent back as a single chunk
+            result = await self._agenerate(messages, stop=stop, **kwargs)
+            message = result.generations[0].message
+            chunk = ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=message.content,
+                    usage_metadata=message.usage_metadata,
+                )
+            )
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(
+                    message.content, chunk=chunk
+                )
+            yield chunk
+            return
+
+        # the recorded latency is spread over the words of the answer
+        parts = STREAM_CHUNK_PATTERN.findall(record["content"]) or [""]
+        delay = record["latency"] * self.latency_scale / len(parts)
+        for i, part in enumerate(parts):
+            if delay:
+                await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=part,
+                    # reported once, on the last chunk
+                    usage_metadata=(
+                        self.usage_metadata(record)
+                        if i == len(parts) - 1
+                        else None
+                    ),
+                )
+            )
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(part, chunk=chunk)
+            yield chunk
+
+
+class CassetteEmbeddings(Embeddings):
+    """
+    Embeddings replayed from a cassette, text by text, the recorded latency of
+    a batch is split between its texts.
+    """
+
+    def __init__(
+        self,
+        cassette: LLMCassette,
+        model: str,
+        mode: CassetteMode = CassetteMode.replay,
+        upstream: Optional[Embeddings] = None,
+        latency_scale: float = 1.0,
+    ):
+        self.cassette = cassette
+        self.model = model
+        self.mode = mode
+        self.upstream = upstream
+        self.latency_scale = latency_scale
+
+    def lookup(self, kind: str, texts: List[str]):
+        """
+        Returns the replayed embeddings by position, the positions (with their
+        keys) still to be embedded and the latency of the replayed ones.
+        """
+        found: Dict[int, List[float]] = {}
+        missing: Dict[int, str] = {}
+        latency = 0.0
+        for i, text in enumerate(texts):
+            key = hash_request(kind, self.model, text)
+            record = (
+                None
+                if self.mode == CassetteMode.record
+                else self.cassette.get(key)
+            )
+            if record is not None:
+                found[i] = decode_vector(record["embedding"])
+                latency += record["latency"]
+            elif self.mode == CassetteMode.replay:
+                raise CassetteMissError(
+                    f"No recorded {kind} embedding of {self.model} "
+                    f"for request {key}"
+                )
+            else:
+                missing[i] = key
+
+        return found, missing, latency * self.latency_scale
+
+    def record(
+        self,
+        kind: str,
+        missing: Dict[int, str],
+        embeddings: List[List[float]],
+        latency: float,
+    ) -> Dict[int, List[float]]:
+        for key, embedding in zip(missing.values(), embeddings):
+            self.cassette.put(
+                {
+                    "key": key,
+                    "kind": kind,
+                    "model": self.model,
+                    "embedding": encode_vector(embedding),
+                    "latency": round(latency / len(missing), 4),
+                }
+            )
+        return dict(zip(missing, embeddings))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing, delay = self.lookup("document", texts)
+        if missing:
+            started_at = time.perf_counter()
+            embeddings = self.upstream.embed_documents(
+                [texts[i] for i in missing]
+            )
+            found.update(
+                self.record(
+                    "document",
+                    missing,
+                    embeddings,
+                    time.perf_counter() - started_at,
+                )
+            )
+
+        if delay:
+            time.sleep(delay)
+        return [found[i] for i in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        found, missing, delay = self.lookup("query", [text])
+        if missing:
+            started_at = time.perf_counter()
+            embedding = self.upstream.embed_query(text)
+            found.update(
+                self.record(
+                    "query",
+                    missing,
+                    [embedding],
+                    time.perf_counter() - started_at,
+                )
+            )
+
+        if delay:
+            time.sleep(delay)
+        return found[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing, delay = self.lookup("document", texts)
+        if missing:
+            started_at = time.perf_counter()
+            embeddings = await self.upstream.aembed_documents(
+                [texts[i] for i in missing]
+            )
+            found.update(
+                await asyncio.to_thread(
+                    self.record,
+                    "document",
+                    missing,
+                    embeddings,
+                    time.perf_counter() - started_at,
+                )
+            )
+
+        if delay:
+            await asyncio.sleep(delay)
+        return [found[i] for i in range(len(texts))]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        found, missing, delay = self.lookup("query", [text])
+        if missing:
+            started_at = time.perf_counter()
+            embedding = await self.upstream.aembed_query(text)
+            found.update(
+                await asyncio.to_thread(
+                    self.record,
+                    "query",
+                    missing,
+                    [embedding],
+                    time.perf_counter() - started_at,
+                )
+            )
+
+        if delay:
+            await asyncio.sleep(delay)
+        return found[0]
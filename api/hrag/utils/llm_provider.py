@@ -4,16 +4,35 @@ from langchain_community.chat_models import ChatOllama
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_openai.embeddings import OpenAIEmbeddings
-
-from .enums import LanguageModelProvider
+from settings import app_settings
+
+from .cache import ProcessCache, hash_secret
+from .embedding_cache import CachedEmbeddings
+from .enums import CassetteMode, LanguageModelProvider
+from .exceptions import HybridRagException
+from .llm_cassette import (
+    CassetteChatModel,
+    CassetteEmbeddings,
+    get_llm_cassette,
+)
+from .metrics import LLMMetricsHandler
+from .tracing import LLMTracingHandler
 
 log = logging.getLogger("gunicorn.error")
 
+# LLM clients are shared by every tenant using the same provider settings, so
+# the underlying HTTP clients (and their keep-alive connections) are reused
+# across requests
+llm_clients = ProcessCache("llm_clients")
+
+LLM_CLIENT_KINDS = ("chat", "json_chat", "embedding")
+
 
 def get_llm_provider_enum(provider_name: str):
     provider_map = {
         "ollama": LanguageModelProvider.ollama,
         "open_ai": LanguageModelProvider.open_ai,
+        "cassette": LanguageModelProvider.cassette,
     }
 
     return provider_map.get(
@@ -22,32 +41,95 @@ def get_llm_provider_enum(provider_name: str):
     )
 
 
+def get_llm_client_key(tenant, kind: str) -> tuple:
+    """
+    Key of an LLM client: (kind, provider, endpoint, model, api key hash)
+    """
+    model = tenant.embedding_model if kind == "embedding" else tenant.llm_model
+
+    return (
+        kind,
+        tenant.provider,
+        tenant.provider_endpoint,
+        model,
+        hash_secret(tenant.provider_api_key),
+    )
+
+
+def get_llm_factories(provider: LanguageModelProvider):
+    if provider == LanguageModelProvider.open_ai:
+        return __open_ai_llm_factories()
+    if provider == LanguageModelProvider.cassette:
+        return __cassette_llm_factories()
+    return __ollama_llm_factories()
+
+
 def get_necessary_llms(tenant):
-    if tenant.provider == LanguageModelProvider.open_ai:
-        return __open_ai_llms(tenant)
+    factories = get_llm_factories(tenant.provider)
 
-    return __ollama_llms(tenant)
+    if app_settings.enable_embedding_cache:
+        embedding_factory = factories["embedding"]
+        factories["embedding"] = lambda tenant: CachedEmbeddings(
+            embedding_factory(tenant),
+            model=f"{tenant.provider.value}/{tenant.embedding_model}",
+        )
 
+    return {
+        kind: llm_clients.get_or_create(
+            get_llm_client_key(tenant, kind),
+            lambda factory=factories[kind]: factory(tenant),
+        )
+        for kind in LLM_CLIENT_KINDS
+    }
 
-def __open_ai_llms(tenant):
-    log.debug("Loading OpenAI provider")
 
-    chat_llm = ChatOpenAI(
-        model_name=tenant.llm_model,
-        temperature=0,
-        openai_api_key=tenant.provider_api_key,
-    )
-    json_chat_llm = ChatOpenAI(
-        model_name=tenant.llm_model,
-        temperature=0,
-        openai_api_key=tenant.provider_api_key,
-        format="json",
-    )
-    embedding_llm = OpenAIEmbeddings(
-        model=tenant.embedding_model,
-        openai_api_key=tenant.provider_api_key,
+def with_llm_callbacks(llm, tenant, chain: str):
+    """
+    The client recording the metrics and spans of its calls for the chain. It
+    must be a step of the chain: inside a sequence the handlers are added to
+    the callbacks of the run, bound to the whole chain they would replace the
+    callbacks inherited from the caller (the streaming handler of
+    astream_events among them).
+    """
+    labels = (tenant.tenant, tenant.llm_model, chain)
+    return llm.with_config(
+        callbacks=[LLMMetricsHandler(*labels), LLMTracingHandler(*labels)]
     )
 
+
+def invalidate_llms(tenant):
+    """
+    Drop the cached clients built from the current provider settings of
+    the tenant.
+    """
+    keys = {get_llm_client_key(tenant, kind) for kind in LLM_CLIENT_KINDS}
+    llm_clients.invalidate(lambda key: key in keys)
+
+
+def __open_ai_llm_factories():
+    log.debug("Loading OpenAI provider")
+
+    def chat_llm(tenant):
+        return ChatOpenAI(
+            model_name=tenant.llm_model,
+            temperature=0,
+            openai_api_key=tenant.provider_api_key,
+        )
+
+    def json_chat_llm(tenant):
+        return ChatOpenAI(
+            model_name=tenant.llm_model,
+            temperature=0,
+            openai_api_key=tenant.provider_api_key,
+            format="json",
+        )
+
+    def embedding_llm(tenant):
+        return OpenAIEmbeddings(
+            model=tenant.embedding_model,
+            openai_api_key=tenant.provider_api_key,
+        )
+
     return {
         "chat": chat_llm,
         "json_chat": json_chat_llm,
@@ -55,25 +137,77 @@ def __open_ai_llms(tenant):
     }
 
 
-def __ollama_llms(tenant):
+def __ollama_llm_factories():
     log.debug("Loading Ollama provider")
 
-    chat_llm = ChatOllama(
-        model=tenant.llm_model,
-        temperature=0,
-        base_url=tenant.provider_endpoint,
-    )
-    json_chat_llm = ChatOllama(
-        model=tenant.llm_model,
-        temperature=0,
-        base_url=tenant.provider_endpoint,
-        format="json",
+    def chat_llm(tenant):
+        return ChatOllama(
+            model=tenant.llm_model,
+            temperature=0,
+            base_url=tenant.provider_endpoint,
+        )
+
+    def json_chat_llm(tenant):
+        return ChatOllama(
+            model=tenant.llm_model,
+            temperature=0,
+            base_url=tenant.provider_endpoint,
+            format="json",
+        )
+
+    def embedding_llm(tenant):
+        return OllamaEmbeddings(
+            model=tenant.embedding_model,
+            base_url=tenant.provider_endpoint,
+        )
+
+    return {
+        "chat": chat_llm,
+        "json_chat": json_chat_llm,
+        "embedding": embedding_llm,
+    }
+
+
+def __cassette_llm_factories():
+    log.debug("Loading cassette provider")
+
+    mode = CassetteMode(app_settings.llm_cassette_mode)
+    upstream_provider = get_llm_provider_enum(
+        app_settings.llm_cassette_upstream
     )
-    embedding_llm = OllamaEmbeddings(
-        model=tenant.embedding_model,
-        base_url=tenant.provider_endpoint,
+    if upstream_provider == LanguageModelProvider.cassette:
+        raise HybridRagException(
+            "The cassette provider cannot record from itself"
+        )
+    # the upstream clients are only needed to record
+    upstream = (
+        get_llm_factories(upstream_provider)
+        if mode != CassetteMode.replay
+        else None
     )
 
+    def chat_llm(tenant, kind="chat"):
+        return CassetteChatModel(
+            cassette=get_llm_cassette(app_settings.llm_cassette_path),
+            kind=kind,
+            model=tenant.llm_model,
+            mode=mode,
+            upstream=upstream[kind](tenant) if upstream else None,
+            latency_scale=app_settings.llm_cassette_latency_scale,
+        )
+
+    def json_chat_llm(tenant):
+        return chat_llm(tenant, kind="json_chat")
+
+    def embedding_llm(tenant):
+        return CassetteEmbeddings(
+            cassette=get_llm_cassette(app_settings.llm_cassette_path),
+            model=tenant.embedding_model,
+            mode=mode,
+            upstream=upstream["embedding"](tenant) if upstream else None,
+            latency_scale=app_settings.llm_cassette_latency_scale,
+        )
+
     return {
         "chat": chat_llm,
         "json_chat": json_chat_llm,
@@ -0,0 +1,179 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+INGESTION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+DOCUMENT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+graph_node_duration = Histogram(
+    "hrag_graph_node_duration_seconds",
+    "Time spent in a node of the RAG graph",
+    ["tenant", "model", "node"],
+    buckets=LATENCY_BUCKETS,
+)
+llm_call_duration = Histogram(
+    "hrag_llm_call_duration_seconds",
+    "Time spent in a single LLM call",
+    ["tenant", "model", "chain"],
+    buckets=LATENCY_BUCKETS,
+)
+llm_calls = Counter(
+    "hrag_llm_calls_total",
+    "LLM calls, by outcome (success or error)",
+    ["tenant", "model", "chain", "outcome"],
+)
+llm_tokens = Counter(
+    "hrag_llm_tokens_total",
+    "Tokens sent to (prompt) and generated by (completion) the LLM",
+    ["tenant", "model", "chain", "kind"],
+)
+graph_documents = Histogram(
+    "hrag_graph_documents",
+    "Documents per question, as retrieved and as kept after grading",
+    ["tenant", "stage"],
+    buckets=DOCUMENT_BUCKETS,
+)
+ingestion_stage_duration = Histogram(
+    "hrag_ingestion_stage_duration_seconds",
+    "Time spent in a stage of the document ingestion",
+    ["tenant", "stage"],
+    buckets=INGESTION_BUCKETS,
+)
+ingestion_jobs = Counter(
+    "hrag_ingestion_jobs_total",
+    "Processed document jobs, by outcome (completed or failed)",
+    ["tenant", "outcome"],
+)
+
+
+def track_node(func):
+    """
+    Record the latency of a node (async method) of the RAG graph, labelled by
+    the tenant and model of the graph.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(self, state):
+        start = time.perf_counter()
+        try:
+            return await func(self, state)
+        finally:
+            graph_node_duration.labels(
+                self.tenant.tenant, self.tenant.llm_model, func.__name__
+            ).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+@contextmanager
+def track_ingestion_stage(tenant: str, stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ingestion_stage_duration.labels(tenant, stage).observe(
+            time.perf_counter() - start
+        )
+
+
+def get_token_usage(response: LLMResult):
+    """
+    Returns the (prompt, completion) token counts of an LLM response, whichever
+    way the provider reports them.
+    """
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            info = generation.generation_info or {}
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+            elif "eval_count" in info:
+                # ollama
+                prompt_tokens += info.get("prompt_eval_count") or 0
+                completion_tokens += info.get("eval_count") or 0
+
+    if not prompt_tokens and not completion_tokens:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+
+    return prompt_tokens, completion_tokens
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Count the calls and tokens of the LLM runs of a chain and time them.
+    """
+
+    # only bookkeeping, no need to go through the executor of the
+    # async callbacks
+    run_inline = True
+
+    def __init__(self, tenant: str, model: str, chain: str):
+        self.labels = (tenant, model, chain)
+        self.started_at: Dict[UUID, float] = {}
+
+    def on_llm_start(
+        self, serialized, prompts, *, run_id: UUID, **kwargs: Any
+    ):
+        self.started_at[run_id] = time.perf_counter()
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, **kwargs
+    ):
+        self.started_at[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        self.observe(run_id, "success")
+        prompt_tokens, completion_tokens = get_token_usage(response)
+        if prompt_tokens:
+            llm_tokens.labels(*self.labels, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            llm_tokens.labels(*self.labels, "completion").inc(
+                completion_tokens
+            )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ):
+        self.observe(run_id, "error")
+
+    def observe(self, run_id: UUID, outcome: str):
+        llm_calls.labels(*self.labels, outcome).inc()
+        started_at: Optional[float] = self.started_at.pop(run_id, None)
+        if started_at is not None:
+            llm_call_duration.labels(*self.labels).observe(
+                time.perf_counter() - started_at
+            )
+
+
+def generate_metrics():
+    """
+    Returns the metrics in the Prometheus text format and its content type.
+    With several worker processes PROMETHEUS_MULTIPROC_DIR must be set so the
+    metrics of all of them are collected.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -198,6 +198,61 @@ class HybridRagPrompt:
         ),
     }
 
+    RETRIEVER_BATCH_GRADER = {
+        LLMFamily.llama: PromptTemplate(
+            template=dedent(
+                """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+                You are a grader assessing relevance of retrieved documents to
+                a user question. If a document contains keywords related to the
+                user question, grade it as relevant. It does not need to be a
+                stringent test. The goal is to filter out erroneous retrievals.
+
+                Here are the retrieved documents, each one starts with its
+                number in square brackets:
+                \n------- BEGIN DOCUMENTS -------\n
+                {documents}
+                \n------- END DOCUMENTS -------\n
+
+                Provide the numbers of the relevant documents as a JSON with a
+                single key 'relevant' holding a list of integers, use an empty
+                list if none of them is relevant. No preamble or explanation.
+
+                FOCUS ON ANSWERING THE QUESTION, DO NOT INCLUDE EXTRA PREAMBLE
+                <|eot_id|><|start_header_id|>user<|end_header_id|>
+                {question}
+                <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+            ),
+            input_variables=["documents", "question"],
+        ),
+        LLMFamily.other: PromptTemplate(
+            template=dedent(
+                """You are a grader assessing relevance of retrieved documents
+                to a user question. If a document contains keywords related to
+                the user question, grade it as relevant. It does not need to be
+                a stringent test. The goal is to filter out erroneous
+                retrievals.
+
+                Here are the retrieved documents, each one starts with its
+                number in square brackets:
+                \n------- BEGIN DOCUMENTS -------\n
+                {documents}
+                \n------- END DOCUMENTS -------\n
+
+                Provide the numbers of the relevant documents as a JSON with a
+                single key 'relevant' holding a list of integers, use an empty
+                list if none of them is relevant. No preamble or explanation.
+
+                FOCUS ON ANSWERING THE QUESTION, DO NOT INCLUDE EXTRA PREAMBLE
+
+                Question:
+                {question}
+
+                Answer:"""
+            ),
+            input_variables=["documents", "question"],
+        ),
+    }
+
     GENERATE_RAG_ANSWER = {
         LLMFamily.llama: PromptTemplate(
             template=dedent(
@@ -414,6 +469,93 @@ class HybridRagPrompt:
         ),
     }
 
+    ANSWER_VERIFIER = {
+        LLMFamily.llama: PromptTemplate(
+            template=dedent(
+                """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+                You are a grader assessing whether an input is grounded in /
+                supported by the given context and relationships between
+                related entities, and whether it is useful to resolve a
+                question.
+                <|eot_id|><|start_header_id|>user<|end_header_id|>
+                Here is the input:
+                \n------- BEGIN INPUT -------\n
+                {generation}
+                \n------- END INPUT -------\n
+
+                Here are the given context:
+                \n------- BEGIN CONTEXT -------\n
+                {documents}
+
+                {relationships}
+                \n------- END CONTEXT -------\n
+
+                Here is the question:
+                \n ------- BEGIN QUESTION ------- \n
+                {question}
+                \n ------- END QUESTION ------- \n
+
+                Give two binary scores 'yes' or 'no': 'grounded' to indicate
+                whether the input is grounded in / supported by the context,
+                and 'useful' to indicate whether the input is useful to resolve
+                the given question. Provide the binary scores as a JSON with
+                the two keys 'grounded' and 'useful' and no preamble or
+                explanation.
+
+                FOCUS ON ANSWERING THE QUESTION, DO NOT INCLUDE EXTRA PREAMBLE
+                <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+            ),
+            input_variables=[
+                "generation",
+                "documents",
+                "relationships",
+                "question",
+            ],
+        ),
+        LLMFamily.other: PromptTemplate(
+            template=dedent(
+                """You are a grader assessing whether an input is grounded in /
+                supported by the given context and relationships between
+                related entities, and whether it is useful to resolve a
+                question.
+
+                Here is the input:
+                \n------- BEGIN INPUT -------\n
+                {generation}
+                \n------- END INPUT -------\n
+
+                Here are the given context:
+                \n------- BEGIN CONTEXT -------\n
+                {documents}
+
+                {relationships}
+                \n------- END CONTEXT -------\n
+
+                Here is the question:
+                \n ------- BEGIN QUESTION ------- \n
+                {question}
+                \n ------- END QUESTION ------- \n
+
+                Give two binary scores 'yes' or 'no': 'grounded' to indicate
+                whether the input is grounded in / supported by the context,
+                and 'useful' to indicate whether the input is useful to resolve
+                the given question. Provide the binary scores as a JSON with
+                the two keys 'grounded' and 'useful' and no preamble or
+                explanation.
+
+                FOCUS ON ANSWERING THE QUESTION, DO NOT INCLUDE EXTRA PREAMBLE
+
+                Answer:"""
+            ),
+            input_variables=[
+                "generation",
+                "documents",
+                "relationships",
+                "question",
+            ],
+        ),
+    }
+
     EXTRACT_ENTITIES = {
         LLMFamily.llama: PromptTemplate(
             template=dedent(
@@ -466,10 +608,12 @@ class HybridRagPrompt:
         PromptType.REFORM_QUESTION: REFORM_QUESTION,
         PromptType.SUMMARY_CONVERSATION: SUMMARY_CONVERSATION,
         PromptType.RETRIEVER_GRADER: RETRIEVER_GRADER,
+        PromptType.RETRIEVER_BATCH_GRADER: RETRIEVER_BATCH_GRADER,
         PromptType.GENERATE_RAG_ANSWER: GENERATE_RAG_ANSWER,
         PromptType.GENERATE_REGULAR_ANSWER: GENERATE_REGULAR_ANSWER,
         PromptType.HALLUCINATION_GRADER: HALLUCINATION_GRADER,
         PromptType.ANSWER_GRADER: ANSWER_GRADER,
+        PromptType.ANSWER_VERIFIER: ANSWER_VERIFIER,
         PromptType.EXTRACT_ENTITIES: EXTRACT_ENTITIES,
     }
 
@@ -0,0 +1,370 @@
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from settings import app_settings
+
+from .metrics import get_token_usage
+
+logger = logging.getLogger("gunicorn.error")
+
+# set by setup_tracing, None while tracing is disabled so every helper below is
+# a no-op
+tracer = None
+
+TRACE_ID_HEADER = b"x-trace-id"
+# statements are attached to the database spans up to this size
+MAX_STATEMENT_LENGTH = 2048
+
+
+def setup_tracing(engine=None):
+    """
+    Export the spans of the app with the TRACING_EXPORTER (console, file or
+    otlp), sampling TRACING_SAMPLE_RATIO of the traces started here. Needs the
+    tracing extra (poetry install --extras tracing), tracing stays disabled
+    when it is not installed.
+    """
+    global tracer
+
+    if app_settings.tracing_exporter == "none" or tracer is not None:
+        return
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import (
+            ParentBased,
+            TraceIdRatioBased,
+        )
+    except ImportError:
+        logger.warning(
+            "opentelemetry-sdk is not installed (tracing extra), "
+            "tracing is disabled"
+        )
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create(
+            {"service.name": app_settings.tracing_service_name}
+        ),
+        # follow the sampling decision of the caller when there is one
+        sampler=ParentBased(
+            TraceIdRatioBased(app_settings.tracing_sample_ratio)
+        ),
+    )
+    provider.add_span_processor(BatchSpanProcessor(build_exporter()))
+    trace.set_tracer_provider(provider)
+    tracer = trace.get_tracer("hrag")
+
+    if engine is not None:
+        trace_engine(engine)
+
+    logger.info(
+        "Tracing enabled, exporting %s of the traces to %s",
+        app_settings.tracing_sample_ratio,
+        app_settings.tracing_exporter,
+    )
+
+
+def build_exporter():
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if app_settings.tracing_exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        # endpoint, headers, ... come from the standard
+        # OTEL_EXPORTER_OTLP_* variables
+        return OTLPSpanExporter()
+
+    if app_settings.tracing_exporter == "file":
+        return build_file_exporter(app_settings.tracing_file)
+
+    return ConsoleSpanExporter()
+
+
+def build_file_exporter(file_path: str):
+    """
+    Exporter writing one JSON span per line to a file.
+    """
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class FileSpanExporter(SpanExporter):
+        def __init__(self):
+            self._lock = threading.Lock()
+            self._file = open(file_path, "a", encoding="utf-8")
+
+        def export(self, spans):
+            with self._lock:
+                for span in spans:
+                    self._file.write(span.to_json(indent=None) + "\n")
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            with self._lock:
+                self._file.close()
+
+    return FileSpanExporter()
+
+
+def shutdown_tracing():
+    if tracer is None:
+        return
+
+    from opentelemetry import trace
+
+    trace.get_tracer_provider().shutdown()
+
+
+@contextmanager
+def start_span(name: str, attributes: Dict[str, Any] = None):
+    """
+    Start a child span of the current one, yields None when tracing
+    is disabled.
+    """
+    if tracer is None:
+        yield None
+        return
+
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+
+def traced(name: str = None):
+    """
+    Run the decorated coroutine function in its own span.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if tracer is None:
+                return await func(*args, **kwargs)
+
+            with tracer.start_as_current_span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_trace_id() -> str:
+    if tracer is None:
+        return ""
+
+    from opentelemetry import trace
+
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return ""
+
+    return format(span_context.trace_id, "032x")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the root span of every HTTP request
+    (continuing the trace of the caller, if any) and sending its trace id
+    back in the X-Trace-Id header. The span covers the whole response,
+    streamed ones included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or tracer is None:
+            return await self.app(scope, receive, send)
+
+        from opentelemetry import propagate, trace
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=trace.SpanKind.SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            },
+        ) as span:
+            trace_id = get_trace_id().encode("latin-1")
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute(
+                        "http.response.status_code", message["status"]
+                    )
+                    if trace_id:
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (TRACE_ID_HEADER, trace_id),
+                            ],
+                        }
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+            # the path is only known once the request has been routed
+            route = scope.get("route")
+            if route is not None:
+                path = f"{scope.get('root_path', '')}{route.path}"
+                span.update_name(f"{scope['method']} {path}")
+                span.set_attribute("http.route", path)
+
+
+def trace_engine(engine):
+    """
+    Open a span around every statement run by the engine.
+    """
+    from opentelemetry import trace
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, many
+    ):
+        if context is None:
+            return
+
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        context._hrag_span = tracer.start_span(
+            f"postgresql {operation}",
+            kind=trace.SpanKind.CLIENT,
+            attributes={
+                "db.system": "postgresql",
+                "db.operation": operation,
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            },
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, many
+    ):
+        span = getattr(context, "_hrag_span", None)
+        if span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rows", cursor.rowcount)
+            span.end()
+            context._hrag_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_hrag_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(trace.StatusCode.ERROR)
+            span.end()
+            context._hrag_span = None
+
+
+@contextmanager
+def neo4j_span(name: str, query: str = None, statements: int = None):
+    if tracer is None:
+        yield None
+        return
+
+    from opentelemetry import trace
+
+    attributes = {"db.system": "neo4j"}
+    if query is not None:
+        attributes["db.statement"] = query[:MAX_STATEMENT_LENGTH]
+    if statements is not None:
+        attributes["hrag.statements"] = statements
+    with tracer.start_as_current_span(
+        name, kind=trace.SpanKind.CLIENT, attributes=attributes
+    ) as span:
+        yield span
+
+
+class LLMTracingHandler(BaseCallbackHandler):
+    """
+    Open a span for every LLM run of a chain, with the size of its prompt and
+    the tokens it used.
+    """
+
+    # the span must be started in the context of the caller, not in an executor
+    run_inline = True
+
+    def __init__(self, tenant: str, model: str, chain: str):
+        self.attributes = {
+            "hrag.tenant": tenant,
+            "gen_ai.request.model": model,
+            "hrag.chain": chain,
+        }
+        self.spans: Dict[UUID, Any] = {}
+
+    def start(self, run_id: UUID, prompt_chars: int, prompts: int):
+        if tracer is None:
+            return
+
+        span = tracer.start_span(f"llm {self.attributes['hrag.chain']}")
+        if span.is_recording():
+            span.set_attributes(self.attributes)
+            span.set_attribute("hrag.prompt.chars", prompt_chars)
+            span.set_attribute("hrag.prompt.count", prompts)
+        self.spans[run_id] = span
+
+    def on_llm_start(
+        self, serialized, prompts, *, run_id: UUID, **kwargs: Any
+    ):
+        self.start(
+            run_id, sum(len(prompt) for prompt in prompts), len(prompts)
+        )
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, **kwargs
+    ):
+        self.start(
+            run_id,
+            sum(
+                len(message.content)
+                for batch in messages
+                for message in batch
+                if isinstance(message.content, str)
+            ),
+            len(messages),
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        span = self.spans.pop(run_id, None)
+        if span is None:
+            return
+
+        if span.is_recording():
+            prompt_tokens, completion_tokens = get_token_usage(response)
+            span.set_attribute("gen_ai.usage.input_tokens", prompt_tokens)
+            span.set_attribute("gen_ai.usage.output_tokens", completion_tokens)
+        span.end()
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ):
+        span = self.spans.pop(run_id, None)
+        if span is None:
+            return
+
+        from opentelemetry import trace
+
+        span.record_exception(error)
+        span.set_status(trace.StatusCode.ERROR)
+        span.end()
@@ -1,17 +1,66 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_pagination import add_pagination
 from fastapi_sqlalchemy import DBSessionMiddleware
 from fastapi_versioning import VersionedFastAPI
 from hrag.routers import conversations, documents, tenants
+from hrag.utils.database import engine
+from hrag.utils.document import (
+    enqueue_pending_document_jobs,
+    process_document_job,
+)
+from hrag.utils.embeddings.graph import (
+    bootstrap_graph_schema,
+    close_neo4j_graphs,
+)
+from hrag.utils.embeddings.pgvector import create_full_text_index
+from hrag.utils.embeddings.reranker import preload_rankers
+from hrag.utils.enums import RetrievalMode
+from hrag.utils.ingestion import ingestion_queue
+from hrag.utils.metrics import generate_metrics
+from hrag.utils.tracing import (
+    TracingMiddleware,
+    setup_tracing,
+    shutdown_tracing,
+)
 from settings import app_settings
 
 logger = logging.getLogger("gunicorn.error")
 logger.setLevel(app_settings.log_level.upper())
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing(engine)
+
+    logger.info("Bootstrapping graph schema ...")
+    bootstrap_graph_schema()
+
+    if RetrievalMode(app_settings.retrieval_mode) == RetrievalMode.hybrid:
+        logger.info("Ensuring the full text index ...")
+        await asyncio.to_thread(create_full_text_index)
+
+    if app_settings.enable_reranking:
+        logger.info("Loading reranker models ...")
+        await asyncio.to_thread(preload_rankers)
+
+    logger.info("Starting document ingestion queue ...")
+    await ingestion_queue.start(process_document_job)
+    enqueue_pending_document_jobs()
+
+    yield
+
+    await ingestion_queue.stop()
+    await close_neo4j_graphs()
+    engine.dispose()
+    shutdown_tracing()
+
+
 app = FastAPI(
     title="Hybrid RAG API",
     description="Hybrid RAG API",
@@ -19,19 +68,31 @@ app = FastAPI(
 )
 
 # register sub router for tenants
-tenants.include_router(conversations, tags=["conversations"], prefix="/{tenant}")
+tenants.include_router(
+    conversations, tags=["conversations"], prefix="/{tenant}"
+)
 tenants.include_router(documents, tags=["documents"], prefix="/{tenant}")
 
 app.include_router(tenants)
 add_pagination(app)
 app = VersionedFastAPI(
-    app, version_format="{major}", prefix_format="/api/v{major}", enable_latest=True
+    app,
+    version_format="{major}",
+    prefix_format="/api/v{major}",
+    enable_latest=True,
+    lifespan=lifespan,
 )
 app.add_middleware(
-    DBSessionMiddleware, db_url=app_settings.postgresql_url, commit_on_exit=True
+    DBSessionMiddleware, custom_engine=engine, commit_on_exit=True
 )
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = generate_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 origins = [
     app_settings.client_location,
 ]
@@ -46,7 +107,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+# outermost, so the span covers the whole request
+app.add_middleware(TracingMiddleware)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,45 @@
+"""add cassette provider
+
+Revision ID: f3b8c1d9e6a2
+Revises: e9d2a6c4f1b8
+Create Date: 2026-10-18 21:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b8c1d9e6a2"
+down_revision: Union[str, None] = "e9d2a6c4f1b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # before PostgreSQL 12 a value cannot be added to an enum inside
+    # a transaction
+    with op.get_context().autocommit_block():
+        op.execute(
+            "ALTER TYPE languagemodelprovider "
+            "ADD VALUE IF NOT EXISTS 'cassette'"
+        )
+
+
+def downgrade() -> None:
+    # values cannot be removed from an enum, the type is created again
+    # without it
+    op.execute(
+        "UPDATE tenant SET provider = 'ollama' WHERE provider = 'cassette'"
+    )
+    op.execute(
+        "ALTER TYPE languagemodelprovider RENAME TO languagemodelprovider_old"
+    )
+    op.execute(
+        "CREATE TYPE languagemodelprovider AS ENUM ('ollama', 'open_ai')"
+    )
+    op.execute(
+        "ALTER TABLE tenant ALTER COLUMN provider TYPE languagemodelprovider "
+        "USING provider::text::languagemodelprovider"
+    )
+    op.execute("DROP TYPE languagemodelprovider_old")
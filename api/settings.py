@@ -6,14 +6,34 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     postgresql_url: str = os.environ["POSTGRESQL_URL"]
+    postgresql_pool_size: int = int(
+        os.environ.get("POSTGRESQL_POOL_SIZE", "10")
+    )
+    postgresql_max_overflow: int = int(
+        os.environ.get("POSTGRESQL_MAX_OVERFLOW", "20")
+    )
+    postgresql_pool_recycle: int = int(
+        os.environ.get("POSTGRESQL_POOL_RECYCLE", "1800")
+    )
     neo4j_url: str = os.environ["NEO4J_URL"]
     neo4j_username: str = os.environ["NEO4J_USERNAME"]
     neo4j_password: str = os.environ["NEO4J_PASSWORD"]
+    neo4j_database: str = os.environ.get("NEO4J_DATABASE", "neo4j")
+    neo4j_max_connection_pool_size: int = int(
+        os.environ.get("NEO4J_MAX_CONNECTION_POOL_SIZE", "50")
+    )
+    neo4j_connection_acquisition_timeout: float = float(
+        os.environ.get("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")
+    )
     migration_dir: str = os.path.join(os.getcwd(), "migrations")
     debug: bool = strtobool(os.environ.get("DEBUG", "False"))
-    client_location: str = os.environ.get("CLIENT_LOCATION", "https://localhost:3000")
+    client_location: str = os.environ.get(
+        "CLIENT_LOCATION", "https://localhost:3000"
+    )
 
-    default_llm_provider: str = os.environ.get("DEFAULT_LLM_PROVIDER", "ollama")
+    default_llm_provider: str = os.environ.get(
+        "DEFAULT_LLM_PROVIDER", "ollama"
+    )
     default_llm_endpoint: str = os.environ.get(
         "DEFAULT_LLM_ENDPOINT", "http://localhost:11434"
     )
@@ -22,11 +42,159 @@ class Settings(BaseSettings):
     default_embedding_model: str = os.environ.get(
         "DEFAULT_EMBEDDING_MODEL", "nomic-embed-text:latest"
     )
-    enable_reranking: bool = strtobool(os.environ.get("ENABLE_RERANKING", "true"))
+    # cassette provider: file of the recorded LLM responses and mode, replay
+    # (unknown requests fail), record_missing (unknown requests are sent to the
+    # upstream provider and recorded) or record (every request is sent and
+    # recorded again)
+    llm_cassette_path: str = os.environ.get(
+        "LLM_CASSETTE_PATH", "cassettes/llm.jsonl"
+    )
+    llm_cassette_mode: str = os.environ.get("LLM_CASSETTE_MODE", "replay")
+    # provider the responses are recorded from, with the endpoint, api key and
+    # models of the tenant
+    llm_cassette_upstream: str = os.environ.get(
+        "LLM_CASSETTE_UPSTREAM", "ollama"
+    )
+    # replayed responses take their recorded latency times this, 0
+    # replays instantly
+    llm_cassette_latency_scale: float = float(
+        os.environ.get("LLM_CASSETTE_LATENCY_SCALE", "1.0")
+    )
+    graph_retrieval_timeout: float = float(
+        os.environ.get("GRAPH_RETRIEVAL_TIMEOUT", "10")
+    )
+    vector_retrieval_timeout: float = float(
+        os.environ.get("VECTOR_RETRIEVAL_TIMEOUT", "10")
+    )
+    # sequential, concurrent or batch
+    document_grading_mode: str = os.environ.get(
+        "DOCUMENT_GRADING_MODE", "concurrent"
+    )
+    document_grading_concurrency: int = int(
+        os.environ.get("DOCUMENT_GRADING_CONCURRENCY", "4")
+    )
+    # stop grading once this many relevant documents are found, 0 grades all
+    # of them
+    document_grading_min_relevant: int = int(
+        os.environ.get("DOCUMENT_GRADING_MIN_RELEVANT", "0")
+    )
+    graph_extraction_concurrency: int = int(
+        os.environ.get("GRAPH_EXTRACTION_CONCURRENCY", "4")
+    )
+    # full, trim or none: how much of the chunk text is stored on the
+    # Document nodes
+    graph_source_text_mode: str = os.environ.get(
+        "GRAPH_SOURCE_TEXT_MODE", "trim"
+    )
+    graph_source_text_max_chars: int = int(
+        os.environ.get("GRAPH_SOURCE_TEXT_MAX_CHARS", "200")
+    )
+    # rows sent per UNWIND statement when writing graph documents
+    neo4j_write_batch_size: int = int(
+        os.environ.get("NEO4J_WRITE_BATCH_SIZE", "1000")
+    )
+    # find the entities of a question with the tenant entity dictionary before
+    # falling back to the LLM
+    enable_entity_dictionary: bool = strtobool(
+        os.environ.get("ENABLE_ENTITY_DICTIONARY", "true")
+    )
+    entity_dictionary_refresh_interval: int = int(
+        os.environ.get("ENTITY_DICTIONARY_REFRESH_INTERVAL", "60")
+    )
+    upload_dir: str = os.environ.get(
+        "UPLOAD_DIR", os.path.join(os.getcwd(), "uploads")
+    )
+    ingestion_workers: int = int(os.environ.get("INGESTION_WORKERS", "4"))
+    # seconds without progress after which a processing job is considered
+    # abandoned by a dead worker and queued again on startup
+    document_job_timeout: int = int(
+        os.environ.get("DOCUMENT_JOB_TIMEOUT", "3600")
+    )
+    ingestion_tenant_concurrency: int = int(
+        os.environ.get("INGESTION_TENANT_CONCURRENCY", "1")
+    )
+    ingestion_endpoint_concurrency: int = int(
+        os.environ.get("INGESTION_ENDPOINT_CONCURRENCY", "2")
+    )
+    enable_embedding_cache: bool = strtobool(
+        os.environ.get("ENABLE_EMBEDDING_CACHE", "true")
+    )
+    # number of embeddings kept in memory per embedding model, on top of
+    # the database
+    embedding_cache_size: int = int(
+        os.environ.get("EMBEDDING_CACHE_SIZE", "10000")
+    )
+    # answer cache: minimum cosine similarity between two questions to reuse
+    # an answer
+    answer_cache_threshold: float = float(
+        os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")
+    )
+    default_answer_cache_ttl: int = int(
+        os.environ.get("DEFAULT_ANSWER_CACHE_TTL", "86400")
+    )
+    # ANN index built for a tenant collection once it holds ann_index_min_rows
+    # chunks, IVFFlat indexes are rebuilt after loads of
+    # ann_reindex_min_chunks chunks
+    ann_index_type: str = os.environ.get("ANN_INDEX_TYPE", "hnsw")
+    ann_index_min_rows: int = int(
+        os.environ.get("ANN_INDEX_MIN_ROWS", "10000")
+    )
+    ann_reindex_min_chunks: int = int(
+        os.environ.get("ANN_REINDEX_MIN_CHUNKS", "10000")
+    )
+    # vector (nearest neighbours only) or hybrid (nearest neighbours and full
+    # text search fused with reciprocal rank fusion)
+    retrieval_mode: str = os.environ.get("RETRIEVAL_MODE", "vector")
+    # documents returned by the retriever, before reranking
+    retrieval_k: int = int(os.environ.get("RETRIEVAL_K", "4"))
+    # candidates taken from each search of the hybrid retrieval
+    hybrid_search_candidates: int = int(
+        os.environ.get("HYBRID_SEARCH_CANDIDATES", "40")
+    )
+    hybrid_search_rrf_k: int = int(os.environ.get("HYBRID_SEARCH_RRF_K", "60"))
+    # text search configuration of the full text search, its index is built on
+    # startup and after ingestions in hybrid mode
+    full_text_search_config: str = os.environ.get(
+        "FULL_TEXT_SEARCH_CONFIG", "english"
+    )
+    # separate (grounding then usefulness), combined (both in a single call) or
+    # skip, tenants can override it
+    verification_mode: str = os.environ.get("VERIFICATION_MODE", "separate")
+    # answers regenerated after failing the grounding check before falling back
+    # to the regular answer
+    max_generation_retries: int = int(
+        os.environ.get("MAX_GENERATION_RETRIES", "2")
+    )
+    enable_reranking: bool = strtobool(
+        os.environ.get("ENABLE_RERANKING", "true")
+    )
+    # FlashRank model and number of documents kept, tenants can override both
+    reranker_model: str = os.environ.get(
+        "RERANKER_MODEL", "ms-marco-MultiBERT-L-12"
+    )
+    reranker_top_n: int = int(os.environ.get("RERANKER_TOP_N", "3"))
+    # threads running the reranker inference
+    reranker_workers: int = int(os.environ.get("RERANKER_WORKERS", "1"))
+    # the passages of the requests arriving within this window are scored
+    # together, up to reranker_batch_size passages per inference call
+    reranker_batch_wait_ms: int = int(
+        os.environ.get("RERANKER_BATCH_WAIT_MS", "5")
+    )
+    reranker_batch_size: int = int(os.environ.get("RERANKER_BATCH_SIZE", "64"))
     create_tenant_if_not_exists: bool = strtobool(
         os.environ.get("CREATE_TENANT_IF_NOT_EXISTS", "true")
     )
 
+    # none, console, file or otlp (configured with the OTEL_EXPORTER_OTLP_*
+    # variables), tracing needs opentelemetry-sdk
+    tracing_exporter: str = os.environ.get("TRACING_EXPORTER", "none")
+    tracing_file: str = os.environ.get("TRACING_FILE", "traces.jsonl")
+    # share of the traces started by the app which are recorded and exported
+    tracing_sample_ratio: float = float(
+        os.environ.get("TRACING_SAMPLE_RATIO", "1.0")
+    )
+    tracing_service_name: str = os.environ.get("TRACING_SERVICE_NAME", "hrag")
+
     log_level: str = os.environ.get("LOG_LEVEL", "debug")
 
 
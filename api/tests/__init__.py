@@ -0,0 +1,9 @@
+"""
+Unit tests of the pipelines, run against the in-memory stand-ins of the
+benchmarks so nothing has to be running.
+
+    python -m unittest discover -s tests
+"""
+
+# sets the environment the settings need before anything imports them
+import benchmarks  # noqa: F401
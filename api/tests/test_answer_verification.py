@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from benchmarks.scenarios import Backend
+from hrag.utils.enums import VerificationMode
+from hrag.utils.graph import HybridRagGraph
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableLambda
+
+STATE = {
+    "question": "Which Anvils does Acme sell?",
+    "reformed_question": "Which Anvils does Acme sell?",
+    "documents": "Acme sells Anvils in Gotham.",
+    "relationships": "",
+    "generation": "Acme sells Anvils in Gotham.",
+    "summary": "",
+}
+
+
+class CombinedVerificationTest(unittest.TestCase):
+    def setUp(self):
+        backend = Backend()
+        backend.tenant = backend.tenant._replace(
+            verification_mode=VerificationMode.combined
+        )
+        backend.install()
+        self.graph = HybridRagGraph(backend.tenant)
+
+    def verify(self, verifier_response):
+        self.graph.answer_verifier_chain = (
+            RunnableLambda(lambda _: verifier_response) | JsonOutputParser()
+        )
+        return asyncio.run(self.graph.verify_answer(dict(STATE)))
+
+    def test_verdict_of_the_verifier(self):
+        self.assertEqual(
+            self.verify('{"grounded": "yes", "useful": "no"}'),
+            {"verdict": "not useful"},
+        )
+
+    def test_malformed_response_falls_back_to_separate_checks(self):
+        expected = asyncio.run(
+            self.graph.verify_answer_separately(dict(STATE))
+        )
+        for response in (
+            '["yes", "yes"]',
+            '"yes"',
+            '{"grounded": "yes"}',
+            "The answer is grounded and useful.",
+        ):
+            with self.subTest(response=response):
+                self.assertEqual(self.verify(response), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+
+from benchmarks.scenarios import Backend
+from hrag.utils.embeddings import HybridRagEmbeddings
+from hrag.utils.embeddings.graph import HybridRagEntityGraph
+from langchain_core.documents import Document
+
+
+def make_upload(document_id, *pages):
+    return [
+        Document(
+            page_content=page,
+            metadata={"source": "upload.txt", "document_id": document_id},
+        )
+        for page in pages
+    ]
+
+
+class ReuploadTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = Backend()
+        self.backend.install()
+        self.embeddings = HybridRagEmbeddings(tenant=self.backend.tenant)
+        self.entity_graph = HybridRagEntityGraph(tenant=self.backend.tenant)
+
+    def upload(self, documents):
+        self.embeddings.add_documents(documents)
+        self.entity_graph.add_documents(documents)
+
+    def stored_texts(self):
+        return {
+            document.page_content
+            for document in self.backend.vector_store.documents
+        }
+
+    def stored_entities(self):
+        return {
+            entity.split("::", 1)[-1]
+            for entity in self.backend.entity_graph.neighbors
+        }
+
+    def test_reupload_replaces_previous_version(self):
+        self.upload(
+            make_upload(
+                "report",
+                "Acme sells Anvils in Gotham.",
+                "Globex repairs Widgets in Bedrock.",
+            )
+        )
+        self.upload(
+            make_upload(
+                "report",
+                "Acme sells Anvils in Gotham.",
+                "Globex imports Jetpacks in Metropolis.",
+            )
+        )
+
+        self.assertEqual(
+            self.stored_texts(),
+            {
+                "Acme sells Anvils in Gotham.",
+                "Globex imports Jetpacks in Metropolis.",
+            },
+        )
+        self.assertNotIn("Widgets", self.stored_entities())
+        self.assertIn("Jetpacks", self.stored_entities())
+
+    def test_chunks_of_other_documents_are_kept(self):
+        self.upload(make_upload("first", "Acme sells Anvils in Gotham."))
+        self.upload(make_upload("second", "Acme sells Anvils in Gotham."))
+        self.upload(
+            make_upload("first", "Hooli designs Widgets in Sunnydale.")
+        )
+
+        self.assertEqual(
+            self.stored_texts(),
+            {
+                "Acme sells Anvils in Gotham.",
+                "Hooli designs Widgets in Sunnydale.",
+            },
+        )
+        self.assertIn("Anvils", self.stored_entities())
+
+
+class SummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = Backend()
+        self.backend.tenant = self.backend.tenant._replace(
+            enable_summary_embedding=True
+        )
+        self.backend.install()
+        self.embeddings = HybridRagEmbeddings(tenant=self.backend.tenant)
+
+    def upload(self, *pages, document_id="report"):
+        self.backend.reset_counters()
+        self.embeddings.add_documents(make_upload(document_id, *pages))
+        return {
+            kind: counter["calls"]
+            for kind, counter in self.backend.counters().items()
+        }
+
+    def test_identical_reupload_skips_the_summary(self):
+        self.upload("Acme sells Anvils in Gotham.")
+
+        calls = self.upload("Acme sells Anvils in Gotham.")
+
+        self.assertEqual(calls["chat"], 0)
+        self.assertEqual(calls["embedding"], 0)
+
+    def test_copy_of_a_document_skips_the_summary(self):
+        self.upload("Acme sells Anvils in Gotham.")
+
+        calls = self.upload("Acme sells Anvils in Gotham.", document_id="copy")
+
+        self.assertEqual(calls["chat"], 0)
+        self.assertEqual(calls["embedding"], 0)
+
+    def test_changed_reupload_replaces_the_summary(self):
+        self.upload("Acme sells Anvils in Gotham.")
+
+        calls = self.upload("Globex repairs Widgets in Bedrock.")
+
+        self.assertGreater(calls["chat"], 0)
+        # the new chunk and the new summary, the previous ones are removed
+        self.assertEqual(len(self.backend.vector_store), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
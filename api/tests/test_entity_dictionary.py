@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from benchmarks.scenarios import Backend
+from hrag.utils.embeddings.graph import (
+    HybridRagEntityGraph,
+    get_entity_dictionary,
+)
+from langchain_core.documents import Document
+
+
+def make_upload(*pages):
+    return [
+        Document(
+            page_content=page,
+            metadata={"source": "report.txt", "document_id": "report"},
+        )
+        for page in pages
+    ]
+
+
+class EntityDictionaryTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = Backend()
+        self.backend.install()
+        self.entity_graph = HybridRagEntityGraph(tenant=self.backend.tenant)
+
+    def match(self, question):
+        dictionary = get_entity_dictionary(self.backend.tenant.tenant)
+        return asyncio.run(dictionary.amatch(question))
+
+    def test_truncated_entities_no_longer_match(self):
+        self.entity_graph.add_documents(
+            make_upload("Globex repairs Widgets in Bedrock.")
+        )
+        self.assertIn("Widgets", self.match("Who repairs Widgets?"))
+
+        self.entity_graph.truncate()
+
+        self.assertEqual(self.match("Who repairs Widgets?"), [])
+
+    def test_entities_of_a_previous_version_no_longer_match(self):
+        self.entity_graph.add_documents(
+            make_upload("Globex repairs Widgets in Bedrock.")
+        )
+        self.assertIn("Widgets", self.match("Who repairs Widgets?"))
+
+        self.entity_graph.add_documents(
+            make_upload("Hooli designs Jetpacks in Sunnydale.")
+        )
+
+        self.assertEqual(self.match("Who repairs Widgets?"), [])
+        self.assertIn("Jetpacks", self.match("Who designs Jetpacks?"))
+
+
+if __name__ == "__main__":
+    unittest.main()